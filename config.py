@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # --- Path Definitions ---
@@ -8,6 +9,12 @@ DOWNLOAD_DIR = DATA_DIR / "download"
 RAW_DIR = DATA_DIR / "raw"
 NORMALIZED_DIR = DATA_DIR / "normalized"
 PROCESSED_DIR = DATA_DIR / "processed"
+# ステージ3〜6の成果物を年度 (source_year) ごとに分割して保持するディレクトリ。PROCESSED_DIR の各CSVはこれらを結合したもの
+PROCESSED_PARTITIONS_DIR = PROCESSED_DIR / "partitions"
+# ステージ1の変換済みファイル管理用マニフェスト (元ファイルのハッシュと生成CSVの対応表)
+CONVERT_MANIFEST_PATH = RAW_DIR / "_convert_manifest.json"
+# ステージ1で判定したシート種別 (review / segment / other) のインデックス
+SHEET_INDEX_PATH = RAW_DIR / "_sheet_index.json"
 
 # --- Master Data Definitions ---
 # 省庁名の表記揺れを統一するためのマッピング
@@ -38,4 +45,77 @@ FILENAME_YEAR_MAP = {
     'database_220427': 2020, 'database2019_220427': 2019, 'database2018_220427': 2018,
     'database2017': 2017, 'database2016': 2016, 'database2015': 2015,
     'database2014': 2014,
-}
\ No newline at end of file
+}
+# --- Excel Conversion ---
+# ステージ1で使用するExcel読み込みエンジン ('openpyxl': 標準, 'xml': XMLを直接ストリーム読み込みする高速版)
+CONVERT_READER_ENGINE = 'openpyxl'
+# ステージ1で変換するシート種別。None の場合は全シートを変換する
+# 例: {'review'} とするとステージ3〜6が使用するレビューシートのみを変換する
+CONVERT_SHEET_KINDS = None
+# True の場合、ステージ1で読み出したセルをその場で正規化し data/normalized に直接書き出す (ステージ2は省略される)
+CONVERT_FUSED_NORMALIZE = False
+# 融合モードで data/raw にも生CSVを書き出すかどうか (融合モードでない場合は常に書き出す)
+CONVERT_WRITE_RAW = True
+
+# --- Normalization ---
+# ステージ2の正規化エンジン ('python': セル単位の normalize_text, 'vectorized': pandasの文字列操作による列単位の一括処理)
+# どちらも出力は同一 (scripts/benchmark_normalization.py で検証)
+NORMALIZE_ENGINE = 'python'
+
+# --- Parallel Processing ---
+# ステージ1(Excel→CSV変換)で使用するワーカープロセス数。1以下の場合は逐次処理となる
+CONVERT_MAX_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+# ステージ2(正規化)で使用するワーカープロセス数。1以下の場合は逐次処理となる
+NORMALIZE_MAX_WORKERS = CONVERT_MAX_WORKERS
+# ステージ2の並列処理で1タスクに含める行数 (ワーカー数×2バッチ分の行がメモリ上に保持される)
+NORMALIZE_BATCH_ROWS = 2000
+# ステージ3〜6を並行に実行するワーカープロセス数。1以下の場合は同一プロセスで順に実行し、読み込みキャッシュで各正規化済みCSVを1回だけ読み込む
+# 並行実行時は各プロセスが正規化済みCSVを個別に読み込むため、読み込みキャッシュは使われない (セルストアは使われる)。
+# そのため並行実行は、ここかジョブの stage_workers で2以上を指定した場合と、セルストアが有効な場合にだけ行う (ジョブの max_workers はステージ1・2のみに使う)
+STAGE_MAX_WORKERS = 1
+# セルストアが有効で、STAGE_MAX_WORKERS・stage_workers で並行実行が指定されていない場合のワーカープロセス数
+# (各プロセスは必要な列のセルだけをセルストアから読むため、並行に実行しても読み込みは重複しない)
+CELL_STORE_STAGE_WORKERS = min(4, CONVERT_MAX_WORKERS)
+
+# --- Frame Cache ---
+# ステージ3〜6で正規化済みCSVの読み込み結果を共有するキャッシュのメモリ上限 (MB)。0の場合はキャッシュしない
+FRAME_CACHE_MEMORY_BUDGET_MB = 2048
+
+# --- Extraction Engine ---
+# ステージ4〜6の抽出エンジン ('pandas': DataFrame上での抽出, 'duckdb': 正規化済みCSVに対するSQLでの抽出)
+# どちらも出力は同一 (scripts/benchmark_extraction.py で検証)。ジョブごとに extraction_engine で指定することもできる
+EXTRACTION_ENGINE = 'pandas'
+# DuckDBエンジンのスレッド数とメモリ上限 (None の場合はDuckDBの既定値)。上限を超えた中間データは DUCKDB_TEMP_DIR に退避される
+DUCKDB_THREADS = None
+DUCKDB_MEMORY_LIMIT = None
+DUCKDB_TEMP_DIR = DATA_DIR / "_duckdb_tmp"
+
+# --- Cell Store ---
+# True の場合、ステージ2の後に正規化済みCSVを値のあるセルだけの縦持ち形式 (Parquet) のセルストアにも書き出し、
+# ステージ3〜6は必要な列のセルだけをセルストアから読み込む (読み込みキャッシュの代わりに使われる)
+CELL_STORE_ENABLED = False
+CELL_STORE_DIR = DATA_DIR / "cell_store"
+
+# --- Stage Cache ---
+# True の場合、ステージ1〜6ごとに入力ファイル (名前・サイズ・更新日時)・出力に影響する設定値・コードのフィンガープリントを記録し、
+# 前回の成功時から変更が無く、出力ファイルも変更されていないステージを自動的にスキップする (ジョブごとに force で無効化できる)
+STAGE_CACHE_ENABLED = True
+STAGE_CACHE_PATH = DATA_DIR / "_stage_cache.json"
+
+# --- Checkpoint ---
+# ステージ2〜6の実行中に、ファイルごとの完了記録 (チェックポイント) と処理結果を書き出すディレクトリ。
+# キャンセル・異常終了したジョブを resume=True で再実行すると、中断したステージを最後に完了したファイルの次から再開する
+# (ステージ1はファイルごとの変換結果を常に変換マニフェストに記録しており、変換済みのファイルは resume の指定に関わらずスキップされる)
+CHECKPOINT_DIR = DATA_DIR / "_checkpoints"
+
+# --- Parquet Output ---
+# True の場合、ステージ3〜6の成果物をCSVに加えて、列の型を付けたParquet (Zstandard圧縮) でも PROCESSED_PARQUET_DIR に書き出す。
+# business / budgets / fund_flow / expenditure は source_year ごとのパーティション (<テーブル名>/source_year=<年度>/<テーブル名>.parquet)
+PARQUET_OUTPUT_ENABLED = True
+PROCESSED_PARQUET_DIR = PROCESSED_DIR / "parquet"
+# True の場合、成果物ZIPにParquetも含める (ジョブごとに include_parquet で指定することもできる)
+RESULTS_ZIP_INCLUDE_PARQUET = False
+
+# --- Job Store ---
+# ジョブのステータスを保存するSQLiteデータベース。APIの再起動後もジョブの履歴が残り、複数のワーカープロセスから参照できる
+JOB_STORE_PATH = DATA_DIR / "_jobs.sqlite3"
@@ -1,6 +1,6 @@
 import os
-from typing import List
-from fastapi import FastAPI, BackgroundTasks, HTTPException, status
+from typing import List, Literal, Optional
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, status
 from fastapi.responses import FileResponse, JSONResponse
 from pathlib import Path
 
@@ -9,7 +9,7 @@ from models.api_models import (
 )
 from pipeline.manager import (
     create_new_job, get_job_status, run_pipeline_async, get_all_jobs, 
-    request_job_cancellation
+    request_job_cancellation, fail_interrupted_jobs
 )
 from config import PROCESSED_DIR, DOWNLOAD_DIR, RAW_DIR, NORMALIZED_DIR
 
@@ -32,19 +32,37 @@ async def run_pipeline(
 
     - **start_stage**: 開始ステージを指定 (1-4)。途中から再開する場合に使用します。
     - **target_files**: 処理対象のファイル名をリストで指定。指定しない場合は全ファイルが対象です。
+    - **target_years**: 処理対象の事業年度をリストで指定。全ステージが対象年度のファイルだけを処理し、成果物は対象年度の分だけを置き換えます。
+    - **max_workers**: ステージ1・2の並列処理のワーカープロセス数。1を指定すると逐次処理になります。
+    - **stage_workers**: ステージ3〜6を並行に実行するワーカープロセス数。指定しない場合は設定ファイルの値を使用します (既定では同一プロセスで順に実行し、読み込みキャッシュを共有します)。
+    - **extraction_engine**: ステージ4〜6の抽出エンジン (`pandas` / `duckdb`)。指定しない場合は設定ファイルの値を使用します。
+    - **force**: `true` の場合、前回の実行から変更の無いステージもスキップせずに再実行します。
+    - **resume**: `true` の場合、キャンセル・異常終了で中断したステージを、最後に完了したファイルの次から再開します。
+    - **include_parquet**: `true` の場合、成果物ZIPに型付きのParquetも含めます。指定しない場合は設定ファイルの値を使用します。
     """
     job_id = create_new_job()
-    background_tasks.add_task(run_pipeline_async, job_id, request.start_stage, request.target_files)
+    background_tasks.add_task(
+        run_pipeline_async, job_id, request.start_stage, request.target_files, request.max_workers,
+        request.extraction_engine, request.force, request.resume, request.target_years,
+        request.include_parquet, request.stage_workers
+    )
     return {"job_id": job_id, "message": "パイプラインの実行を受け付けました。"}
 
 @app.get("/api/pipeline/jobs",
            response_model=List[JobStatusResponse],
            summary="全ジョブの一覧を取得")
-async def list_all_jobs():
+async def list_all_jobs(
+    status_filter: Optional[Literal['pending', 'in-progress', 'completed', 'failed', 'cancelled']] = Query(None, alias="status", description="指定したステータスのジョブだけを返す"),
+    limit: Optional[int] = Query(None, ge=1, description="返すジョブの最大件数 (指定しない場合は全件)"),
+    offset: int = Query(0, ge=0, description="先頭から読み飛ばすジョブの件数"),
+):
     """
-    これまでに実行された、または実行中の全てのジョブのリストを返します。
+    これまでに実行された、または実行中のジョブのリストを、開始日時の新しい順に返します。
+
+    - **status**: `pending` / `in-progress` / `completed` / `failed` / `cancelled` のいずれかで絞り込みます。
+    - **limit** / **offset**: 指定するとページ単位で取得します。指定しない場合は全てのジョブを返します。
     """
-    return get_all_jobs()
+    return get_all_jobs(status_filter, limit, offset)
 
 @app.get("/api/pipeline/status/{job_id}", 
            response_model=JobStatusResponse,
@@ -103,11 +121,12 @@ async def download_results(filename: str):
 
 @app.on_event("startup")
 async def startup_event():
-    """アプリケーション起動時にディレクトリを作成する"""
+    """アプリケーション起動時にディレクトリを作成し、前回の終了時に実行中だったジョブを failed にする"""
     DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
     RAW_DIR.mkdir(parents=True, exist_ok=True)
     NORMALIZED_DIR.mkdir(parents=True, exist_ok=True)
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    fail_interrupted_jobs()
 
 @app.get("/", include_in_schema=False)
 async def root():
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+from typing import Optional, List, Dict, Any, Literal
+
+from config import FILENAME_YEAR_MAP
 
 class PipelineRunRequest(BaseModel):
     """パイプライン実行APIのリクエストボディモデル"""
@@ -16,6 +18,55 @@ class PipelineRunRequest(BaseModel):
         default=None, 
         description="処理対象とするファイル名のリスト。指定しない場合はdownloadディレクトリ内の全ファイルが対象。"
     )
+    target_years: Optional[List[int]] = Field(
+        default=None,
+        description=(
+            "処理対象とする事業年度のリスト (ファイル名から FILENAME_YEAR_MAP で特定)。ステージ1〜6のすべてに適用され、"
+            "成果物は対象年度のパーティションだけを置き換えて他の年度と結合する。指定しない場合は全年度が対象。"
+        )
+    )
+    max_workers: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="ステージ1・2の並列処理に使用するワーカープロセス数。1の場合は逐次処理。指定しない場合は設定ファイルの値を使用。"
+    )
+    stage_workers: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "ステージ3〜6を並行に実行するワーカープロセス数。1の場合は同一プロセスで順に実行し、読み込みキャッシュを共有する。"
+            "指定しない場合は設定ファイルの値 (STAGE_MAX_WORKERS) を使用。"
+        )
+    )
+    extraction_engine: Optional[Literal['pandas', 'duckdb']] = Field(
+        default=None,
+        description="ステージ4〜6の抽出エンジン ('pandas' または 'duckdb')。どちらも出力は同一。指定しない場合は設定ファイルの値を使用。"
+    )
+    force: bool = Field(
+        default=False,
+        description="True の場合、前回の実行から変更の無いステージもスキップせず、start_stage 以降の全ステージを再実行する。"
+    )
+    resume: bool = Field(
+        default=False,
+        description="True の場合、キャンセル・異常終了で中断したステージを、最初からではなく最後に完了したファイルの次から再開する。"
+    )
+    include_parquet: Optional[bool] = Field(
+        default=None,
+        description="True の場合、成果物ZIPに型付きのParquet (source_year ごとのパーティション) も含める。指定しない場合は設定ファイルの値を使用する。"
+    )
+
+    @field_validator('target_years')
+    @classmethod
+    def validate_target_years(cls, target_years: Optional[List[int]]) -> Optional[List[int]]:
+        """FILENAME_YEAR_MAP に定義されていない年度が含まれる場合は、ジョブを作成せずに 422 を返す"""
+        if target_years:
+            known_years = set(FILENAME_YEAR_MAP.values())
+            unknown_years = sorted(set(target_years) - known_years)
+            if unknown_years:
+                raise ValueError(
+                    f"FILENAME_YEAR_MAP に定義されていない年度が指定されました: {unknown_years} (指定可能な年度: {sorted(known_years)})"
+                )
+        return target_years
 
     # === ▼▼▼ 追加箇所 ▼▼▼ ===
     # Swagger UI (docs) に表示するリクエストボディのサンプルを定義
@@ -39,6 +90,11 @@ class PipelineRunRequest(BaseModel):
                         "target_files": ["database240918.zip", "database240502.zip"]
                     },
                 },
+                {
+                    "summary": "DuckDBエンジンでステージ4から再開",
+                    "description": "予算・資金の流れ・支出先の抽出を、正規化済みCSVに対するSQLで実行します。",
+                    "value": {"start_stage": 4, "extraction_engine": "duckdb"},
+                },
             ]
         }
     )
@@ -58,4 +114,9 @@ class JobStatusResponse(BaseModel):
     message: Optional[str] = None
     results_url: Optional[str] = None
     error_message: Optional[str] = None
-    cancel_requested: bool = False
\ No newline at end of file
+    cancel_requested: bool = False
+    stats: Dict[str, Any] = Field(default_factory=dict, description="ステージごとの処理統計 (変換/スキップ件数など)")
+    stages: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="ステージごとの状態 (stage, name, status, depends_on, message, elapsed_sec)。status は pending / in-progress / completed / skipped / up-to-date (前回から変更が無くスキップ) / failed / cancelled"
+    )
\ No newline at end of file
@@ -0,0 +1,56 @@
+from typing import Tuple
+
+import pandas as pd
+
+# 金額・率として数値に変換する列 (テーブル名 -> 列名の一覧。None の場合は business_id 以外の全列)
+AMOUNT_COLUMNS = {
+    'budgets': None,
+    'fund_flow': ['支払先金額(百万円)', '支払先計'],
+    'expenditure': ['支出額', '落札率'],
+}
+
+# 数値に変換できなかった元の値を残す列の接尾辞 (金額の列の直後に置く)
+RAW_SUFFIX = '_原文'
+
+# 桁区切りのカンマを除いた後の金額・率の書式 (先頭の △ / ▲ は負の値、末尾の % は率)
+AMOUNT_PATTERN = r'^(?P<sign>[△▲-]?)(?P<number>\d+(?:\.\d+)?)%?$'
+
+
+def raw_column(column: str) -> str:
+    return f"{column}{RAW_SUFFIX}"
+
+
+def is_amount_column(table: str, column: str) -> bool:
+    """table の column が数値に変換された金額・率の列かどうか"""
+    if table not in AMOUNT_COLUMNS or column.endswith(RAW_SUFFIX):
+        return False
+    columns = AMOUNT_COLUMNS[table]
+    return column != 'business_id' if columns is None else column in columns
+
+
+def parse_amounts(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    金額・率の文字列を数値の文字列 ('1,234' -> '1234', '△12' -> '-12', '95.5%' -> '95.5') に変換する。
+    (数値の文字列, 数値に変換できなかった元の値) を返す。空の値と、もう一方に値がある行は欠損値とする。
+    """
+    text = values.fillna('').astype(str).str.strip()
+    match = text.str.replace(',', '', regex=False).str.extract(AMOUNT_PATTERN)
+    parsed = match['number'].notna()
+    sign = match['sign'].fillna('').str.replace(r'[△▲]', '-', regex=True)
+    numbers = (sign + match['number'].fillna('')).where(parsed)
+    raw = text.where(~parsed & (text != ''))
+    return numbers, raw
+
+
+def type_amount_columns(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    df の金額・率の列 (AMOUNT_COLUMNS) を数値の文字列に変換し、
+    数値に変換できなかった元の値を各列の直後の '<列名>_原文' 列に残す。
+    """
+    typed = {}
+    for col in df.columns:
+        if is_amount_column(table, col):
+            typed[col], typed[raw_column(col)] = parse_amounts(df[col])
+        else:
+            typed[col] = df[col]
+    return pd.DataFrame(typed, index=df.index)
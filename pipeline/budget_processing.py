@@ -1,7 +1,15 @@
 import logging
 import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
 
+from pipeline.checkpoint import StageCheckpoint, run_checkpointed
+from pipeline.frame_cache import FrameLoader, read_normalized_frame, read_frame_columns, plan_columns, VIEW_EMPTY_AS_NA
+from pipeline.sheet_index import classify_header, clean_header_cell, SHEET_KIND_REVIEW
+
 # 統一ヘッダーの項目名を定義
 PAST_BUDGET_ITEMS = [
     '予算の状況予備費等', '予算の状況前年度から繰越し', '予算の状況当初予算',
@@ -10,6 +18,19 @@ PAST_BUDGET_ITEMS = [
 ]
 REQUEST_BUDGET_ITEMS = ['要求予算の状況当初予算', '要求予算の状況計']
 
+# 列名のパターン定義
+P_2015 = re.compile(r'.*?-(\d{4})年度(.*)')
+P_2014 = re.compile(r'.*?-(.*?)-(\d{4})年度(.*)')
+
+# レビュー年度からの相対位置 → 出力列名の接尾辞
+SUFFIX_MAP = {-3: '_py3', -2: '_py2', -1: '_py1', 0: '', 1: '_req'}
+
+
+@lru_cache(maxsize=None)
+def budget_column_plan(columns: Tuple[str, ...]) -> Tuple[int, ...]:
+    """予算の抽出で参照する列 (…-NNNN年度… 形式) の位置を返す。ヘッダーごとにキャッシュする"""
+    return plan_columns(columns, lambda col: bool(P_2014.fullmatch(col) or P_2015.fullmatch(col)))
+
 def standardize_item_name(raw_item_name, is_request):
     """抽出した生の項目名を、定義済みの統一項目名にマッピングする"""
     target_items = REQUEST_BUDGET_ITEMS if is_request else PAST_BUDGET_ITEMS
@@ -18,80 +39,151 @@ def standardize_item_name(raw_item_name, is_request):
             return standard_item
     return None
 
-def process_budget_files(file_paths, review_year_map):
+@lru_cache(maxsize=None)
+def resolve_budget_column(col_name: str, review_year: int) -> Optional[str]:
+    """
+    元の列名を、出力する予算時系列ワイド形式の列名 (例: '予算の状況当初予算_py1') に解決する。
+    抽出対象でない列の場合は None を返す。結果は列名とレビュー年度だけで決まるためキャッシュする。
+    """
+    match_2014 = P_2014.fullmatch(col_name)
+    match_2015 = P_2015.fullmatch(col_name)
+
+    raw_item, target_year_str, is_request_str = None, None, ''
+
+    if match_2014:
+        raw_item, target_year_str, is_request_str = match_2014.groups()
+    elif match_2015:
+        target_year_str, raw_item = match_2015.groups()
+    else:
+        return None
+
+    is_request = '要求' in raw_item or ('要求' in is_request_str if is_request_str else False)
+    item_name = standardize_item_name(raw_item, is_request)
+
+    if not item_name: return None
+
+    target_year = int(target_year_str)
+    relative_pos = target_year - review_year if not is_request else 1
+
+    if not (-3 <= relative_pos <= 1): return None
+
+    return f"{item_name}{SUFFIX_MAP[relative_pos]}"
+
+
+def _extract_budget_cells(df: pd.DataFrame, review_year: int, file_order: int):
+    """
+    1ファイル分のDataFrameから、値のある予算セルを縦持ち (business_id, 列名, 値, 並び順情報) で取り出す。
+    列名の解決は列ごとに1回だけ行い、セルの選択は配列演算で行う。
+    """
+    business_ids = np.array([f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))], dtype=object)
+
+    positions, targets = [], []
+    for pos, col_name in enumerate(df.columns):
+        target = resolve_budget_column(col_name, review_year) if isinstance(col_name, str) else None
+        if target:
+            positions.append(pos)
+            targets.append(target)
+
+    if not positions or df.empty:
+        return business_ids, pd.DataFrame(columns=['business_id', 'column', 'value', 'file_order', 'col_pos'])
+
+    values = df.iloc[:, positions].to_numpy(dtype=object)
+    # 元の実装と同じく、NaN と空白のみのセルは対象外
+    valid = ~pd.isna(values)
+    valid[valid] = np.array([str(v).strip() != '' for v in values[valid]], dtype=bool)
+
+    rows, cols = np.nonzero(valid)
+    cells = pd.DataFrame({
+        'business_id': business_ids[rows],
+        'column': np.array(targets, dtype=object)[cols],
+        'value': values[rows, cols],
+        'file_order': file_order,
+        'col_pos': np.array(positions)[cols],
+    })
+    return business_ids, cells
+
+
+def assemble_budget_table(business_ids: list, cells: pd.DataFrame) -> pd.DataFrame:
+    """
+    縦持ちのセルを、レコード (business_id) ごとの辞書を pd.DataFrame.from_dict(orient='index') に
+    渡していた従来の実装と同じ行順・列順・値のワイド形式に組み立てる。
+      - 行順: business_id の初出順
+      - 値: 同じ business_id・列名に複数の値がある場合は、後のファイル・後の列の値で上書き
+      - 列順: 'business_id' の後、各列名が初めて現れるレコードの順 (同一レコード内では値が入った順)
+    """
+    records = pd.Index(pd.unique(np.asarray(business_ids, dtype=object)))
+    if cells.empty:
+        return pd.DataFrame({'business_id': records.to_numpy()}, index=records)
+
+    cells = cells.sort_values(['file_order', 'col_pos'], kind='stable')
+
+    latest = cells.drop_duplicates(['business_id', 'column'], keep='last')
+    wide = latest.pivot(index='business_id', columns='column', values='value')
+
+    first = cells.drop_duplicates(['business_id', 'column'], keep='first').copy()
+    first['record_order'] = records.get_indexer(first['business_id'])
+    column_order = (
+        first.sort_values(['record_order', 'file_order', 'col_pos'], kind='stable')
+        .drop_duplicates('column')['column'].tolist()
+    )
+
+    wide = wide.reindex(index=records, columns=column_order)
+    wide.insert(0, 'business_id', records.to_numpy())
+    wide.index.name = None
+    wide.columns.name = None
+    return wide
+
+
+def _process_budget_file(filepath, review_year: int, file_order: int, frame_loader: FrameLoader):
+    """1ファイル分の予算セルを取り出す。レビューシートでない場合は None を返す"""
+    usecols = budget_column_plan(read_frame_columns(filepath))
+    df = frame_loader(filepath, VIEW_EMPTY_AS_NA, usecols)
+
+    if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+        logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
+        return None
+
+    return _extract_budget_cells(df, review_year, file_order)
+
+
+def process_budget_files(file_paths, review_year_map, frame_loader: Optional[FrameLoader] = None,
+                         checkpoint: Optional[StageCheckpoint] = None):
     """
     指定されたCSVファイルのリストを処理し、予算時系列ワイドDataFrameを返す。
     この関数が、パイプラインと個別実行スクリプトから共有される。
+    frame_loader を指定した場合は、CSVの読み込みをそれに委ねる (ステージ間で共有するキャッシュ用)。
+    checkpoint を指定した場合は、ファイルごとの抽出結果を記録し、記録済みのファイルは結果を再利用する。
     """
+    frame_loader = frame_loader or read_normalized_frame
     logging.info("予算・執行データの抽出（共通ロジック）を開始...")
-    all_business_records = {}
-    
-    # パターン定義
-    p_2015 = re.compile(r'.*?-(\d{4})年度(.*)')
-    p_2014 = re.compile(r'.*?-(.*?)-(\d{4})年度(.*)')
+    all_business_ids = []
+    all_cells = []
 
-    for filepath in file_paths:
+    for file_order, filepath in enumerate(file_paths):
         logging.info(f"  -> 処理中: {filepath.name}")
-        
+
         review_year = review_year_map.get(filepath.stem)
         if not review_year:
             logging.warning(f"    レビュー年度を特定できずスキップ: {filepath.name}")
             continue
 
         try:
-            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False, na_values=[''])
-            
-            cleaned_header = {str(col).replace('\n', '').replace('\r', '').replace(' ', '') for col in df.columns}
-            REQUIRED_COLS = {'府省', '府省庁', '事業名', '事業番号', '事業番号-1'}
-            EXCLUSION_COL = 'セグメント名'
-            if EXCLUSION_COL in cleaned_header or len(REQUIRED_COLS.intersection(cleaned_header)) < 3:
-                logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
+            extracted = run_checkpointed(
+                checkpoint, filepath,
+                lambda: _process_budget_file(filepath, review_year, file_order, frame_loader)
+            )
+            if extracted is None:
                 continue
 
-            df.reset_index(inplace=True)
-            df['business_id'] = df['index'].apply(lambda idx: f"{review_year}-{str(idx+1).zfill(5)}")
-            
-            for index, row in df.iterrows():
-                business_id = row['business_id']
-                if business_id not in all_business_records:
-                    all_business_records[business_id] = {'business_id': business_id}
-
-                for col_name in df.columns:
-                    if not isinstance(col_name, str) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
-                        continue
-
-                    match_2014 = p_2014.fullmatch(col_name)
-                    match_2015 = p_2015.fullmatch(col_name)
-
-                    raw_item, target_year_str, is_request_str = None, None, ''
-                    
-                    if match_2014:
-                        raw_item, target_year_str, is_request_str = match_2014.groups()
-                    elif match_2015:
-                        target_year_str, raw_item = match_2015.groups()
-                    else:
-                        continue
-                        
-                    is_request = '要求' in raw_item or ('要求' in is_request_str if is_request_str else False)
-                    item_name = standardize_item_name(raw_item, is_request)
-                    
-                    if not item_name: continue
-
-                    target_year = int(target_year_str)
-                    relative_pos = target_year - review_year if not is_request else 1
-                    
-                    if not (-3 <= relative_pos <= 1): continue
-                    
-                    suffix_map = {-3: '_py3', -2: '_py2', -1: '_py1', 0: '', 1: '_req'}
-                    suffix = suffix_map.get(relative_pos)
-
-                    new_col_name = f"{item_name}{suffix}"
-                    all_business_records[business_id][new_col_name] = row[col_name]
+            business_ids, cells = extracted
+            all_business_ids.extend(business_ids)
+            all_cells.append(cells)
         except Exception as e:
             logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
 
-    if not all_business_records:
+    if not all_business_ids:
         logging.warning("抽出対象となる予算データが見つかりませんでした。")
         return pd.DataFrame()
 
-    return pd.DataFrame.from_dict(all_business_records, orient='index')
\ No newline at end of file
+    cells = pd.concat(all_cells, ignore_index=True) if all_cells else pd.DataFrame()
+    return assemble_budget_table(all_business_ids, cells)
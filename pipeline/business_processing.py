@@ -1,17 +1,39 @@
 import csv
 import logging
-from typing import Callable
+from functools import lru_cache
+from typing import Callable, Collection, Optional, Tuple
 
 import pandas as pd
 
 from config import (
     NORMALIZED_DIR, PROCESSED_DIR, MINISTRY_MASTER_DATA,
-    FILENAME_YEAR_MAP, MINISTRY_NAME_VARIATIONS
+    FILENAME_YEAR_MAP, MINISTRY_NAME_VARIATIONS, SHEET_INDEX_PATH
+)
+from pipeline.checkpoint import StageCheckpoint, run_checkpointed
+from pipeline.partitions import filter_paths_by_year, year_order, write_partitions, concat_partition_csvs
+from pipeline.frame_cache import FrameLoader, read_normalized_frame, read_frame_columns, plan_columns, VIEW_DEFAULT_NA
+from pipeline.sheet_index import (
+    list_review_files, classify_header, clean_header_cell, SHEET_KIND_SEGMENT, SHEET_KIND_REVIEW
 )
 
 # ロガーの設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+FINAL_OUTPUT_COLS = [
+    'business_id', 'source_year', 'ministry_id', '府省庁',
+    '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5',
+    '事業名', '担当部局庁', '作成責任者', '事業開始終了年度', '担当課室',
+    '会計区分', '根拠法令（具体的な条項も記載）', '関係する計画、通知等',
+    '政策', '施策', '政策体系・評価書URL', '主要経費', '事業の目的',
+    '現状・課題', '事業概要', '事業概要URL', '実施方法'
+]
+# 事業開始終了年度の組み立てに使う列
+BUSINESS_PERIOD_COLS = ['事業開始・終了(予定)年度', '事業開始年度', '事業終了(予定)年度']
+# business.csv で引用符を付けない列 (それ以外の列は値を "" で囲み、値の中の " は "" にする)
+UNQUOTED_COLS = {'business_id', 'source_year', 'ministry_id'}
+# business.csv を書き出す際の1回あたりの行数
+BUSINESS_CSV_CHUNK_ROWS = 10000
+
 def get_year_from_filename(filename):
     """ファイル名から事業年度を特定するヘルパー関数"""
     for key, year in FILENAME_YEAR_MAP.items():
@@ -19,11 +41,98 @@ def get_year_from_filename(filename):
             return year
     return None
 
-def build_business_tables(update_status: Callable, job_id: str):
+def standardize_business_column(original_col: str) -> str:
+    """元の列名を、事業テーブルの統一列名に変換する。対象外の列は元の列名のまま返す"""
+    clean_col = clean_header_cell(original_col)
+
+    if clean_col == '府省': return '府省庁'
+    elif clean_col == '事業番号': return '事業番号-1'
+    elif clean_col.startswith('事業の目的'): return '事業の目的'
+    elif clean_col == '事業概要URL':
+        return '事業概要URL'
+    elif clean_col.startswith('事業概要'):
+        return '事業概要'
+    elif clean_col.startswith('根拠法令'): return '根拠法令（具体的な条項も記載）'
+    elif clean_col.startswith('現状・課題'): return '現状・課題'
+    elif clean_col in ('政策・施策名', '主要政策・施策'): return '政策'
+    elif clean_col == '主要施策': return '施策'
+    return original_col
+
+def _format_business_column(series: pd.Series, quoted: bool) -> list:
+    """1列分の値をCSVのフィールド文字列のリストにする。欠損値は空文字列 (引用符付きの列では "") になる"""
+    values = series.to_numpy(dtype=object, na_value='')
+    if quoted:
+        return ['"' + str(value).replace('"', '""') + '"' for value in values]
+    return [str(value) for value in values]
+
+def write_business_csv(final_df: pd.DataFrame, output_path):
+    """
+    事業テーブルを business.csv に書き出す。ヘッダーは引用符なし、UNQUOTED_COLS 以外の列は常に引用符で囲む。
+    値の変換は列単位で行い、列名の参照や欠損値の判定をセルごとに繰り返さない。
+    """
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        f.write(','.join(final_df.columns) + '\n')
+
+        for start in range(0, len(final_df), BUSINESS_CSV_CHUNK_ROWS):
+            chunk = final_df.iloc[start:start + BUSINESS_CSV_CHUNK_ROWS]
+            fields = [
+                _format_business_column(chunk.iloc[:, i], col_name not in UNQUOTED_COLS)
+                for i, col_name in enumerate(chunk.columns)
+            ]
+            f.write(''.join(','.join(row) + '\n' for row in zip(*fields)))
+
+@lru_cache(maxsize=None)
+def business_column_plan(columns: Tuple[str, ...]) -> Tuple[int, ...]:
+    """事業テーブルの構築で参照する列 (統一列名が出力列・事業期間の列となるもの) の位置を返す"""
+    needed = set(FINAL_OUTPUT_COLS) | set(BUSINESS_PERIOD_COLS)
+    return plan_columns(columns, lambda col: standardize_business_column(col) in needed)
+
+def _build_business_frame(filepath, file_year: int, frame_loader: FrameLoader) -> Optional[pd.DataFrame]:
+    """1ファイル分の事業レコードを統一列名で取り出す。レビューシートでない場合は None を返す"""
+    usecols = business_column_plan(read_frame_columns(filepath))
+    df = frame_loader(filepath, VIEW_DEFAULT_NA, usecols)
+
+    sheet_kind = classify_header(clean_header_cell(col) for col in df.columns)
+
+    if sheet_kind == SHEET_KIND_SEGMENT:
+        logging.info(f"Skipping '{filepath.name}' due to exclusion column.")
+        return None
+    if sheet_kind != SHEET_KIND_REVIEW:
+        logging.info(f"Skipping '{filepath.name}' as not a review sheet.")
+        return None
+
+    rename_map = {original_col: standardize_business_column(original_col) for original_col in df.columns}
+    df.rename(columns=rename_map, inplace=True)
+    
+    df = df.loc[:, ~df.columns.duplicated(keep='first')]
+    
+    df['事業開始終了年度'] = ''
+    if '事業開始・終了(予定)年度' in df.columns:
+        df['事業開始終了年度'] = df['事業開始・終了(予定)年度'].fillna('')
+    
+    if '事業開始年度' in df.columns and '事業終了(予定)年度' in df.columns:
+        start_year = df['事業開始年度'].fillna('')
+        end_year = df['事業終了(予定)年度'].fillna('')
+        combined_year = start_year.str.cat(end_year, sep='-').where(start_year.ne('') & end_year.ne(''), '')
+        df['事業開始終了年度'] = df['事業開始終了年度'].where(df['事業開始終了年度'].ne(''), combined_year)
+
+    df['business_id'] = [f"{file_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
+    df['source_year'] = file_year
+    
+    return df
+
+def build_business_tables(update_status: Callable, job_id: str, frame_loader: Optional[FrameLoader] = None,
+                          checkpoint: Optional[StageCheckpoint] = None,
+                          target_years: Optional[Collection[int]] = None):
     """
     ステージ3: 事業テーブルの構築
     正規化済みCSVを結合し、ministries.csv と business.csv を生成する。
+    frame_loader を指定した場合は、CSVの読み込みをそれに委ねる (ステージ間で共有するキャッシュ用)。
+    checkpoint を指定した場合は、ファイルごとの事業レコードを記録し、記録済みのファイルは結果を再利用する。
+    事業テーブルは年度ごとのパーティションに書き出してから business.csv に結合する。
+    target_years を指定した場合は、その年度のファイルだけを処理し、他の年度は既存のパーティションを使う。
     """
+    frame_loader = frame_loader or read_normalized_frame
     update_status(current_stage="ステージ3: 事業テーブルの構築", message="処理を開始します...")
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -38,19 +147,8 @@ def build_business_tables(update_status: Callable, job_id: str):
     update_status(message="事業テーブルを生成中...")
     all_business_records = []
     
-    REQUIRED_COLS_FOR_REVIEW_SHEET = {'府省', '府省庁', '事業名', '事業番号', '事業番号-1'}
-    EXCLUSION_COL = 'セグメント名'
-    
-    FINAL_OUTPUT_COLS = [
-        'business_id', 'source_year', 'ministry_id', '府省庁',
-        '事業番号-1', '事業番号-2', '事業番号-3', '事業番号-4', '事業番号-5',
-        '事業名', '担当部局庁', '作成責任者', '事業開始終了年度', '担当課室',
-        '会計区分', '根拠法令（具体的な条項も記載）', '関係する計画、通知等',
-        '政策', '施策', '政策体系・評価書URL', '主要経費', '事業の目的',
-        '現状・課題', '事業概要', '事業概要URL', '実施方法'
-    ]
-    
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    review_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
+    all_csv_files = filter_paths_by_year(review_files, target_years, get_year_from_filename)
     
     if not all_csv_files:
         logging.warning("[Stage 3] No .csv files found. Skipping.")
@@ -66,54 +164,15 @@ def build_business_tables(update_status: Callable, job_id: str):
             continue
         
         try:
-            df = pd.read_csv(filepath, low_memory=False, dtype=str, encoding='utf-8-sig')
-
-            cleaned_header = [str(col).replace('\n', '').replace('\r', '').replace(' ', '') for col in df.columns]
-
-            if EXCLUSION_COL in cleaned_header:
-                logging.info(f"Skipping '{filepath.name}' due to exclusion column.")
-                continue
-            if len(REQUIRED_COLS_FOR_REVIEW_SHEET.intersection(cleaned_header)) < 3:
-                logging.info(f"Skipping '{filepath.name}' as not a review sheet.")
+            df = run_checkpointed(checkpoint, filepath, lambda: _build_business_frame(filepath, file_year, frame_loader))
+            if df is None:
                 continue
-
-            rename_map = {}
-            for original_col in df.columns:
-                clean_col = str(original_col).replace('\n', '').replace('\r', '').replace(' ', '')
-                
-                if clean_col == '府省': rename_map[original_col] = '府省庁'
-                elif clean_col == '事業番号': rename_map[original_col] = '事業番号-1'
-                elif clean_col.startswith('事業の目的'): rename_map[original_col] = '事業の目的'
-                elif clean_col == '事業概要URL':
-                    rename_map[original_col] = '事業概要URL'
-                elif clean_col.startswith('事業概要'):
-                    rename_map[original_col] = '事業概要'
-                elif clean_col.startswith('根拠法令'): rename_map[original_col] = '根拠法令（具体的な条項も記載）'
-                elif clean_col.startswith('現状・課題'): rename_map[original_col] = '現状・課題'
-                elif clean_col in ('政策・施策名', '主要政策・施策'): rename_map[original_col] = '政策'
-                elif clean_col == '主要施策': rename_map[original_col] = '施策'
-            df.rename(columns=rename_map, inplace=True)
-            
-            df = df.loc[:, ~df.columns.duplicated(keep='first')]
-            
-            df['事業開始終了年度'] = ''
-            if '事業開始・終了(予定)年度' in df.columns:
-                df['事業開始終了年度'] = df['事業開始・終了(予定)年度'].fillna('')
-            
-            if '事業開始年度' in df.columns and '事業終了(予定)年度' in df.columns:
-                start_year = df['事業開始年度'].fillna('')
-                end_year = df['事業終了(予定)年度'].fillna('')
-                combined_year = start_year.str.cat(end_year, sep='-').where(start_year.ne('') & end_year.ne(''), '')
-                df['事業開始終了年度'] = df['事業開始終了年度'].where(df['事業開始終了年度'].ne(''), combined_year)
-
-            df['business_id'] = [f"{file_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
-            df['source_year'] = file_year
-            
             all_business_records.append(df)
         except Exception as e:
             logging.error(f"    [ERROR] Failed to process {filepath.name}: {e}", exc_info=True)
             raise
     
+    final_df = pd.DataFrame(columns=FINAL_OUTPUT_COLS)
     if all_business_records:
         update_status(message="全レビューシートを結合中...")
         master_df = pd.concat(all_business_records, ignore_index=True)
@@ -124,29 +183,10 @@ def build_business_tables(update_status: Callable, job_id: str):
              master_df['ministry_id'] = master_df['normalized_ministry_name'].map(ministry_name_to_id).astype('Int64')
         
         final_df = master_df.reindex(columns=FINAL_OUTPUT_COLS)
-        
-        business_output_path = PROCESSED_DIR / 'business.csv'
-        
-        UNQUOTED_COLS = {'business_id', 'source_year', 'ministry_id'}
-
-        with open(business_output_path, 'w', newline='', encoding='utf-8-sig') as f:
-            f.write(','.join(final_df.columns) + '\n')
-
-            for row in final_df.itertuples(index=False, name=None):
-                row_values = []
-                for i, value in enumerate(row):
-                    col_name = final_df.columns[i]
-                    str_value = str(value) if pd.notna(value) else ''
-                    
-                    if col_name in UNQUOTED_COLS:
-                        row_values.append(str_value)
-                    else:
-                        escaped_str = str_value.replace('"', '""')
-                        quoted_value = f'"{escaped_str}"'
-                        row_values.append(quoted_value)
-                
-                f.write(','.join(row_values) + '\n')
-        
-        logging.info(f"  - Saved 'business.csv' with {len(final_df)} records.")
+
+    written_years = write_partitions('business', final_df, final_df['source_year'], write_business_csv, target_years)
+    business_output_path = PROCESSED_DIR / 'business.csv'
+    if concat_partition_csvs('business', year_order(review_files, get_year_from_filename), business_output_path):
+        logging.info(f"  - Saved 'business.csv' with {len(final_df)} updated records (years: {written_years}).")
     
     update_status(message="ステージ3が完了しました。")
\ No newline at end of file
@@ -0,0 +1,262 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline.frame_cache import FrameLoader, read_normalized_frame, read_frame_columns, derive_view
+from pipeline.duckdb_utils import connect, read_csv_sql, sql_str
+
+# セルストアのディレクトリ構成:
+#   cells/<CSV名>.parquet   値のあるセルのみの縦持ち (source_year, row_idx, column_id, value)。column_id 順に並べる
+#   columns/<CSV名>.parquet 列の辞書 (column_id, column_name)。column_name は pandas で読んだ場合と同じ列名
+#   _cell_store.json        元CSVのサイズ・更新日時と行数 (元CSVが変わったファイルは使わない)
+CELL_STORE_MANIFEST_FILENAME = '_cell_store.json'
+
+
+class CellStore:
+    """
+    正規化済みCSVを、値のあるセルだけの縦持ち形式 (Parquet) で保持するセルストア。
+    レビューシートは数千列の大半が空のため、抽出処理は必要な column_id のセルだけを読み込める。
+    read_frame は正規化済みCSVを pd.read_csv で読んだ場合と同じDataFrameを復元する (FrameLoader として使える)。
+    """
+
+    def __init__(self, store_dir: Path):
+        self.store_dir = store_dir
+        self.manifest_path = store_dir / CELL_STORE_MANIFEST_FILENAME
+        self._entries: Optional[Dict[str, dict]] = None
+        self._columns: Dict[str, Tuple[str, ...]] = {}
+        self._con = None
+        self._lock = threading.Lock()
+        self.frames_read = 0
+        self.cells_read = 0
+        self.fallbacks = 0
+
+    @property
+    def entries(self) -> Dict[str, dict]:
+        """マニフェスト。ステージ2より前に作成されたインスタンスでも構築後の内容を使えるよう、最初の参照時に読み込む"""
+        if self._entries is None:
+            self._entries = {}
+            if self.manifest_path.exists():
+                try:
+                    self._entries = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Failed to read cell store manifest '{self.manifest_path.name}': {e}")
+        return self._entries
+
+    def __getstate__(self):
+        # ステージを別プロセスで実行する場合に渡せるよう、接続とロックは含めない (各プロセスで開き直す)
+        state = self.__dict__.copy()
+        state['_con'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def save(self):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.manifest_path)
+
+    def close(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def cells_path(self, csv_name: str) -> Path:
+        return self.store_dir / 'cells' / f"{Path(csv_name).stem}.parquet"
+
+    def columns_path(self, csv_name: str) -> Path:
+        return self.store_dir / 'columns' / f"{Path(csv_name).stem}.parquet"
+
+    def is_current(self, csv_path: Path) -> bool:
+        """元CSVの記録時からサイズ・更新日時が変わっておらず、ストアのファイルが揃っているか"""
+        entry = self.entries.get(csv_path.name)
+        if not entry or not csv_path.exists():
+            return False
+        stat = csv_path.stat()
+        return (
+            entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+            and self.cells_path(csv_path.name).exists() and self.columns_path(csv_path.name).exists()
+        )
+
+    def prune(self, csv_names: Sequence[str]):
+        """csv_names に無いファイルのセルを削除する"""
+        for name in [name for name in self.entries if name not in set(csv_names)]:
+            self.cells_path(name).unlink(missing_ok=True)
+            self.columns_path(name).unlink(missing_ok=True)
+            del self.entries[name]
+
+    def build(self, csv_path: Path, source_year: Optional[int]) -> dict:
+        """正規化済みCSV1ファイル分のセルと列の辞書を書き出し、マニフェストに記録する"""
+        columns = read_frame_columns(csv_path)
+        cells_path = self.cells_path(csv_path.name)
+        columns_path = self.columns_path(csv_path.name)
+        cells_path.parent.mkdir(parents=True, exist_ok=True)
+        columns_path.parent.mkdir(parents=True, exist_ok=True)
+        stat = csv_path.stat()
+        source = read_csv_sql(csv_path, len(columns))
+        year_sql = 'NULL' if source_year is None else str(int(source_year))
+
+        with connect() as con:
+            rows = con.execute(f"SELECT count(*) FROM {source}").fetchone()[0]
+            # 空文字列のセルはNULLとして読まれ、UNPIVOT で除かれる
+            tmp_cells = cells_path.with_suffix('.tmp')
+            con.execute(f"""
+                COPY (
+                    SELECT CAST({year_sql} AS INTEGER) AS source_year, row_idx,
+                           CAST(substr(col, 2) AS INTEGER) AS column_id, value
+                    FROM (
+                        UNPIVOT (SELECT row_number() OVER () - 1 AS row_idx, * FROM {source})
+                        ON COLUMNS(* EXCLUDE (row_idx)) INTO NAME col VALUE value
+                    )
+                    ORDER BY column_id, row_idx
+                ) TO {sql_str(tmp_cells.as_posix())} (FORMAT parquet, COMPRESSION zstd)
+            """)
+            n_cells = con.execute(f"SELECT count(*) FROM read_parquet({sql_str(tmp_cells.as_posix())})").fetchone()[0]
+
+            column_dict = pd.DataFrame({'column_id': range(len(columns)), 'column_name': list(columns)})
+            con.register('column_dict', column_dict)
+            tmp_columns = columns_path.with_suffix('.tmp')
+            con.execute(
+                f"COPY (SELECT * FROM column_dict ORDER BY column_id) "
+                f"TO {sql_str(tmp_columns.as_posix())} (FORMAT parquet, COMPRESSION zstd)"
+            )
+        tmp_cells.replace(cells_path)
+        tmp_columns.replace(columns_path)
+
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'source_year': source_year,
+            'rows': rows,
+            'columns': len(columns),
+            'cells': n_cells,
+            'store_bytes': cells_path.stat().st_size + columns_path.stat().st_size,
+        }
+        self.entries[csv_path.name] = entry
+        self._columns.pop(csv_path.name, None)
+        return entry
+
+    def _connection(self):
+        with self._lock:
+            if self._con is None:
+                self._con = connect()
+            # 接続はステージ間で共有するため、クエリごとにカーソルを使う
+            return self._con.cursor()
+
+    def columns(self, csv_name: str) -> Tuple[str, ...]:
+        """列の辞書 (column_id 順の列名) を返す"""
+        if csv_name not in self._columns:
+            with self._connection() as cur:
+                names = cur.execute(
+                    f"SELECT column_name FROM read_parquet({sql_str(self.columns_path(csv_name).as_posix())}) "
+                    f"ORDER BY column_id"
+                ).fetchall()
+            self._columns[csv_name] = tuple(name for (name,) in names)
+        return self._columns[csv_name]
+
+    def read_cells(self, csv_name: str, column_ids: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """指定した column_id の値のあるセル (row_idx, column_id, value) を読み込む。None の場合は全列"""
+        where = ''
+        if column_ids is not None:
+            if not column_ids:
+                return pd.DataFrame({
+                    'row_idx': np.array([], dtype=np.int64),
+                    'column_id': np.array([], dtype=np.int64),
+                    'value': np.array([], dtype=object),
+                })
+            where = f"WHERE column_id IN ({', '.join(str(int(i)) for i in column_ids)})"
+        with self._connection() as cur:
+            return cur.execute(
+                f"SELECT row_idx, column_id, value FROM read_parquet({sql_str(self.cells_path(csv_name).as_posix())}) {where}"
+            ).df()
+
+    def read_frame(self, csv_path: Path, view: str, usecols: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """
+        read_normalized_frame と同じDataFrameを、必要な列のセルだけから復元する。
+        ストアに無いファイルや元CSVが変更されたファイルは、正規化済みCSVから直接読み込む。
+        """
+        if not self.is_current(csv_path):
+            self.fallbacks += 1
+            logging.info(f"[CellStore] '{csv_path.name}' is not in the cell store or is outdated. Reading the CSV.")
+            return read_normalized_frame(csv_path, view, usecols)
+
+        names = self.columns(csv_path.name)
+        column_ids = list(range(len(names))) if usecols is None else sorted(usecols)
+        cells = self.read_cells(csv_path.name, None if usecols is None else column_ids)
+
+        position = np.full(len(names), -1, dtype=np.int64)
+        position[column_ids] = np.arange(len(column_ids))
+        values = np.full((self.entries[csv_path.name]['rows'], len(column_ids)), '', dtype=object)
+        values[cells['row_idx'].to_numpy(), position[cells['column_id'].to_numpy()]] = cells['value'].to_numpy(dtype=object)
+        base = pd.DataFrame(values, columns=[names[i] for i in column_ids], dtype=str)
+
+        with self._lock:
+            self.frames_read += 1
+            self.cells_read += len(cells)
+        return derive_view(base, view)
+
+    # --- FrameCache と同じ、ステージ3〜6からの利用インターフェース ---
+    stats_key = 'cell_store_reads'
+
+    def loader_for(self, consumer: str) -> FrameLoader:
+        """processing 関数に渡す読み込み関数 (path, view, usecols) -> DataFrame を返す"""
+        return lambda path, view, usecols=None: self.read_frame(path, view, usecols)
+
+    def finish(self, consumer: str):
+        pass
+
+    def clear(self):
+        self.close()
+
+    def stats(self) -> dict:
+        return {
+            'frames_read': self.frames_read,
+            'cells_read': self.cells_read,
+            'fallbacks': self.fallbacks,
+        }
+
+
+def build_cell_store(csv_paths: List[Path], store_dir: Path, get_year: Callable[[str], Optional[int]],
+                     on_file_start: Optional[Callable] = None,
+                     check_cancelled: Optional[Callable] = None) -> dict:
+    """
+    正規化済みCSVのセルストアを構築する。前回の構築から変更の無いファイルはスキップする。
+    構築結果の統計 (ファイル数・セル数・CSVとストアのサイズ) を返す。
+    """
+    store = CellStore(store_dir)
+    store.prune([p.name for p in csv_paths])
+    built = skipped = 0
+    try:
+        for i, csv_path in enumerate(csv_paths):
+            if check_cancelled:
+                check_cancelled()
+            if store.is_current(csv_path):
+                skipped += 1
+                continue
+            if on_file_start:
+                on_file_start(i + 1, len(csv_paths), csv_path)
+            store.build(csv_path, get_year(csv_path.name))
+            built += 1
+            store.save()
+    finally:
+        store.save()
+
+    entries = [store.entries[p.name] for p in csv_paths if p.name in store.entries]
+    total_cells = sum(e['rows'] * e['columns'] for e in entries)
+    stored_cells = sum(e['cells'] for e in entries)
+    return {
+        'built_files': built,
+        'skipped_files': skipped,
+        'cells': stored_cells,
+        'fill_rate': round(stored_cells / total_cells, 3) if total_cells else 0.0,
+        'csv_mb': round(sum(e['size'] for e in entries) / 1024 / 1024, 1),
+        'store_mb': round(sum(e['store_bytes'] for e in entries) / 1024 / 1024, 1),
+    }
@@ -0,0 +1,112 @@
+import json
+import pickle
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from pipeline.stage_cache import code_version
+
+T = TypeVar('T')
+
+CHECKPOINT_FILENAME = "_checkpoint.json"
+
+
+class StageCheckpoint:
+    """
+    ステージ内のファイル単位の完了記録 (チェックポイント)。
+    ファイルの処理を終えるごとに、入力ファイルの状態 (サイズ・更新日時) と処理結果 (pickle) を checkpoint_dir に記録する。
+    resume=True の場合は前回中断した実行の記録を引き継ぎ、記録済みで入力が変わっていないファイルは処理結果を読み出して再利用する。
+    resume=False の場合、または設定値・コードが前回の記録時と異なる場合は、記録を破棄して最初から処理する。
+    ステージが最後まで完了したら complete() で記録を削除する。
+    """
+
+    def __init__(self, checkpoint_dir: Path, resume: bool = False, settings: Optional[Dict[str, Any]] = None):
+        self.checkpoint_dir = checkpoint_dir
+        self.manifest_path = checkpoint_dir / CHECKPOINT_FILENAME
+        payload = json.dumps(
+            {'code_version': code_version(), 'settings': settings or {}},
+            ensure_ascii=False, sort_keys=True, default=repr
+        )
+        self.fingerprint = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        self.files: Dict[str, dict] = {}
+        self.resumed_files = 0
+
+        if resume and self.manifest_path.exists():
+            try:
+                entry = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to read checkpoint '{self.manifest_path}': {e}")
+                entry = {}
+            if entry.get('fingerprint') == self.fingerprint:
+                self.files = entry.get('files', {})
+            else:
+                logging.info(f"Checkpoint in '{checkpoint_dir.name}' was recorded with different settings. Discarding.")
+        if not self.files and checkpoint_dir.exists():
+            shutil.rmtree(checkpoint_dir)
+
+    @staticmethod
+    def _file_state(path: Path) -> dict:
+        stat = path.stat()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _result_path(self, path: Path) -> Path:
+        return self.checkpoint_dir / f"{path.name}.pkl"
+
+    def save(self):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        tmp_path.write_text(
+            json.dumps({'fingerprint': self.fingerprint, 'files': self.files}, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+        tmp_path.replace(self.manifest_path)
+
+    def is_done(self, path: Path) -> bool:
+        """前回までの実行で処理を終え、その後入力ファイルが変更されていないかどうか"""
+        entry = self.files.get(path.name)
+        if entry is None or not path.exists() or entry['state'] != self._file_state(path):
+            return False
+        return not entry['has_result'] or self._result_path(path).exists()
+
+    def mark_done(self, path: Path, result: Any = None, has_result: bool = False):
+        """ファイルの処理の完了を記録する。has_result=True の場合は result も保存し、再開時に load_result で読み出せるようにする"""
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        if has_result:
+            result_path = self._result_path(path)
+            tmp_path = result_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.replace(result_path)
+        self.files[path.name] = {'state': self._file_state(path), 'has_result': has_result}
+        self.save()
+
+    def load_result(self, path: Path) -> Any:
+        if not self.files[path.name]['has_result']:
+            return None
+        with open(self._result_path(path), 'rb') as f:
+            return pickle.load(f)
+
+    def complete(self):
+        """ステージの完了時に記録を削除する"""
+        self.files = {}
+        if self.checkpoint_dir.exists():
+            shutil.rmtree(self.checkpoint_dir)
+
+
+def run_checkpointed(checkpoint: Optional[StageCheckpoint], path: Path, compute: Callable[[], T]) -> T:
+    """
+    1ファイル分の処理 compute() を実行し、その結果をチェックポイントに記録する。
+    チェックポイントに完了済みとして記録されているファイルは、compute() を呼ばずに記録済みの結果を返す。
+    compute() が例外を送出した場合は記録しない (再開時にもう一度処理する)。
+    """
+    if checkpoint is None:
+        return compute()
+    if checkpoint.is_done(path):
+        checkpoint.resumed_files += 1
+        logging.info(f"    前回の実行で処理済みのため、記録した結果を使用: {path.name}")
+        return checkpoint.load_result(path)
+    result = compute()
+    checkpoint.mark_done(path, result, has_result=True)
+    return result
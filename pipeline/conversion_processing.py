@@ -0,0 +1,421 @@
+import csv
+import json
+import hashlib
+import shutil
+import logging
+import zipfile
+import tempfile
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager, ExitStack
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, NamedTuple, Optional, Tuple
+
+from pipeline.excel_readers import get_reader_engine
+from pipeline.sheet_index import classify_raw_header_row
+from utils.normalization import normalize_text
+
+# --- 定数定義 ---
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+# ワーカー側でキャンセル要求を確認する行間隔
+CANCEL_CHECK_INTERVAL_ROWS = 1000
+# メインプロセスがタスク完了を待つ間にキャンセル要求を確認する間隔(秒)
+CANCEL_POLL_INTERVAL_SEC = 1.0
+# シート数がこれ未満のブックはシート単位に分けず、ブック単位の1タスクで変換する
+# (シート単位のタスクはそれぞれブックを開き直し、共有文字列を読み込み直すため)
+MIN_SHEETS_FOR_SHEET_TASKS = 4
+
+# マニフェストの形式バージョン。変換結果が変わる修正を入れた場合は値を上げ、全ファイルを再変換させる
+MANIFEST_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ワーカープロセス内で共有されるキャンセルフラグ (initializerで設定される)
+_cancel_event = None
+
+
+class ConversionCancelledError(Exception):
+    """ワーカープロセス内で変換処理がキャンセルされたことを示す例外"""
+    pass
+
+
+class ExcelSource(NamedTuple):
+    """変換対象のExcelブック。ZIP内のブックの場合は member にZIP内のパスを持つ"""
+    path: Path
+    member: Optional[str]
+    file_stem: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.path.name}:{self.member}" if self.member else self.path.name
+
+
+class ConversionOptions(NamedTuple):
+    """
+    ステージ1の変換条件。
+    raw_dir を None にすると生CSVを書き出さず、normalized_dir を指定すると
+    読み出したセルをその場で正規化して正規化済みCSVを直接書き出す (ステージ2との融合モード)。
+    """
+    raw_dir: Optional[Path]
+    normalized_dir: Optional[Path] = None
+    engine: str = 'openpyxl'
+    sheet_kinds: Optional[Collection[str]] = None
+
+    def manifest_key(self) -> dict:
+        """変換結果に影響する条件 (マニフェストに記録し、変化した場合は再変換する)"""
+        return {
+            'sheet_kinds': sorted(self.sheet_kinds) if self.sheet_kinds is not None else None,
+            'write_raw': self.raw_dir is not None,
+            'normalize': self.normalized_dir is not None,
+        }
+
+
+class SheetResult(NamedTuple):
+    """1シート分の変換結果。シート種別の絞り込みで変換を省略した場合 output_paths は空"""
+    sheet_name: str
+    csv_name: str
+    kind: str
+    output_paths: List[Path]
+
+    def as_index_entry(self) -> dict:
+        return {'csv': self.csv_name, 'sheet': self.sheet_name, 'kind': self.kind,
+                'converted': bool(self.output_paths)}
+
+
+def list_excel_sources(source_paths: List[Path]) -> List[ExcelSource]:
+    """ダウンロードファイル(ZIP/XLSX)の一覧から、変換対象となるExcelブックの一覧を作成する"""
+    sources = []
+    for path in source_paths:
+        if path.suffix == '.zip':
+            with zipfile.ZipFile(path, 'r') as zf:
+                for file_in_zip in zf.namelist():
+                    if file_in_zip.endswith('.xlsx') and not file_in_zip.startswith('__MACOSX'):
+                        sources.append(ExcelSource(path, file_in_zip, Path(file_in_zip).stem))
+        elif path.suffix == '.xlsx':
+            sources.append(ExcelSource(path, None, path.stem))
+    return sources
+
+
+@contextmanager
+def open_excel_source(source: ExcelSource):
+    """ExcelSourceを openpyxl / zipfile に渡せるファイルオブジェクト(またはパス)として開く"""
+    if source.member is None:
+        yield source.path
+        return
+    with zipfile.ZipFile(source.path, 'r') as zf:
+        with zf.open(source.member) as excel_stream:
+            yield excel_stream
+
+
+def list_sheet_names(source: ExcelSource) -> List[str]:
+    """
+    workbook.xml のみを読み、シート名を定義順に返す。
+    openpyxl.load_workbook は共有文字列を全て読み込むため、シート一覧の取得には使用しない。
+    """
+    with open_excel_source(source) as excel_source:
+        with zipfile.ZipFile(excel_source, 'r') as xlsx:
+            root = ET.fromstring(xlsx.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter(f'{SPREADSHEET_NS}sheet')]
+
+
+def sheet_csv_name(file_stem: str, sheet_name: str) -> str:
+    return f"{file_stem}_{sheet_name}.csv"
+
+
+def _escape_cell(cell) -> str:
+    # 改行コード(\n)を<br>タグに置換する
+    return str(cell).replace('\r', '').replace('\n', '<br>') if cell is not None else ""
+
+
+def _write_sheet(rows, raw_path: Optional[Path], normalized_path: Optional[Path]) -> List[Path]:
+    """
+    シートの行を生CSV・正規化済みCSVのいずれか、または両方に書き出す。
+    正規化済みCSVは、生CSVを書き出してステージ2で読み直した場合と同じ内容になる。
+    """
+    output_paths = [p for p in (raw_path, normalized_path) if p is not None]
+    try:
+        with ExitStack() as stack:
+            raw_writer = normalized_writer = None
+            if raw_path is not None:
+                raw_file = stack.enter_context(open(raw_path, 'w', newline='', encoding='utf-8-sig'))
+                raw_writer = csv.writer(raw_file, quoting=csv.QUOTE_ALL)
+            if normalized_path is not None:
+                normalized_file = stack.enter_context(open(normalized_path, 'w', newline='', encoding='utf-8-sig'))
+                normalized_writer = csv.writer(normalized_file, quoting=csv.QUOTE_ALL)
+
+            for row_count, row in enumerate(rows, 1):
+                if _cancel_event is not None and row_count % CANCEL_CHECK_INTERVAL_ROWS == 0 and _cancel_event.is_set():
+                    raise ConversionCancelledError(f"Conversion of '{output_paths[0].name}' was cancelled.")
+                escaped_row = [_escape_cell(cell) for cell in row]
+                if raw_writer is not None:
+                    raw_writer.writerow(escaped_row)
+                if normalized_writer is not None:
+                    normalized_writer.writerow([normalize_text(cell) for cell in escaped_row])
+    except ConversionCancelledError:
+        # 書きかけのCSVを残さない
+        for output_path in output_paths:
+            output_path.unlink(missing_ok=True)
+        raise
+    return output_paths
+
+
+def _convert_sheet_rows(reader, source: ExcelSource, sheet_name: str, options: ConversionOptions) -> SheetResult:
+    """
+    先頭行(ヘッダー)のみを先に読んでシート種別を判定し、対象種別であれば続けて全行をCSVに書き出す。
+    """
+    csv_name = sheet_csv_name(source.file_stem, sheet_name)
+    rows = iter(reader.iter_rows(sheet_name))
+    header_row = next(rows, None)
+    kind = classify_raw_header_row(header_row or ())
+    if options.sheet_kinds is not None and kind not in options.sheet_kinds:
+        logging.info(f"  - Skipping sheet: '{sheet_name}' ({kind} sheet)")
+        return SheetResult(sheet_name, csv_name, kind, [])
+
+    logging.info(f"  - Saving sheet: '{sheet_name}' -> '{csv_name}'")
+    output_paths = _write_sheet(
+        chain([header_row], rows) if header_row is not None else rows,
+        options.raw_dir / csv_name if options.raw_dir is not None else None,
+        options.normalized_dir / csv_name if options.normalized_dir is not None else None,
+    )
+    return SheetResult(sheet_name, csv_name, kind, output_paths)
+
+
+def convert_workbook(source: ExcelSource, options: ConversionOptions) -> List[SheetResult]:
+    """ブック内の全シートを逐次CSVに変換する"""
+    results = []
+    with open_excel_source(source) as excel_source:
+        with get_reader_engine(options.engine)(excel_source) as reader:
+            for sheet_name in reader.sheet_names:
+                results.append(_convert_sheet_rows(reader, source, sheet_name, options))
+    return results
+
+
+def convert_sheet(source: ExcelSource, sheet_name: str, options: ConversionOptions) -> SheetResult:
+    """ブック内の1シートのみをCSVに変換する (プロセスプールのタスク単位)"""
+    with open_excel_source(source) as excel_source:
+        with get_reader_engine(options.engine)(excel_source) as reader:
+            return _convert_sheet_rows(reader, source, sheet_name, options)
+
+
+def plan_workbook_tasks(source: ExcelSource, extract_dir: Path) -> Tuple[List[str], Optional[ExcelSource]]:
+    """
+    ブックのシート名を定義順に返す (プロセスプールのタスク単位)。
+    シート単位のタスクに分ける場合は、各タスクが開くブックも返す。ZIP内のブックは extract_dir に一度だけ展開し、
+    各タスクがZIPを開き直さずに済むようにする。ブック単位で変換する場合は None を返す。
+    """
+    sheet_names = list_sheet_names(source)
+    if len(sheet_names) < MIN_SHEETS_FOR_SHEET_TASKS:
+        return sheet_names, None
+    if source.member is None:
+        return sheet_names, source
+    extracted_path = extract_dir / f"{hashlib.sha256(source.label.encode('utf-8')).hexdigest()[:16]}.xlsx"
+    with open_excel_source(source) as excel_stream, open(extracted_path, 'wb') as f:
+        shutil.copyfileobj(excel_stream, f)
+    return sheet_names, ExcelSource(extracted_path, None, source.file_stem)
+
+
+def compute_file_hash(path: Path) -> str:
+    """ファイル内容のSHA-256ハッシュを返す"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """
+    ダウンロードファイルごとに、内容ハッシュ・サイズ・更新日時と、そこから生成したCSVの一覧を記録する。
+    ステージ1はこれを参照し、新規または変更されたファイルのみを変換する。
+    生成したCSVは base_dir (dataディレクトリ) からの相対パスで記録する。
+    """
+
+    def __init__(self, manifest_path: Path, base_dir: Path):
+        self.manifest_path = manifest_path
+        self.base_dir = base_dir
+        self.entries: Dict[str, dict] = {}
+        if manifest_path.exists():
+            try:
+                data = json.loads(manifest_path.read_text(encoding='utf-8'))
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data.get('sources', {})
+                else:
+                    logging.info("[Stage 1] Manifest version changed. All files will be converted.")
+            except (OSError, ValueError) as e:
+                logging.warning(f"[Stage 1] Failed to read manifest '{manifest_path.name}': {e}. All files will be converted.")
+
+    def save(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        tmp_path.write_text(
+            json.dumps({'version': MANIFEST_VERSION, 'sources': self.entries}, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+        tmp_path.replace(self.manifest_path)
+
+    def is_up_to_date(self, path: Path, options: ConversionOptions) -> bool:
+        """前回と同じ条件で変換済みで内容が変わっておらず、生成したCSVも全て残っている場合にTrueを返す"""
+        entry = self.entries.get(path.name)
+        if not entry:
+            return False
+        if entry.get('options') != options.manifest_key():
+            return False
+        if not all((self.base_dir / name).exists() for name in entry['outputs']):
+            return False
+
+        stat = path.stat()
+        if entry['size'] != stat.st_size:
+            return False
+        if entry['mtime'] == stat.st_mtime:
+            return True
+        # 更新日時のみが変わった場合(コピーし直し等)は内容ハッシュで判定する
+        if entry['sha256'] != compute_file_hash(path):
+            return False
+        entry['mtime'] = stat.st_mtime
+        return True
+
+    def record(self, path: Path, output_paths: List[Path], options: ConversionOptions):
+        """変換が完了したファイルを記録する。前回の出力のうち今回生成されなかったCSVは削除する"""
+        output_names = sorted(p.relative_to(self.base_dir).as_posix() for p in output_paths)
+        self._remove_outputs(path.name, keep=set(output_names))
+        stat = path.stat()
+        self.entries[path.name] = {
+            'sha256': compute_file_hash(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'outputs': output_names,
+            'options': options.manifest_key(),
+        }
+
+    def remove_missing_sources(self, existing_names: List[str]) -> List[str]:
+        """元ファイルが削除されたエントリについて、生成済みCSVを削除しエントリを破棄する。破棄した元ファイル名を返す"""
+        existing = set(existing_names)
+        missing = [name for name in self.entries if name not in existing]
+        for name in missing:
+            logging.info(f"[Stage 1] Source '{name}' no longer exists. Removing its raw CSV files.")
+            self._remove_outputs(name, keep=set())
+            del self.entries[name]
+        return missing
+
+    def _remove_outputs(self, source_name: str, keep: set):
+        entry = self.entries.get(source_name)
+        if not entry:
+            return
+        for name in entry['outputs']:
+            if name not in keep:
+                (self.base_dir / name).unlink(missing_ok=True)
+
+
+def _init_worker(cancel_event):
+    global _cancel_event
+    _cancel_event = cancel_event
+
+
+def convert_sources_parallel(
+    sources: List[ExcelSource],
+    options: ConversionOptions,
+    max_workers: int,
+    on_progress: Callable[[int, int, str], None],
+    check_cancelled: Optional[Callable[[], None]] = None,
+    on_source_done: Optional[Callable[[Path, List[SheetResult]], None]] = None,
+) -> Dict[Path, List[SheetResult]]:
+    """
+    プロセスプールを使い、ブック単位・シート単位でCSV変換を並列実行する。
+    シート数が MIN_SHEETS_FOR_SHEET_TASKS 未満のブックはブック単位の1タスクで、それ以外はシート単位のタスクで変換する。
+    戻り値は ダウンロードファイルのパス -> シートごとの変換結果の一覧 の辞書。
+    変換結果はタスクの完了順ではなく、逐次処理と同じ順 (sources の順、ブック内はシートの定義順) に並べる。
+    on_progress(完了数, 総数, 対象名) と check_cancelled() はメインプロセスで呼び出される。
+    on_source_done(ダウンロードファイルのパス, 変換結果の一覧) は、そのファイルの全シートの変換が終わった時点で呼び出される
+    (中断された場合に、変換を終えたファイルだけを記録できるようにする)。
+    これらが例外(キャンセル等)を送出した場合は、未着手のタスクを破棄し、
+    実行中のワーカーにも停止を指示してから例外を再送出する。
+    """
+    ctx = multiprocessing.get_context('spawn')
+    cancel_event = ctx.Event()
+    # ダウンロードファイルのパス -> (sources内の位置, シートの位置) -> 変換結果
+    results: Dict[Path, Dict[Tuple[int, int], SheetResult]] = {source.path: {} for source in sources}
+    # シート単位で変換中のブックの未完了のシート数と、ZIPから展開したブック (全シートの変換を終えたら削除する)
+    remaining_sheets: Dict[int, int] = {}
+    extracted_paths: Dict[int, Path] = {}
+    extract_dir = Path(tempfile.mkdtemp(prefix='convert_'))
+    # ダウンロードファイルごとの未完了タスク数 (シート一覧の取得 + 判明したシートの変換)
+    outstanding = {}
+    for source in sources:
+        outstanding[source.path] = outstanding.get(source.path, 0) + 1
+
+    def ordered_results(path: Path) -> List[SheetResult]:
+        return [result for _, result in sorted(results[path].items())]
+
+    def task_done(path: Path, count: int = 1):
+        outstanding[path] -= count
+        if outstanding[path] == 0 and on_source_done is not None:
+            on_source_done(path, ordered_results(path))
+
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=ctx,
+        initializer=_init_worker, initargs=(cancel_event,)
+    )
+    try:
+        # 1. ブック単位でシート一覧を並列取得
+        listing_futures = {
+            executor.submit(plan_workbook_tasks, source, extract_dir): (position, source)
+            for position, source in enumerate(sources)
+        }
+        workbook_futures = {}
+        sheet_futures = {}
+        pending = set(listing_futures)
+        total = len(sources)
+        done_count = 0
+
+        while pending:
+            done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL_SEC, return_when=FIRST_COMPLETED)
+            if check_cancelled is not None:
+                check_cancelled()
+            for future in done:
+                if future in listing_futures:
+                    # 2. シートが判明したブックから順に、ブック単位またはシート単位のタスクを投入
+                    position, source = listing_futures[future]
+                    sheet_names, sheet_source = future.result()
+                    if not sheet_names:
+                        done_count += 1
+                        on_progress(done_count, total, source.label)
+                        task_done(source.path)
+                    elif sheet_source is None:
+                        workbook_future = executor.submit(convert_workbook, source, options)
+                        workbook_futures[workbook_future] = (position, source)
+                        pending.add(workbook_future)
+                    else:
+                        total += len(sheet_names) - 1
+                        remaining_sheets[position] = len(sheet_names)
+                        if sheet_source.path != source.path:
+                            extracted_paths[position] = sheet_source.path
+                        for sheet_position, sheet_name in enumerate(sheet_names):
+                            sheet_future = executor.submit(convert_sheet, sheet_source, sheet_name, options)
+                            sheet_futures[sheet_future] = (position, sheet_position, source, f"{source.label} [{sheet_name}]")
+                            pending.add(sheet_future)
+                        task_done(source.path, 1 - len(sheet_names))
+                elif future in workbook_futures:
+                    position, source = workbook_futures[future]
+                    for sheet_position, result in enumerate(future.result()):
+                        results[source.path][(position, sheet_position)] = result
+                    done_count += 1
+                    on_progress(done_count, total, source.label)
+                    task_done(source.path)
+                else:
+                    position, sheet_position, source, label = sheet_futures[future]
+                    results[source.path][(position, sheet_position)] = future.result()
+                    remaining_sheets[position] -= 1
+                    if remaining_sheets[position] == 0 and position in extracted_paths:
+                        extracted_paths.pop(position).unlink(missing_ok=True)
+                    done_count += 1
+                    on_progress(done_count, total, label)
+                    task_done(source.path)
+    except BaseException:
+        cancel_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+    executor.shutdown(wait=True)
+    return {path: ordered_results(path) for path in results}
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import duckdb
+
+from config import DUCKDB_THREADS, DUCKDB_MEMORY_LIMIT, DUCKDB_TEMP_DIR
+
+# DuckDBの接続とSQLの組み立てに使う共通の関数 (抽出エンジン・セルストア・Parquetの書き出しで使う)
+
+
+def connect() -> duckdb.DuckDBPyConnection:
+    """インメモリのDuckDB接続を作成する (スレッド数・メモリ上限・一時ディレクトリは設定ファイルの値)"""
+    con = duckdb.connect(database=':memory:')
+    # row_number() OVER () をCSVの行順と一致させるため、読み込み順を保持する
+    con.execute("SET preserve_insertion_order = true")
+    con.execute(f"SET temp_directory = {sql_str(DUCKDB_TEMP_DIR.as_posix())}")
+    if DUCKDB_THREADS:
+        con.execute(f"SET threads = {int(DUCKDB_THREADS)}")
+    if DUCKDB_MEMORY_LIMIT:
+        con.execute(f"SET memory_limit = {sql_str(DUCKDB_MEMORY_LIMIT)}")
+    return con
+
+
+def sql_str(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def sql_ident(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def read_csv_sql(path: Path, n_columns: int) -> str:
+    """
+    正規化済みCSVを全列 VARCHAR として読む read_csv 呼び出し。
+    列名には重複があり得るため、位置に基づく c0, c1, ... を付ける (参照した列だけが読み込まれる)。
+    pandasと同様に空文字列はNULLとなり、列が足りない行はNULLで補う。
+    """
+    columns = ', '.join(f"'c{i}': 'VARCHAR'" for i in range(n_columns))
+    return (
+        f"read_csv({sql_str(path.as_posix())}, header = true, auto_detect = false, "
+        f"null_padding = true, columns = {{{columns}}})"
+    )
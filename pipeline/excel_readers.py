@@ -0,0 +1,285 @@
+import io
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import openpyxl
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.cell import column_index_from_string, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+
+# --- 定数定義 ---
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+SHEET_TAG = f'{SPREADSHEET_NS}sheet'
+WORKBOOK_PR_TAG = f'{SPREADSHEET_NS}workbookPr'
+DIMENSION_TAG = f'{SPREADSHEET_NS}dimension'
+SHEET_DATA_TAG = f'{SPREADSHEET_NS}sheetData'
+ROW_TAG = f'{SPREADSHEET_NS}row'
+VALUE_TAG = f'{SPREADSHEET_NS}v'
+TEXT_TAG = f'{SPREADSHEET_NS}t'
+RUN_TAG = f'{SPREADSHEET_NS}r'
+SHARED_STRING_TAG = f'{SPREADSHEET_NS}si'
+INLINE_STRING_TAG = f'{SPREADSHEET_NS}is'
+
+
+class ExcelReaderEngine:
+    """
+    Excelブックからシートの値を行単位で読み出すエンジンの共通インターフェース。
+    iter_rows は openpyxl の iter_rows(values_only=True) と同じ値・行幅のタプルを返すこと。
+    """
+    name = None
+
+    def __init__(self, excel_source):
+        self.excel_source = excel_source
+
+    @property
+    def sheet_names(self) -> List[str]:
+        raise NotImplementedError
+
+    def iter_rows(self, sheet_name: str) -> Iterator[Sequence]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OpenpyxlReaderEngine(ExcelReaderEngine):
+    """openpyxl の読み取り専用モードを使用する標準エンジン"""
+    name = 'openpyxl'
+
+    def __init__(self, excel_source):
+        super().__init__(excel_source)
+        self.workbook = openpyxl.load_workbook(excel_source, read_only=True, data_only=True)
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self.workbook.sheetnames
+
+    def iter_rows(self, sheet_name: str) -> Iterator[Sequence]:
+        return self.workbook[sheet_name].iter_rows(values_only=True)
+
+    def close(self):
+        self.workbook.close()
+
+
+def _text_content(node) -> str:
+    """<si>/<is> 要素から書式を除いたテキストを取り出す (ふりがな<rPh>は除外)"""
+    snippets = []
+    for child in node:
+        if child.tag == TEXT_TAG:
+            if child.text is not None:
+                snippets.append(child.text)
+        elif child.tag == RUN_TAG:
+            text = child.findtext(TEXT_TAG)
+            if text is not None:
+                snippets.append(text)
+    return ''.join(snippets)
+
+
+def _cast_number(value: str):
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XmlStreamReaderEngine(ExcelReaderEngine):
+    """
+    sheetN.xml と sharedStrings.xml をZIPから直接ストリーム読み込みする高速エンジン。
+    openpyxl のセルオブジェクト生成を省き、値の変換規則(数値・日付・真偽値・共有文字列)と
+    行の補完規則は openpyxl の読み取り専用モードに合わせている。
+    """
+    name = 'xml'
+
+    def __init__(self, excel_source):
+        super().__init__(excel_source)
+        if not isinstance(excel_source, (str, bytes)) and hasattr(excel_source, 'read') \
+                and not isinstance(excel_source, io.BytesIO):
+            # ZIP内のストリームは後方シークのたびに再展開されるため、メモリに読み込んでおく
+            excel_source = io.BytesIO(excel_source.read())
+        self.archive = zipfile.ZipFile(excel_source, 'r')
+        self._sheet_paths = self._read_sheet_paths()
+        self._shared_strings = None
+        self._column_cache: Dict[str, int] = {}
+        self._read_styles()
+
+    def _read_sheet_paths(self) -> Dict[str, str]:
+        workbook = ET.fromstring(self.archive.read('xl/workbook.xml'))
+        workbook_pr = workbook.find(WORKBOOK_PR_TAG)
+        date1904 = workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true')
+        self.epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+
+        rels = ET.fromstring(self.archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{PACKAGE_RELATIONSHIP_NS}Relationship')}
+
+        sheet_paths = {}
+        for sheet in workbook.iter(SHEET_TAG):
+            target = targets[sheet.get(f'{RELATIONSHIP_NS}id')]
+            if target.startswith('/'):
+                sheet_paths[sheet.get('name')] = target.lstrip('/')
+            else:
+                sheet_paths[sheet.get('name')] = posixpath.normpath(posixpath.join('xl', target))
+        return sheet_paths
+
+    def _read_styles(self):
+        self.date_formats, self.timedelta_formats = set(), set()
+        try:
+            src = self.archive.read('xl/styles.xml')
+        except KeyError:
+            return
+        stylesheet = Stylesheet.from_tree(ET.fromstring(src))
+        if stylesheet.cell_styles:
+            self.date_formats = stylesheet.date_formats
+            self.timedelta_formats = stylesheet.timedelta_formats
+
+    @property
+    def shared_strings(self) -> List[str]:
+        if self._shared_strings is None:
+            strings = []
+            try:
+                src = self.archive.open('xl/sharedStrings.xml')
+            except KeyError:
+                self._shared_strings = strings
+                return strings
+            with src:
+                for _, node in ET.iterparse(src):
+                    if node.tag == SHARED_STRING_TAG:
+                        strings.append(_text_content(node).replace('x005F_', ''))
+                        node.clear()
+            self._shared_strings = strings
+        return self._shared_strings
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self._sheet_paths)
+
+    def _column_index(self, coordinate: str) -> int:
+        letters = coordinate.rstrip('0123456789')
+        column = self._column_cache.get(letters)
+        if column is None:
+            column = column_index_from_string(letters)
+            self._column_cache[letters] = column
+        return column
+
+    def _cell_value(self, cell, shared_strings):
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            child = cell.find(INLINE_STRING_TAG)
+            return _text_content(child) if child is not None else None
+
+        value = cell.findtext(VALUE_TAG) or None
+        if value is None:
+            return None
+        if data_type == 'n':
+            value = _cast_number(value)
+            style_id = int(cell.get('s', 0))
+            if style_id in self.date_formats:
+                try:
+                    return from_excel(value, self.epoch, timedelta=style_id in self.timedelta_formats)
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return value
+        if data_type == 's':
+            return shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        return value
+
+    def _parse_rows(self, src):
+        """(行番号, [(列番号, 値), ...]) を順に返す"""
+        shared_strings = self.shared_strings
+        row_counter = 0
+        for _, element in ET.iterparse(src):
+            if element.tag != ROW_TAG:
+                continue
+            row_attr = element.get('r')
+            if row_attr is not None:
+                try:
+                    row_counter = int(row_attr)
+                except ValueError:
+                    row_counter = int(float(row_attr))
+            else:
+                row_counter += 1
+
+            cells = []
+            col_counter = 0
+            for cell in element:
+                coordinate = cell.get('r')
+                col_counter = self._column_index(coordinate) if coordinate else col_counter + 1
+                cells.append((col_counter, self._cell_value(cell, shared_strings)))
+            element.clear()
+            yield row_counter, cells
+
+    def _read_dimensions(self, sheet_path: str):
+        with self.archive.open(sheet_path) as src:
+            for _, element in ET.iterparse(src, events=('start',)):
+                if element.tag == DIMENSION_TAG:
+                    return range_boundaries(element.get('ref'))
+                if element.tag == SHEET_DATA_TAG:
+                    return None
+        return None
+
+    def iter_rows(self, sheet_name: str) -> Iterator[Sequence]:
+        sheet_path = self._sheet_paths[sheet_name]
+        dimensions = self._read_dimensions(sheet_path)
+        max_col = max_row = None
+        if dimensions is not None:
+            _, _, max_col, max_row = dimensions
+
+        empty_row = (None,) * max_col if max_col is not None else []
+        counter = 1
+        idx = 1
+        with self.archive.open(sheet_path) as src:
+            for idx, cells in self._parse_rows(src):
+                if max_row is not None and idx > max_row:
+                    break
+                # 欠落している行は空行で補完する
+                while counter < idx:
+                    counter += 1
+                    yield empty_row
+                if counter <= idx:
+                    counter += 1
+                    yield self._build_row(cells, max_col)
+
+        if max_row is not None and max_row < idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+    @staticmethod
+    def _build_row(cells, max_col: Optional[int]):
+        if not cells and not max_col:
+            return ()
+        width = max_col or cells[-1][0]
+        row = [None] * width
+        for column, value in cells:
+            if 1 <= column <= width:
+                row[column - 1] = value
+        return tuple(row)
+
+    def close(self):
+        self.archive.close()
+
+
+READER_ENGINES = {
+    OpenpyxlReaderEngine.name: OpenpyxlReaderEngine,
+    XmlStreamReaderEngine.name: XmlStreamReaderEngine,
+}
+
+
+def get_reader_engine(name: str):
+    """エンジン名から ExcelReaderEngine のクラスを返す"""
+    try:
+        return READER_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown Excel reader engine: '{name}'. Available: {', '.join(READER_ENGINES)}")
@@ -2,8 +2,9 @@ import sys
 import re
 import logging
 from pathlib import Path
-from collections import defaultdict
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 
 # --- プロジェクトルートをPythonパスに追加 ---
@@ -11,7 +12,10 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from config import NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP
+from config import NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP, SHEET_INDEX_PATH
+from pipeline.checkpoint import StageCheckpoint, run_checkpointed
+from pipeline.frame_cache import FrameLoader, read_normalized_frame, read_frame_columns, plan_columns, VIEW_STRINGS
+from pipeline.sheet_index import list_review_files, classify_header, clean_header_cell, SHEET_KIND_REVIEW
 
 # --- 定数定義 ---
 OUTPUT_FILENAME = "expenditure.csv"
@@ -31,6 +35,10 @@ EXPENDITURE_LIST_ITEMS = [
     '一者応札・一者応募又は競争性のない随意契約となった理由及び改善策'
 ]
 
+# 列名のパターン定義
+PATTERN_2014 = re.compile(rf"{PREFIX}-グループ-(.+?)-(\d+)$")
+PATTERN_2015_ON = re.compile(rf"{PREFIX}-([A-Za-z])\.支払先-(\d+)-(.+)")
+
 # --- ロガー設定 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -43,19 +51,129 @@ def get_year_from_filename(filename: str) -> int | None:
     return None
 
 
-def process_expenditures(file_paths: list[Path]) -> pd.DataFrame:
+@lru_cache(maxsize=None)
+def classify_expenditure_column(col_name: str) -> tuple[str, str, str] | None:
+    """
+    列名を (block_id, 連番の文字列, 項目名) に分類する。抽出対象でない列の場合は None を返す。
+    2014年形式 (…-グループ-項目名-連番) の block_id は 'グループ' となる。
+    """
+    if not col_name.startswith(PREFIX):
+        return None
+
+    block_id, sequence, raw_item_name = None, None, None
+
+    match_2015 = PATTERN_2015_ON.match(col_name)
+    if match_2015:
+        block_id, sequence, raw_item_name = match_2015.groups()
+    else:
+        match_2014 = PATTERN_2014.match(col_name)
+        if match_2014:
+            block_id = 'グループ'
+            raw_item_name, sequence = match_2014.groups()
+
+    if not raw_item_name:
+        return None
+
+    # どの年度の形式であっても、ここで共通の正規化処理を適用する
+    item_name = re.sub(r'\(.*\)|-\d+$', '', raw_item_name).strip()
+    if item_name not in EXPENDITURE_LIST_ITEMS:
+        return None
+    return block_id, sequence, item_name
+
+
+@lru_cache(maxsize=None)
+def expenditure_column_plan(columns: tuple[str, ...]) -> tuple[int, ...]:
+    """支出先の抽出で参照する列 (支出先上位10者リスト…) の位置を返す。ヘッダーごとにキャッシュする"""
+    return plan_columns(
+        columns,
+        lambda col: col.startswith(PREFIX) and bool(PATTERN_2015_ON.match(col) or PATTERN_2014.match(col))
+    )
+
+
+def _extract_expenditure_records(df: pd.DataFrame, review_year: int) -> pd.DataFrame | None:
+    """
+    1ファイル分のDataFrameから支出明細を取り出す。
+    列の分類は1回だけ行い、値のあるセルを縦持ちにしてから (行, block_id, 連番) ごとに横持ちへ戻す。
+    行の順序は、行順・行内では各 (block_id, 連番) に最初に値が現れた列の順で、従来の行単位の処理と同じになる。
+    """
+    positions, key_indices, items = [], [], []
+    keys: dict[tuple[str, str], int] = {}
+    for pos, col_name in enumerate(df.columns):
+        spec = classify_expenditure_column(col_name) if isinstance(col_name, str) else None
+        if spec is None:
+            continue
+        block_id, sequence, item_name = spec
+        positions.append(pos)
+        key_indices.append(keys.setdefault((block_id, sequence), len(keys)))
+        items.append(item_name)
+
+    if not positions or df.empty:
+        return None
+
+    values = df.iloc[:, positions].to_numpy(dtype=object)
+    valid = ~pd.isna(values)
+    stripped = np.full(values.shape, '', dtype=object)
+    stripped[valid] = [str(v).strip() for v in values[valid]]
+    valid &= stripped != ''
+
+    rows, cols = np.nonzero(valid)
+    if len(rows) == 0:
+        return None
+    cells = pd.DataFrame({
+        'row': rows,
+        'key': np.array(key_indices)[cols],
+        'item': np.array(items, dtype=object)[cols],
+        'value': stripped[rows, cols],
+    })
+
+    # 同じ項目に複数の列がある場合は、後の列の値で上書きする
+    latest = cells.drop_duplicates(['row', 'key', 'item'], keep='last')
+    wide = latest.pivot(index=['row', 'key'], columns='item', values='value')
+    record_index = pd.MultiIndex.from_frame(cells[['row', 'key']].drop_duplicates())
+    wide = wide.reindex(index=record_index, columns=EXPENDITURE_LIST_ITEMS).fillna('')
+
+    # 支出先・支出額のどちらも無い明細は対象外
+    wide = wide[(wide['支出先'] != '') | (wide['支出額'] != '')]
+    if wide.empty:
+        return None
+
+    key_list = list(keys)
+    records = {
+        'business_id': [f"{review_year}-{str(row + 1).zfill(5)}" for row in wide.index.get_level_values('row')],
+        'block_id': [key_list[key][0] for key in wide.index.get_level_values('key')],
+        'sequence': [int(key_list[key][1]) for key in wide.index.get_level_values('key')],
+    }
+    for item_name in EXPENDITURE_LIST_ITEMS:
+        records[item_name] = wide[item_name].tolist()
+    return pd.DataFrame(records)
+
+
+def _process_expenditure_file(filepath: Path, review_year: int, frame_loader: FrameLoader) -> pd.DataFrame | None:
+    """1ファイル分の支出明細を取り出す。レビューシートでない場合・明細が無い場合は None を返す"""
+    usecols = expenditure_column_plan(read_frame_columns(filepath))
+    df = frame_loader(filepath, VIEW_STRINGS, usecols)
+
+    # df = df.head(10)
+    # logging.info(f"    -> テストモード: 先頭{len(df)}行のみ処理します。")
+
+    if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+        logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
+        return None
+
+    return _extract_expenditure_records(df, review_year)
+
+
+def process_expenditures(file_paths: list[Path], frame_loader: FrameLoader | None = None,
+                         checkpoint: StageCheckpoint | None = None) -> pd.DataFrame:
     """
     指定されたCSVファイルのリストを処理し、支出明細のDataFrameを返す。
+    frame_loader を指定した場合は、CSVの読み込みをそれに委ねる (ステージ間で共有するキャッシュ用)。
+    checkpoint を指定した場合は、ファイルごとの抽出結果を記録し、記録済みのファイルは結果を再利用する。
     """
+    frame_loader = frame_loader or read_normalized_frame
     logging.info("支出先リストデータの抽出処理を開始...")
     all_expenditure_records = []
 
-    pattern_2014 = re.compile(rf"{PREFIX}-グループ-(.+?)-(\d+)$")
-    pattern_2015_on = re.compile(rf"{PREFIX}-([A-Za-z])\.支払先-(\d+)-(.+)")
-
-    REQUIRED_COLS_FOR_REVIEW_SHEET = {'府省', '府省庁', '事業名', '事業番号', '事業番号-1'}
-    EXCLUSION_COL = 'セグメント名'
-
     for filepath in file_paths:
         logging.info(f"  -> 処理中: {filepath.name}")
 
@@ -65,63 +183,11 @@ def process_expenditures(file_paths: list[Path]) -> pd.DataFrame:
             continue
 
         try:
-            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False)
-            
-            # df = df.head(10)
-            # logging.info(f"    -> テストモード: 先頭{len(df)}行のみ処理します。")
-            
-            cleaned_header = {str(col).replace('\n', '').replace('\r', '').replace(' ', '') for col in df.columns}
-
-            if EXCLUSION_COL in cleaned_header or len(REQUIRED_COLS_FOR_REVIEW_SHEET.intersection(cleaned_header)) < 3:
-                logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
-                continue
-
-            df['business_id'] = [f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
-
-            for index, row in df.iterrows():
-                business_expenditures = defaultdict(dict)
-                business_id = row['business_id']
-
-                for col_name in df.columns:
-                    if not col_name.startswith(PREFIX) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
-                        continue
-
-                    block_id, sequence, raw_item_name = None, None, None
-
-                    match_2015 = pattern_2015_on.match(col_name)
-                    if match_2015:
-                        block_id, sequence, raw_item_name = match_2015.groups()
-                    else:
-                        match_2014 = pattern_2014.match(col_name)
-                        if match_2014:
-                            block_id = 'グループ'
-                            raw_item_name, sequence = match_2014.groups()
-                    
-                    if raw_item_name:
-                        # === ▼▼▼ 修正箇所 ▼▼▼ ===
-                        # どの年度の形式であっても、ここで共通の正規化処理を適用する
-                        item_name = re.sub(r'\(.*\)|-\d+$', '', raw_item_name).strip()
-                        # ========================
-                        
-                        if item_name in EXPENDITURE_LIST_ITEMS:
-                            record_key = f"{block_id}-{sequence}"
-                            business_expenditures[record_key][item_name] = row[col_name]
-
-                for key, data_dict in business_expenditures.items():
-                    block_id, sequence = key.split('-', 1)
-                    
-                    if not data_dict.get('支出先') and not data_dict.get('支出額'):
-                        continue
-
-                    record = {
-                        'business_id': business_id,
-                        'block_id': block_id,
-                        'sequence': int(sequence),
-                    }
-                    for item in EXPENDITURE_LIST_ITEMS:
-                        record[item] = data_dict.get(item, '').strip()
-                    
-                    all_expenditure_records.append(record)
+            records = run_checkpointed(
+                checkpoint, filepath, lambda: _process_expenditure_file(filepath, review_year, frame_loader)
+            )
+            if records is not None:
+                all_expenditure_records.append(records)
 
         except Exception as e:
             logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
@@ -130,13 +196,13 @@ def process_expenditures(file_paths: list[Path]) -> pd.DataFrame:
         logging.warning("抽出対象となる支出データが見つかりませんでした。")
         return pd.DataFrame()
 
-    return pd.DataFrame(all_expenditure_records)
+    return pd.concat(all_expenditure_records, ignore_index=True)
 
 
 def main():
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    all_csv_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
     if not all_csv_files:
         logging.error(f"処理対象のCSVファイルが'{NORMALIZED_DIR}'に見つかりません。")
         sys.exit(1)
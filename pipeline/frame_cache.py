@@ -0,0 +1,171 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+from pipeline.sheet_index import REQUIRED_COLS_FOR_REVIEW_SHEET, EXCLUSION_COL, clean_header_cell
+
+# --- 読み込みビューの定義 ---
+# 各ステージは元々異なる引数で pd.read_csv を呼んでいたため、欠損値 (NaN) の扱いだけが異なる。
+# キャッシュは全セルを文字列のまま1回だけ読み込み、ビューごとに欠損値の扱いを再現する。
+VIEW_DEFAULT_NA = 'default_na'  # pandas既定の欠損値 ('', 'NA', 'null' 等) をNaNにする (ステージ3)
+VIEW_EMPTY_AS_NA = 'empty_as_na'  # 空文字列のみNaNにする (ステージ4)
+VIEW_STRINGS = 'strings'  # NaNにせず全セルを文字列のまま扱う (ステージ5, 6)
+
+VIEW_READ_OPTIONS = {
+    VIEW_DEFAULT_NA: dict(low_memory=False, dtype=str, encoding='utf-8-sig'),
+    VIEW_EMPTY_AS_NA: dict(low_memory=False, dtype=str, keep_default_na=False, na_values=['']),
+    VIEW_STRINGS: dict(low_memory=False, dtype=str, keep_default_na=False),
+}
+BASE_READ_OPTIONS = dict(low_memory=False, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+
+# (path, view, usecols) -> DataFrame。usecols は読み込む列の位置 (None の場合は全列)
+FrameLoader = Callable[..., pd.DataFrame]
+
+
+def read_normalized_frame(path: Path, view: str, usecols: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    """キャッシュを使わずに、ビューに対応する引数で正規化済みCSVを読み込む"""
+    if usecols is not None:
+        return pd.read_csv(path, usecols=list(usecols), **VIEW_READ_OPTIONS[view])
+    return pd.read_csv(path, **VIEW_READ_OPTIONS[view])
+
+
+def read_frame_columns(path: Path) -> Tuple[str, ...]:
+    """先頭行のみを読み、全列を読み込んだ場合と同じ列名 (重複列には '.1' 等が付く) を返す"""
+    return tuple(pd.read_csv(path, nrows=0, dtype=str, encoding='utf-8-sig').columns)
+
+
+def plan_columns(columns: Sequence[str], is_needed: Callable[[str], bool]) -> Tuple[int, ...]:
+    """
+    抽出処理が参照する列の位置を返す (pd.read_csv の usecols に渡す列の射影)。
+    各ステージのレビューシート判定が同じ結果になるよう、判定に使う列は常に含める。
+    """
+    classification_cols = REQUIRED_COLS_FOR_REVIEW_SHEET | {EXCLUSION_COL}
+    return tuple(
+        i for i, col in enumerate(columns)
+        if is_needed(col) or clean_header_cell(col) in classification_cols
+    )
+
+
+def derive_view(base: pd.DataFrame, view: str) -> pd.DataFrame:
+    """全セルを文字列で読み込んだDataFrameから、ビューに対応する欠損値の扱いを再現する"""
+    if view == VIEW_STRINGS:
+        return base.copy(deep=False)
+    if view == VIEW_EMPTY_AS_NA:
+        return base.where(base != '')
+    if view == VIEW_DEFAULT_NA:
+        return base.where(~base.isin(STR_NA_VALUES))
+    raise ValueError(f"Unknown frame view: '{view}'. Available: {list(VIEW_READ_OPTIONS)}")
+
+
+class FrameCache:
+    """
+    ステージ3〜6で共有する、パイプライン実行単位の正規化済みCSVキャッシュ。
+
+    各ファイルは最初に要求された時に1回だけ読み込まれ、以降のステージにはビューとして渡される。
+    consumers に指定したすべてのステージがそのファイルを読み終えるか、ステージ自体が完了した時点で解放する。
+    キャッシュ済みの合計サイズが memory_budget_bytes を超える場合は新しいファイルをキャッシュせず、
+    後続のステージで再度読み込む。
+    """
+
+    # ジョブステータスの stats に統計を載せる際のキー
+    stats_key = 'frame_cache'
+
+    def __init__(self, memory_budget_bytes: int, consumers: Iterable[str]):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.consumers = set(consumers)
+        self._frames: Dict[Path, pd.DataFrame] = {}
+        self._sizes: Dict[Path, int] = {}
+        self._pending: Dict[Path, Set[str]] = {}
+        self._finished: Set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.released = 0
+        self.cached_bytes = 0
+        self.peak_bytes = 0
+
+    def loader_for(self, consumer: str) -> FrameLoader:
+        """processing 関数に渡す読み込み関数 (path, view, usecols) -> DataFrame を返す"""
+        return lambda path, view, usecols=None: self.read(path, view, consumer, usecols)
+
+    def read(self, path: Path, view: str, consumer: str, usecols: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        with self._lock:
+            base = self._frames.get(path)
+            if base is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                other_consumers = self.consumers - self._finished - {consumer}
+        if base is None and not other_consumers:
+            # 後続のステージが無ければキャッシュせず、必要な列だけを直接読み込む
+            return read_normalized_frame(path, view, usecols)
+        if base is None:
+            base = pd.read_csv(path, **BASE_READ_OPTIONS)
+            with self._lock:
+                self._store(path, base)
+        if usecols is not None:
+            base = base.iloc[:, list(usecols)]
+        frame = derive_view(base, view)
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is not None:
+                pending.discard(consumer)
+                if not pending:
+                    self._evict(path)
+        return frame
+
+    def finish(self, consumer: str):
+        """ステージの完了を通知し、そのステージだけが未読だったファイルを解放する"""
+        with self._lock:
+            self._finished.add(consumer)
+            for path in list(self._pending):
+                self._pending[path].discard(consumer)
+                if not self._pending[path]:
+                    self._evict(path)
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._frames):
+                self._evict(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'rejected': self.rejected,
+                'released': self.released,
+                'cached_files': len(self._frames),
+                'cached_mb': round(self.cached_bytes / 1024 / 1024, 1),
+                'peak_mb': round(self.peak_bytes / 1024 / 1024, 1),
+                'budget_mb': round(self.memory_budget_bytes / 1024 / 1024, 1),
+            }
+
+    def _store(self, path: Path, base: pd.DataFrame):
+        if path in self._frames:
+            return
+        pending = self.consumers - self._finished
+        size = int(base.memory_usage(deep=True).sum())
+        if self.cached_bytes + size > self.memory_budget_bytes:
+            self.rejected += 1
+            logging.info(f"[FrameCache] Not caching '{path.name}' ({size / 1024 / 1024:.1f} MB): memory budget exceeded.")
+            return
+        self._frames[path] = base
+        self._sizes[path] = size
+        self._pending[path] = set(pending)
+        self.cached_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.cached_bytes)
+
+    def _evict(self, path: Path):
+        if self._frames.pop(path, None) is None:
+            return
+        self.cached_bytes -= self._sizes.pop(path)
+        self._pending.pop(path, None)
+        self.released += 1
@@ -2,8 +2,9 @@ import sys
 import re
 import logging
 from pathlib import Path
-from collections import defaultdict
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 
 # --- プロジェクトルートをPythonパスに追加 ---
@@ -11,7 +12,10 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from config import NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP
+from config import NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP, SHEET_INDEX_PATH
+from pipeline.checkpoint import StageCheckpoint, run_checkpointed
+from pipeline.frame_cache import FrameLoader, read_normalized_frame, read_frame_columns, plan_columns, VIEW_STRINGS
+from pipeline.sheet_index import list_review_files, classify_header, clean_header_cell, SHEET_KIND_REVIEW
 
 # --- 定数定義 ---
 OUTPUT_FILENAME = "fund_flow.csv"
@@ -24,6 +28,10 @@ FUND_FLOW_ITEMS = [
     '支払先金額(百万円)'
 ]
 
+# 列名のパターン定義
+PATTERN_WITH_SEQ = re.compile(r"費目・使途.*?([A-Za-z])\.(.+?)-(\d+)$")
+PATTERN_WITHOUT_SEQ = re.compile(r"費目・使途.*?([A-Za-z])\.(.+)$")
+
 # --- ロガー設定 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -36,19 +44,126 @@ def get_year_from_filename(filename: str) -> int | None:
     return None
 
 
-def process_fund_flow(file_paths: list[Path]) -> pd.DataFrame:
+@lru_cache(maxsize=None)
+def classify_fund_flow_column(col_name: str) -> tuple[str, str, str] | None:
+    """
+    列名を (block_id, 項目名, 連番の文字列) に分類する。抽出対象でない列の場合は None を返す。
+    連番の無い列 (…-A.支払先計 等) の連番は空文字列となる。
+    """
+    match = PATTERN_WITH_SEQ.match(col_name)
+    if match:
+        block_id, item_name, sequence_str = match.groups()
+    else:
+        match = PATTERN_WITHOUT_SEQ.match(col_name)
+        if not match:
+            return None
+        block_id, item_name = match.groups()
+        sequence_str = ""
+
+    item_name = item_name.strip()
+    if item_name not in FUND_FLOW_ITEMS:
+        return None
+    return block_id, item_name, sequence_str
+
+
+def _is_fund_flow_column(col_name: str) -> bool:
+    return classify_fund_flow_column(col_name) is not None
+
+
+@lru_cache(maxsize=None)
+def fund_flow_column_plan(columns: tuple[str, ...]) -> tuple[int, ...]:
+    """「資金の流れ」の抽出で参照する列 (費目・使途…) の位置を返す。ヘッダーごとにキャッシュする"""
+    return plan_columns(columns, _is_fund_flow_column)
+
+
+def _extract_fund_flow_records(df: pd.DataFrame, review_year: int) -> pd.DataFrame | None:
+    """
+    1ファイル分のDataFrameから「資金の流れ」明細を取り出す。
+    列の分類は1回だけ行い、値のあるセルを縦持ちにしてから (行, block_id, 連番) ごとに横持ちへ戻す。
+    行の順序は、行順・行内では各 (block_id, 連番) に最初に値が現れた列の順で、従来の行単位の処理と同じになる。
+    """
+    positions, key_indices, items = [], [], []
+    keys: dict[tuple[str, str], int] = {}
+    for pos, col_name in enumerate(df.columns):
+        spec = classify_fund_flow_column(col_name) if isinstance(col_name, str) else None
+        if spec is None:
+            continue
+        block_id, item_name, sequence_str = spec
+        positions.append(pos)
+        key_indices.append(keys.setdefault((block_id, sequence_str), len(keys)))
+        items.append(item_name)
+
+    if not positions or df.empty:
+        return None
+
+    values = df.iloc[:, positions].to_numpy(dtype=object)
+    valid = ~pd.isna(values)
+    stripped = np.full(values.shape, '', dtype=object)
+    stripped[valid] = [str(v).strip() for v in values[valid]]
+    valid &= stripped != ''
+
+    rows, cols = np.nonzero(valid)
+    if len(rows) == 0:
+        return None
+    cells = pd.DataFrame({
+        'row': rows,
+        'key': np.array(key_indices)[cols],
+        'item': np.array(items, dtype=object)[cols],
+        'value': stripped[rows, cols],
+    })
+
+    # 同じ項目に複数の列がある場合は、後の列の値で上書きする
+    latest = cells.drop_duplicates(['row', 'key', 'item'], keep='last')
+    wide = latest.pivot(index=['row', 'key'], columns='item', values='value')
+    record_index = pd.MultiIndex.from_frame(cells[['row', 'key']].drop_duplicates())
+    wide = wide.reindex(index=record_index, columns=FUND_FLOW_ITEMS).fillna('')
+
+    has_primary_data = (wide['支払先費目'] != '') | (wide['支払先使途'] != '') | (wide['支払先金額(百万円)'] != '')
+    has_meaningful_total = (wide['支払先計'] != '') & (wide['支払先計'] != '0')
+    wide = wide[has_primary_data | has_meaningful_total]
+    if wide.empty:
+        return None
+
+    key_list = list(keys)
+    records = {
+        'business_id': [f"{review_year}-{str(row + 1).zfill(5)}" for row in wide.index.get_level_values('row')],
+        'block_id': [key_list[key][0] for key in wide.index.get_level_values('key')],
+        'sequence': [
+            int(key_list[key][1]) if key_list[key][1].isdigit() else ''
+            for key in wide.index.get_level_values('key')
+        ],
+    }
+    for item_name in FUND_FLOW_ITEMS:
+        records[item_name] = wide[item_name].tolist()
+    return pd.DataFrame(records)
+
+
+def _process_fund_flow_file(filepath: Path, review_year: int, frame_loader: FrameLoader) -> pd.DataFrame | None:
+    """1ファイル分の「資金の流れ」明細を取り出す。レビューシートでない場合・明細が無い場合は None を返す"""
+    usecols = fund_flow_column_plan(read_frame_columns(filepath))
+    df = frame_loader(filepath, VIEW_STRINGS, usecols)
+
+    # df = df.head(10) # テスト用の行数制限（本番時はコメントアウト）
+    # logging.info(f"    -> テストモード: 先頭{len(df)}行のみ処理します。")
+
+    if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+        logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
+        return None
+
+    return _extract_fund_flow_records(df, review_year)
+
+
+def process_fund_flow(file_paths: list[Path], frame_loader: FrameLoader | None = None,
+                      checkpoint: StageCheckpoint | None = None) -> pd.DataFrame:
     """
     指定されたCSVファイルのリストを処理し、「資金の流れ」明細のDataFrameを返す。
+    frame_loader を指定した場合は、CSVの読み込みをそれに委ねる (ステージ間で共有するキャッシュ用)。
+    checkpoint を指定した場合は、ファイルごとの抽出結果を記録し、記録済みのファイルは結果を再利用する。
     """
+    frame_loader = frame_loader or read_normalized_frame
     logging.info("「資金の流れ」データの抽出処理を開始...")
     all_fund_flow_records = []
 
-    pattern_with_seq = re.compile(r"費目・使途.*?([A-Za-z])\.(.+?)-(\d+)$")
-    pattern_without_seq = re.compile(r"費目・使途.*?([A-Za-z])\.(.+)$")
-
-    REQUIRED_COLS_FOR_REVIEW_SHEET = {'府省', '府省庁', '事業名', '事業番号', '事業番号-1'}
-    EXCLUSION_COL = 'セグメント名'
-
     for filepath in file_paths:
         logging.info(f"  -> 処理中: {filepath.name}")
 
@@ -58,69 +173,11 @@ def process_fund_flow(file_paths: list[Path]) -> pd.DataFrame:
             continue
 
         try:
-            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False)
-            
-            # df = df.head(10) # テスト用の行数制限（本番時はコメントアウト）
-            # logging.info(f"    -> テストモード: 先頭{len(df)}行のみ処理します。")
-            
-            cleaned_header = {str(col).replace('\n', '').replace('\r', '').replace(' ', '') for col in df.columns}
-
-            if EXCLUSION_COL in cleaned_header or len(REQUIRED_COLS_FOR_REVIEW_SHEET.intersection(cleaned_header)) < 3:
-                logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
-                continue
-
-            df['business_id'] = [f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
-
-            for index, row in df.iterrows():
-                business_fund_flows = defaultdict(dict)
-                business_id = row['business_id']
-
-                for col_name in df.columns:
-                    if not isinstance(col_name, str) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
-                        continue
-
-                    match = pattern_with_seq.match(col_name)
-                    if match:
-                        block_id, item_name, sequence_str = match.groups()
-                    else:
-                        match = pattern_without_seq.match(col_name)
-                        if match:
-                            block_id, item_name = match.groups()
-                            sequence_str = ""
-                        else:
-                            continue
-                    
-                    item_name = item_name.strip()
-
-                    if item_name not in FUND_FLOW_ITEMS:
-                        continue
-                    
-                    record_key = f"{block_id}-{sequence_str}"
-                    business_fund_flows[record_key][item_name] = row[col_name]
-                
-                for key, data_dict in business_fund_flows.items():
-                    block_id, sequence_part = key.split('-', 1)
-                    
-                    record = {
-                        'business_id': business_id,
-                        'block_id': block_id,
-                        'sequence': int(sequence_part) if sequence_part.isdigit() else '',
-                        '支払先使途': data_dict.get('支払先使途', '').strip(),
-                        '支払先計': data_dict.get('支払先計', '').strip(),
-                        '支払先費目': data_dict.get('支払先費目', '').strip(),
-                        '支払先金額(百万円)': data_dict.get('支払先金額(百万円)', '').strip(),
-                    }
-
-                    has_primary_data = any([
-                        record['支払先費目'],
-                        record['支払先使途'],
-                        record['支払先金額(百万円)']
-                    ])
-                    total_amount_str = record['支払先計']
-                    has_meaningful_total = total_amount_str and total_amount_str != '0'
-
-                    if has_primary_data or has_meaningful_total:
-                        all_fund_flow_records.append(record)
+            records = run_checkpointed(
+                checkpoint, filepath, lambda: _process_fund_flow_file(filepath, review_year, frame_loader)
+            )
+            if records is not None:
+                all_fund_flow_records.append(records)
 
         except Exception as e:
             logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
@@ -129,13 +186,13 @@ def process_fund_flow(file_paths: list[Path]) -> pd.DataFrame:
         logging.warning("抽出対象となる「資金の流れ」データが見つかりませんでした。")
         return pd.DataFrame()
 
-    return pd.DataFrame(all_fund_flow_records)
+    return pd.concat(all_fund_flow_records, ignore_index=True)
 
 
 def main():
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    all_csv_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
     if not all_csv_files:
         logging.error(f"処理対象のCSVファイルが'{NORMALIZED_DIR}'に見つかりません。")
         sys.exit(1)
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    start_time REAL NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_start_time ON jobs (start_time);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_start_time ON jobs (status, start_time);
+"""
+
+# 実行を終えていないジョブのステータス (所有するプロセスが終了していれば中断されたものとみなす)
+UNFINISHED_STATUSES = ('pending', 'in-progress')
+
+
+def _json_default(value: Any) -> Any:
+    # numpy のスカラー等は Python の値に変換する
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def _process_alive(pid: int) -> bool:
+    """指定したプロセスIDのプロセスが存在するかどうか (判定できない場合は存在するものとみなす)"""
+    if sys.platform == 'win32':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION, STILL_ACTIVE = 0x1000, 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.GetLastError() == 5  # ERROR_ACCESS_DENIED: 存在するが参照できない
+        try:
+            exit_code = ctypes.c_ulong()
+            return not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)) or exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _dump(job: Dict[str, Any]) -> str:
+    # cancel_requested は別の列に保持するため、JSONには含めない
+    return json.dumps(
+        {key: value for key, value in job.items() if key != 'cancel_requested'},
+        ensure_ascii=False, default=_json_default
+    )
+
+
+class JobStore:
+    """
+    ジョブのステータスを保持する組み込みデータベース (SQLite)。
+    ジョブはプロセスの再起動後も残り、同じファイルを開く複数のプロセス (uvicorn のワーカー) から参照できる。
+    ステータスはジョブごとに1行 (一覧の絞り込み・並べ替えに使う列 + 全体のJSON) として保存する。
+    cancel_requested は実行中のジョブを保存しても上書きされないよう、JSONとは別の列に保持する。
+    owner_pid はジョブを作成・実行するプロセスのID。プロセスが終了して実行を終えられなくなったジョブの検出と、
+    複数のプロセスで同時に1つのパイプラインだけを実行するための排他 (claim_run) に使う。
+    WALモードで書き込むため、進捗の更新 (1行のUPDATE) は読み込みを妨げず、コミットごとのfsyncも行わない。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._last_saved: Dict[str, str] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        # 接続はスレッドごとに1つ開いて使い回す (APIのイベントループとパイプラインのスレッドが並行に使うため)
+        con = getattr(self._local, 'connection', None)
+        if con is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            con.executescript(SCHEMA)
+            if 'owner_pid' not in [row[1] for row in con.execute("PRAGMA table_info(jobs)")]:
+                # owner_pid 列の追加前に作成されたデータベース
+                con.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            self._local.connection = con
+        return con
+
+    @staticmethod
+    def _to_job(row) -> Dict[str, Any]:
+        job = json.loads(row[0])
+        job['cancel_requested'] = bool(row[1])
+        return job
+
+    def create(self, job: Dict[str, Any]):
+        data = _dump(job)
+        self._connection().execute(
+            "INSERT INTO jobs (job_id, status, start_time, cancel_requested, owner_pid, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (job['job_id'], job['status'], job.get('start_time', 0), int(job.get('cancel_requested', False)),
+             os.getpid(), data)
+        )
+        self._last_saved[job['job_id']] = data
+
+    def save(self, job: Dict[str, Any]) -> bool:
+        """ジョブのステータスを書き込む。前回の書き込みから変更が無い場合は何もせず False を返す"""
+        data = _dump(job)
+        if self._last_saved.get(job['job_id']) == data:
+            return False
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, start_time = ?, data = ? WHERE job_id = ?",
+            (job['status'], job.get('start_time', 0), data, job['job_id'])
+        )
+        self._last_saved[job['job_id']] = data
+        return True
+
+    def _fail_orphaned(self, con: sqlite3.Connection, message: str, include_own: bool) -> List[str]:
+        """
+        所有するプロセスが終了した未完了のジョブを failed にし、そのジョブIDを返す。
+        include_own=True の場合は、このプロセスが所有するジョブも対象にする (起動直後にはこのプロセスが実行中のジョブは無いため、
+        以前に同じプロセスIDで動いていたプロセスのジョブとみなす)。
+        """
+        placeholders = ', '.join('?' for _ in UNFINISHED_STATUSES)
+        rows = con.execute(
+            f"SELECT job_id, owner_pid FROM jobs WHERE status IN ({placeholders})", UNFINISHED_STATUSES
+        ).fetchall()
+        orphaned = [
+            job_id for job_id, owner_pid in rows
+            if owner_pid is None or (owner_pid == os.getpid() and include_own)
+            or (owner_pid != os.getpid() and not _process_alive(owner_pid))
+        ]
+        for job_id in orphaned:
+            con.execute(
+                "UPDATE jobs SET status = 'failed', data = json_set(data, '$.status', 'failed', "
+                "'$.message', ?, '$.error_message', ?) WHERE job_id = ?",
+                (message, message, job_id)
+            )
+        return orphaned
+
+    def fail_interrupted(self, message: str) -> List[str]:
+        """
+        起動時に呼び出し、前回のプロセスの終了・異常終了で実行を終えられなかったジョブ (pending / in-progress のまま、
+        所有するプロセスが存在しないもの) を failed にする。failed にしたジョブIDを返す。
+        """
+        con = self._connection()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            orphaned = self._fail_orphaned(con, message, include_own=True)
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return orphaned
+
+    def claim_run(self, job_id: str, interrupted_message: str) -> bool:
+        """
+        ジョブを in-progress にし、このプロセスを所有者として記録する。
+        他のジョブが in-progress の場合 (同じデータディレクトリでパイプラインを実行中の場合) は何もせず False を返す。
+        確認と更新は1つの書き込みトランザクションで行うため、複数のプロセス・スレッドから同時に呼び出しても1つだけが成功する。
+        所有するプロセスが終了した in-progress のジョブは、先に failed にしてから確認する。
+        """
+        con = self._connection()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            self._fail_orphaned(con, interrupted_message, include_own=False)
+            running = con.execute(
+                "SELECT 1 FROM jobs WHERE status = 'in-progress' AND job_id != ? LIMIT 1", (job_id,)
+            ).fetchone()
+            if running is None:
+                con.execute(
+                    "UPDATE jobs SET status = 'in-progress', owner_pid = ?, "
+                    "data = json_set(data, '$.status', 'in-progress') WHERE job_id = ?",
+                    (os.getpid(), job_id)
+                )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return running is None
+
+    def forget(self, job_id: str):
+        """このプロセスでの実行を終えたジョブの、変更の検出用の記録を破棄する"""
+        self._last_saved.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT data, cancel_requested FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: Optional[int] = None,
+                  offset: int = 0) -> List[Dict[str, Any]]:
+        """ジョブを開始日時の新しい順に返す (status で絞り込み、limit / offset でページ分割できる)"""
+        query = "SELECT data, cancel_requested FROM jobs"
+        params: list = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY start_time DESC, rowid DESC LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        return [self._to_job(row) for row in self._connection().execute(query, params)]
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = self._connection().execute(
+            "SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def request_cancellation(self, job_id: str, message: str) -> bool:
+        """実行中のジョブにキャンセル要求を記録する。実行中でない (または存在しない) 場合は False を返す"""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET cancel_requested = 1, data = json_set(data, '$.message', ?) "
+            "WHERE job_id = ? AND status = 'in-progress'",
+            (message, job_id)
+        )
+        return cursor.rowcount > 0
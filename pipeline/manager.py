@@ -2,33 +2,54 @@ import uuid
 import logging
 import traceback
 import zipfile
-from typing import Dict, Any, Optional, List
-from threading import Lock
+from functools import partial
+from typing import Callable, Dict, Any, Optional, List
 
-from config import PROCESSED_DIR
+from config import (
+    DOWNLOAD_DIR, RAW_DIR, NORMALIZED_DIR, PROCESSED_DIR, SHEET_INDEX_PATH, FRAME_CACHE_MEMORY_BUDGET_MB,
+    EXTRACTION_ENGINE, CELL_STORE_ENABLED, CELL_STORE_DIR, STAGE_MAX_WORKERS, CELL_STORE_STAGE_WORKERS, STAGE_CACHE_ENABLED, STAGE_CACHE_PATH,
+    FILENAME_YEAR_MAP, MINISTRY_NAME_VARIATIONS, MINISTRY_MASTER_DATA, CONVERT_READER_ENGINE, CONVERT_SHEET_KINDS,
+    CONVERT_FUSED_NORMALIZE, CONVERT_WRITE_RAW, NORMALIZE_ENGINE, PARQUET_OUTPUT_ENABLED, RESULTS_ZIP_INCLUDE_PARQUET,
+    JOB_STORE_PATH
+)
+from pipeline.job_store import JobStore
+from pipeline.frame_cache import FrameCache
+from pipeline.cell_store import CellStore, CELL_STORE_MANIFEST_FILENAME
+from pipeline.sql_extraction import get_extraction_engine
+from pipeline.scheduler import StageSpec, StageCancelledError, init_stage_states, run_stages, STAGE_FAILED
+from pipeline.stage_cache import StageCache, stage_fingerprint
+from pipeline.partitions import list_partitions
+from pipeline.parquet_output import list_parquet_files
+from pipeline.budget_processing import PAST_BUDGET_ITEMS, REQUEST_BUDGET_ITEMS
+from pipeline.fund_flow_processing import FUND_FLOW_ITEMS
+from pipeline.expenditure_processing import EXPENDITURE_LIST_ITEMS
 from pipeline.stages import (
     run_stage_01_convert, run_stage_02_normalize, run_stage_03_build_business_tables,
     run_stage_04_build_budget_summary, run_stage_05_build_fund_flow, 
-    run_stage_06_build_expenditure
+    run_stage_06_build_expenditure, run_cell_store_build
 )
 
 # --- グローバルな状態管理 ---
-jobs: Dict[str, Dict[str, Any]] = {}
-PIPELINE_LOCK = Lock()
+# ジョブのステータスは JobStore (SQLite) に保存し、再起動後も他のプロセスからも参照できるようにする
+job_store = JobStore(JOB_STORE_PATH)
+# このプロセスで実行中のジョブのステータス (パイプラインが直接更新し、変更は save_job でストアに書き出す)
+active_jobs: Dict[str, Dict[str, Any]] = {}
+# 実行中にプロセスが終了したジョブに記録するメッセージ
+INTERRUPTED_JOB_MESSAGE = "パイプラインの実行中にプロセスが終了したため、ジョブは中断されました。"
 
-class JobCancelledError(Exception):
+class JobCancelledError(StageCancelledError):
     """ジョブキャンセルのためのカスタム例外"""
     pass
 
 def check_for_cancellation(job_id: str):
     """ジョブのキャンセル要求をチェックし、要求があれば例外を送出する"""
-    if jobs.get(job_id, {}).get("cancel_requested", False):
+    if job_store.is_cancel_requested(job_id):
         raise JobCancelledError(f"Job {job_id} was cancelled by user.")
 
 def create_new_job() -> str:
     """新しいジョブを作成し、ジョブIDを返す"""
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {
+    job_store.create({
         "job_id": job_id,
         "status": "pending",
         "current_stage": None,
@@ -36,110 +57,312 @@ def create_new_job() -> str:
         "results_url": None,
         "error_message": None,
         "cancel_requested": False,
-    }
+        "stats": {},
+        "stages": [],
+    })
     return job_id
 
-def get_all_jobs() -> List[Dict[str, Any]]:
-    """全ジョブのステータスリストを返す"""
-    return sorted(list(jobs.values()), key=lambda j: j.get('start_time', 0), reverse=True)
+def fail_interrupted_jobs():
+    """起動時に、前回のプロセスの終了・異常終了で実行を終えられなかったジョブを failed にする"""
+    for job_id in job_store.fail_interrupted(INTERRUPTED_JOB_MESSAGE):
+        logging.warning(f"Job {job_id} was interrupted by a process exit and has been marked as failed.")
+
+def save_job(job_id: str):
+    """このプロセスで実行中のジョブのステータスをストアに書き出す (前回から変更が無い場合は書き込まない)"""
+    job_store.save(active_jobs[job_id])
+
+def get_all_jobs(status: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """ジョブのステータスリストを開始日時の新しい順に返す (status で絞り込み、limit / offset でページ分割できる)"""
+    return job_store.list_jobs(status, limit, offset)
 
 def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
     """指定されたジョブIDのステータスを返す"""
-    return jobs.get(job_id)
+    return job_store.get(job_id)
 
 def request_job_cancellation(job_id: str) -> bool:
     """指定されたジョブのキャンセルを要求する"""
-    if job_id in jobs and jobs[job_id]["status"] == "in-progress":
-        jobs[job_id]["cancel_requested"] = True
-        jobs[job_id]["message"] = "キャンセル要求を受け付けました。現在の処理が完了次第停止します。"
+    if job_store.request_cancellation(job_id, "キャンセル要求を受け付けました。現在の処理が完了次第停止します。"):
         logging.warning(f"Cancellation requested for job {job_id}.")
         return True
     return False
 
-def run_pipeline_async(job_id: str, start_stage: int, target_files: Optional[List[str]]):
+# 成果物ZIPにまとめるファイル
+RESULT_FILES = ['business.csv', 'ministries.csv', 'budgets.csv', 'fund_flow.csv', 'expenditure.csv']
+
+# ステージ3〜6の番号 (正規化済みCSVだけを読み、互いに異なるファイルを書き出すため並行に実行できる)
+CONCURRENT_STAGES = (3, 4, 5, 6)
+
+# 成果物名 -> ファイルの一覧 (ステージのフィンガープリントと、出力が変更されていないかの確認に使う)
+ARTIFACT_FILES = {
+    'download': lambda: sorted(DOWNLOAD_DIR.glob('*.zip')) + sorted(DOWNLOAD_DIR.glob('*.xlsx')),
+    'raw': lambda: sorted(RAW_DIR.glob('*.csv')),
+    'sheet_index': lambda: [SHEET_INDEX_PATH],
+    'normalized': lambda: sorted(NORMALIZED_DIR.glob('*.csv')),
+    'cell_store': lambda: [CELL_STORE_DIR / CELL_STORE_MANIFEST_FILENAME] if CELL_STORE_ENABLED else [],
+    # 年度ごとのパーティションとParquetも含める (ministries.csv にはパーティションは無い)
+    **{
+        name: (lambda name=name: [PROCESSED_DIR / name] + sorted(list_partitions(name[:-len('.csv')]).values())
+               + list_parquet_files(name[:-len('.csv')]))
+        for name in RESULT_FILES
+    },
+}
+
+def artifact_files(names) -> list:
+    return [path for name in names for path in ARTIFACT_FILES[name]()]
+
+def resolve_target_years(target_years: Optional[List[int]]) -> Optional[List[int]]:
+    """
+    target_years を FILENAME_YEAR_MAP に定義された年度と照合し、重複を除いて昇順にする (未指定の場合は None)
+    APIのリクエストは PipelineRunRequest で照合済みだが、run_pipeline_async を直接呼び出す場合のためにここでも確認する
+    """
+    if not target_years:
+        return None
+    known_years = set(FILENAME_YEAR_MAP.values())
+    unknown_years = sorted(set(target_years) - known_years)
+    if unknown_years:
+        raise ValueError(
+            f"FILENAME_YEAR_MAP に定義されていない年度が指定されました: {unknown_years} (指定可能な年度: {sorted(known_years)})"
+        )
+    return sorted(set(target_years))
+
+def build_results_zip(update_status: Callable, job_id: str, include_parquet: Optional[bool] = None):
+    """
+    ステージ7: 成果物のCSVをZIPアーカイブにまとめる
+    include_parquet (指定しない場合は RESULTS_ZIP_INCLUDE_PARQUET) が True の場合は、Parquetもディレクトリ構成を保って含める
+    """
+    update_status(current_stage="ステージ7: ZIPアーカイブ作成", message="成果物をZIPアーカイブにまとめています...")
+
+    zip_filename = f"processed_data_{job_id}.zip"
+    zip_filepath = PROCESSED_DIR / zip_filename
+
+    existing_files_to_zip = [PROCESSED_DIR / name for name in RESULT_FILES if (PROCESSED_DIR / name).exists()]
+    
+    if not existing_files_to_zip:
+         logging.warning(f"No standard CSV files found in {PROCESSED_DIR} to zip.")
+    else:
+        with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for file in existing_files_to_zip:
+                zf.write(file, arcname=file.name)
+            if RESULTS_ZIP_INCLUDE_PARQUET if include_parquet is None else include_parquet:
+                for file in list_parquet_files():
+                    zf.write(file, arcname=file.relative_to(PROCESSED_DIR).as_posix())
+
+    active_jobs[job_id]["results_url"] = f"/api/results/{zip_filename}"
+    save_job(job_id)
+
+def build_stage_specs(job_id: str, target_files: Optional[List[str]], max_workers: Optional[int],
+                      extraction_engine: str, frame_cache, resume: bool = False,
+                      target_years: Optional[List[int]] = None,
+                      include_parquet: Optional[bool] = None) -> List[StageSpec]:
+    """
+    パイプラインのステージを、読み込む・書き出す成果物とともに宣言する。
+    ステージ3〜6は parallel=True のため、run には frame_cache を含めてpickle可能な partial を使う。
+    resume=True の場合、ステージ2〜6は前回中断した実行のファイルごとの完了記録を引き継いで再開する。
+    target_years を指定した場合、ステージ1〜6はその年度のファイルだけを処理する (対象年度もフィンガープリントに含める)。
+    include_parquet はステージ7で成果物ZIPにParquetを含めるかどうか (None の場合は設定ファイルの値)。
+    ステージ1〜6のフィンガープリントには、入力ファイルの状態と出力に影響する設定値を含める
+    (抽出エンジンやワーカー数は出力を変えないため含めない)。
+    """
+    context = {'normalized_in_stage1': False}
+
+    def convert(update_status):
+        context['normalized_in_stage1'] = run_stage_01_convert(
+            update_status, job_id, target_files, max_workers, target_years
+        )
+
+    def convert_skipped():
+        context['normalized_in_stage1'] = CONVERT_FUSED_NORMALIZE
+
+    def normalize(update_status):
+        if not context['normalized_in_stage1']:
+            run_stage_02_normalize(update_status, job_id, max_workers, resume, target_years)
+        elif CELL_STORE_ENABLED:
+            # 融合モードでステージ2を省略した場合も、セルストアは構築する
+            run_cell_store_build(update_status, job_id)
+
+    def cached(inputs, outputs, settings: Callable[[], Dict[str, Any]], on_skip: Optional[Callable] = None) -> dict:
+        return {
+            'fingerprint': lambda: stage_fingerprint(
+                artifact_files(inputs), dict(settings(), target_years=target_years)
+            ),
+            'output_files': lambda: artifact_files(outputs),
+            'on_skip': on_skip,
+        }
+
+    def frame_cache_finisher(consumer: str) -> Optional[Callable]:
+        # スキップしたステージの分も完了を通知し、共有キャッシュのファイルを解放できるようにする
+        return (lambda: frame_cache.finish(consumer)) if frame_cache is not None else None
+
+    stage_options = {'job_id': job_id, 'frame_cache': frame_cache, 'resume': resume, 'target_years': target_years}
+    extraction_options = dict(stage_options, extraction_engine=extraction_engine)
+    normalized = ('normalized', 'cell_store', 'sheet_index')
+    stage1_outputs = ('raw', 'sheet_index') + (('normalized',) if CONVERT_FUSED_NORMALIZE else ())
+    return [
+        StageSpec(1, "ステージ1: Excel/ZIPからCSVへの変換", ('download',), stage1_outputs, convert,
+                  **cached(('download',), stage1_outputs, lambda: {
+                      'target_files': sorted(target_files) if target_files else None,
+                      'reader_engine': CONVERT_READER_ENGINE,
+                      'sheet_kinds': sorted(CONVERT_SHEET_KINDS) if CONVERT_SHEET_KINDS else None,
+                      'fused_normalize': CONVERT_FUSED_NORMALIZE,
+                      'write_raw': CONVERT_WRITE_RAW,
+                  }, on_skip=convert_skipped)),
+        StageSpec(2, "ステージ2: CSVの正規化", ('raw', 'sheet_index'), ('normalized', 'cell_store'), normalize,
+                  **cached(('raw', 'sheet_index'), ('normalized', 'cell_store'), lambda: {
+                      'normalized_in_stage1': context['normalized_in_stage1'],
+                      'normalize_engine': NORMALIZE_ENGINE,
+                      'cell_store': CELL_STORE_ENABLED,
+                  })),
+        StageSpec(3, "ステージ3: 事業テーブルの構築", normalized, ('business.csv', 'ministries.csv'),
+                  partial(run_stage_03_build_business_tables, **stage_options), parallel=True,
+                  **cached(normalized, ('business.csv', 'ministries.csv'), lambda: {
+                      'filename_year_map': FILENAME_YEAR_MAP,
+                      'ministry_name_variations': MINISTRY_NAME_VARIATIONS,
+                      'ministry_master_data': MINISTRY_MASTER_DATA,
+                      'parquet_output': PARQUET_OUTPUT_ENABLED,
+                  }, on_skip=frame_cache_finisher('stage3'))),
+        StageSpec(4, "ステージ4: 予算テーブルの構築", normalized, ('budgets.csv',),
+                  partial(run_stage_04_build_budget_summary, **extraction_options), parallel=True,
+                  **cached(normalized, ('budgets.csv',), lambda: {
+                      'filename_year_map': FILENAME_YEAR_MAP,
+                      'past_budget_items': PAST_BUDGET_ITEMS,
+                      'request_budget_items': REQUEST_BUDGET_ITEMS,
+                      'parquet_output': PARQUET_OUTPUT_ENABLED,
+                  }, on_skip=frame_cache_finisher('stage4'))),
+        StageSpec(5, "ステージ5: 資金の流れテーブル構築", normalized, ('fund_flow.csv',),
+                  partial(run_stage_05_build_fund_flow, **extraction_options), parallel=True,
+                  **cached(normalized, ('fund_flow.csv',), lambda: {
+                      'filename_year_map': FILENAME_YEAR_MAP,
+                      'fund_flow_items': FUND_FLOW_ITEMS,
+                      'parquet_output': PARQUET_OUTPUT_ENABLED,
+                  }, on_skip=frame_cache_finisher('stage5'))),
+        StageSpec(6, "ステージ6: 支出テーブル構築", normalized, ('expenditure.csv',),
+                  partial(run_stage_06_build_expenditure, **extraction_options), parallel=True,
+                  **cached(normalized, ('expenditure.csv',), lambda: {
+                      'filename_year_map': FILENAME_YEAR_MAP,
+                      'expenditure_list_items': EXPENDITURE_LIST_ITEMS,
+                      'parquet_output': PARQUET_OUTPUT_ENABLED,
+                  }, on_skip=frame_cache_finisher('stage6'))),
+        # ZIPのファイル名はジョブごとに異なるため、ステージ7は常に実行する
+        StageSpec(7, "ステージ7: ZIPアーカイブ作成", tuple(RESULT_FILES), ('results.zip',),
+                  partial(build_results_zip, job_id=job_id, include_parquet=include_parquet)),
+    ]
+
+def run_pipeline_async(job_id: str, start_stage: int, target_files: Optional[List[str]],
+                       max_workers: Optional[int] = None, extraction_engine: Optional[str] = None,
+                       force: bool = False, resume: bool = False, target_years: Optional[List[int]] = None,
+                       include_parquet: Optional[bool] = None, stage_workers: Optional[int] = None):
     """
     データ処理パイプライン全体を非同期で実行する
+    extraction_engine はステージ4〜6の抽出エンジン ('pandas' / 'duckdb')。指定しない場合は設定ファイルの値を使用する。
+    max_workers はステージ1・2のワーカープロセス数 (指定しない場合は設定ファイルの値)。
+    ステージは依存関係の順に実行され、ステージ3〜6は stage_workers (指定しない場合は STAGE_MAX_WORKERS) が2以上なら
+    別プロセスで並行に実行される (どちらも指定が無い場合も、セルストアが有効なら CELL_STORE_STAGE_WORKERS で並行に実行する)。
+    並行に実行しない場合は、ステージ3〜6が読み込みキャッシュを共有し、各正規化済みCSVを原則1回だけ読み込む。ステージごとの状態はジョブステータスの stages に反映される。
+    STAGE_CACHE_ENABLED の場合、前回の成功時から入力・設定・コードに変更の無いステージはスキップする (force=True で無効)。
+    resume=True の場合、キャンセル・異常終了で中断したステージを、最後に完了したファイルの次から再開する。
+    target_years を指定した場合は、その年度 (FILENAME_YEAR_MAP で特定) のファイルだけを処理し、
+    ステージ3〜6の成果物は対象年度のパーティションだけを置き換えて、他の年度と結合し直す。
+    include_parquet=True の場合は、成果物ZIPにParquet (PARQUET_OUTPUT_ENABLED の場合に書き出される) も含める。
     """
-    if not PIPELINE_LOCK.acquire(blocking=False):
+    job = job_store.get(job_id)
+    # 実行中のジョブの有無はジョブストアで確認するため、複数のuvicornワーカーからでも同時に実行されるパイプラインは1つだけとなる
+    if not job_store.claim_run(job_id, INTERRUPTED_JOB_MESSAGE):
         logging.warning(f"Pipeline execution denied for job {job_id}: another pipeline is already running.")
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error_message"] = "他のパイプラインが実行中のため、開始できませんでした。"
+        job["status"] = "failed"
+        job["error_message"] = "他のパイプラインが実行中のため、開始できませんでした。"
+        job_store.save(job)
+        job_store.forget(job_id)
         return
 
+    active_jobs[job_id] = job
+    frame_cache = None
     try:
         import time
-        jobs[job_id]["start_time"] = time.time()
+        job["start_time"] = time.time()
         
-        def update_status(current_stage: str = None, message: str = None):
+        def update_status(current_stage: str = None, message: str = None, stats: Dict[str, Any] = None):
             check_for_cancellation(job_id)
             if current_stage:
-                jobs[job_id]["current_stage"] = current_stage
+                job["current_stage"] = current_stage
             if message:
-                jobs[job_id]["message"] = message
-            logging.info(f"[Job {job_id}] {jobs[job_id]['current_stage']}: {jobs[job_id]['message']}")
+                job["message"] = message
+            if stats:
+                job["stats"].update(stats)
+            # ステージの状態 (stages) は scheduler が直接更新するため、引数が無い呼び出しでも変更があれば書き出す
+            save_job(job_id)
+            if not (current_stage or message):
+                return
+            logging.info(f"[Job {job_id}] {job['current_stage']}: {job['message']}")
 
         logging.info(f"Starting pipeline for job_id: {job_id}")
-        jobs[job_id]["status"] = "in-progress"
+        job["status"] = "in-progress"
+        save_job(job_id)
+        extraction_engine = get_extraction_engine(extraction_engine or EXTRACTION_ENGINE)
+        target_years = resolve_target_years(target_years)
 
-        if start_stage <= 1:
-            run_stage_01_convert(update_status, job_id, target_files)
-        
-        if start_stage <= 2:
-            run_stage_02_normalize(update_status, job_id)
-        
-        if start_stage <= 3:
-            run_stage_03_build_business_tables(update_status, job_id)
+        # ステージ3〜6のうち2つ以上を実行し、ワーカー数が2以上の場合は別プロセスで並行に実行する
+        # ワーカー数の指定が無い場合、並行実行はセルストアが有効な場合 (読み込みが重複しない場合) にだけ行う
+        # max_workers はステージ1・2だけに使い、ステージ3〜6の並行実行は stage_workers で指定する
+        requested_stage_workers = stage_workers
+        stage_workers = requested_stage_workers or STAGE_MAX_WORKERS
+        if stage_workers <= 1 and requested_stage_workers is None and CELL_STORE_ENABLED:
+            stage_workers = CELL_STORE_STAGE_WORKERS
+        concurrent = stage_workers > 1 and sum(n >= start_stage for n in CONCURRENT_STAGES) > 1
 
-        if start_stage <= 4:
-            run_stage_04_build_budget_summary(update_status, job_id)
-        
-        if start_stage <= 5:
-            run_stage_05_build_fund_flow(update_status, job_id)
-            
-        if start_stage <= 6:
-            run_stage_06_build_expenditure(update_status, job_id)
-
-        check_for_cancellation(job_id)
-        update_status(current_stage="ステージ7: ZIPアーカイブ作成", message="成果物をZIPアーカイブにまとめています...")
-        
-        zip_filename = f"processed_data_{job_id}.zip"
-        zip_filepath = PROCESSED_DIR / zip_filename
-
-        files_to_zip = [
-            PROCESSED_DIR / 'business.csv',
-            PROCESSED_DIR / 'ministries.csv',
-            PROCESSED_DIR / 'budgets.csv',
-            PROCESSED_DIR / 'fund_flow.csv',
-            PROCESSED_DIR / 'expenditure.csv',
-        ]
-        existing_files_to_zip = [f for f in files_to_zip if f.exists()]
-        
-        if not existing_files_to_zip:
-             logging.warning(f"No standard CSV files found in {PROCESSED_DIR} to zip.")
+        # ステージ3〜6で正規化済みCSVの読み込み結果を共有する (各ファイルは原則1回だけ読み込まれる)
+        # DuckDBエンジンのステージ4〜6はCSVを直接読むため、キャッシュを使うのはステージ3のみとなる
+        # セルストアが有効な場合は、キャッシュの代わりにセルストアから必要な列のセルだけを読み込む
+        # 並行実行時はプロセス間でキャッシュを共有できないため、セルストア (各プロセスが接続を開く) のみを使う
+        if CELL_STORE_ENABLED:
+            frame_cache = CellStore(CELL_STORE_DIR)
+        elif FRAME_CACHE_MEMORY_BUDGET_MB > 0 and not concurrent:
+            last_frame_stage = 6 if extraction_engine == 'pandas' else 3
+            frame_cache = FrameCache(
+                FRAME_CACHE_MEMORY_BUDGET_MB * 1024 * 1024,
+                consumers=[f"stage{n}" for n in range(max(start_stage, 3), last_frame_stage + 1)]
+            )
+
+        if concurrent:
+            logging.info(f"Stages 3-6 will run concurrently in up to {stage_workers} worker processes "
+                         f"({'cell store' if CELL_STORE_ENABLED else 'no shared frame cache'}).")
         else:
-            with zipfile.ZipFile(zip_filepath, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for file in existing_files_to_zip:
-                    zf.write(file, arcname=file.name)
+            logging.info(f"Stages 3-6 will run sequentially in this process "
+                         f"({'cell store' if CELL_STORE_ENABLED else 'frame cache' if frame_cache is not None else 'no frame cache'}).")
+
+        specs = build_stage_specs(
+            job_id, target_files, max_workers, extraction_engine, frame_cache, resume, target_years, include_parquet
+        )
+        job["stages"] = init_stage_states(specs, start_stage)
+        stage_cache = StageCache(STAGE_CACHE_PATH, force=force) if STAGE_CACHE_ENABLED else None
+        run_stages(specs, job["stages"], update_status, stage_workers if concurrent else 1, stage_cache)
         
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["message"] = "パイプラインは正常に完了しました。"
-        jobs[job_id]["current_stage"] = "完了"
-        jobs[job_id]["results_url"] = f"/api/results/{zip_filename}"
+        job["status"] = "completed"
+        job["message"] = "パイプラインは正常に完了しました。"
+        job["current_stage"] = "完了"
         logging.info(f"Pipeline for job_id: {job_id} completed successfully.")
 
-    except JobCancelledError as e:
+    except StageCancelledError as e:
         logging.warning(str(e))
-        jobs[job_id]["status"] = "cancelled"
-        jobs[job_id]["message"] = "ユーザーのリクエストによりパイプラインはキャンセルされました。"
-        jobs[job_id]["current_stage"] = "キャンセル済み"
+        job["status"] = "cancelled"
+        job["message"] = "ユーザーのリクエストによりパイプラインはキャンセルされました。"
+        job["current_stage"] = "キャンセル済み"
 
     except Exception as e:
         tb_str = traceback.format_exc()
         logging.error(f"Pipeline for job_id: {job_id} failed. Error: {e}\n{tb_str}")
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error_message"] = f"ステージ '{jobs[job_id].get('current_stage', '不明')}' でエラーが発生しました: {e}"
-        jobs[job_id]["message"] = "パイプラインの実行中にエラーが発生しました。"
+        # 並行実行中は current_stage が他のステージを指していることがあるため、失敗したステージ名を優先する
+        failed_stage = next(
+            (stage['name'] for stage in job["stages"] if stage['status'] == STAGE_FAILED),
+            job.get('current_stage') or '不明'
+        )
+        job["status"] = "failed"
+        job["error_message"] = f"ステージ '{failed_stage}' でエラーが発生しました: {e}"
+        job["message"] = "パイプラインの実行中にエラーが発生しました。"
     
     finally:
-        PIPELINE_LOCK.release()
-        logging.info(f"Pipeline lock released for job {job_id}.")
\ No newline at end of file
+        save_job(job_id)
+        active_jobs.pop(job_id)
+        job_store.forget(job_id)
+        if frame_cache is not None:
+            frame_cache.clear()
+        logging.info(f"Pipeline run finished for job {job_id}.")
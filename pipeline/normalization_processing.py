@@ -0,0 +1,156 @@
+import csv
+import io
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+from utils.normalization import normalize_text
+from utils.vectorized_normalization import normalize_series
+
+# --- 定数定義 ---
+# 1タスクあたりの行数
+DEFAULT_BATCH_ROWS = 2000
+# ワーカー1つあたりに先行投入するバッチ数 (メモリ上に保持される行数の上限を決める)
+PENDING_BATCHES_PER_WORKER = 2
+
+
+def _normalize_rows_python(rows: List[List[str]]) -> List[List[str]]:
+    return [[normalize_text(cell) for cell in row] for row in rows]
+
+
+def _normalize_rows_vectorized(rows: List[List[str]]) -> List[List[str]]:
+    """バッチ内の全セルを1つの列にまとめて正規化し、元の行の形に戻す (行ごとの列数が異なってもよい)"""
+    cells = pd.Series([cell for row in rows for cell in row], dtype=object)
+    normalized = normalize_series(cells).tolist()
+    result = []
+    pos = 0
+    for row in rows:
+        result.append(normalized[pos:pos + len(row)])
+        pos += len(row)
+    return result
+
+
+NORMALIZATION_ENGINES = {
+    'python': _normalize_rows_python,
+    'vectorized': _normalize_rows_vectorized,
+}
+
+
+def get_normalization_engine(name: str) -> Callable[[List[List[str]]], List[List[str]]]:
+    try:
+        return NORMALIZATION_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown normalization engine: '{name}'. Available: {list(NORMALIZATION_ENGINES)}")
+
+
+def _normalize_rows_to_csv(rows: List[List[str]], engine: str = 'python') -> str:
+    """行のバッチを正規化し、QUOTE_ALL形式のCSVテキストとして返す (プロセスプールのタスク単位)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    writer.writerows(get_normalization_engine(engine)(rows))
+    return buffer.getvalue()
+
+
+def _iter_batches(reader, batch_rows: int):
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize_csv_file(input_path: Path, output_path: Path, encoding_errors: str = 'strict',
+                       engine: str = 'python', batch_rows: int = DEFAULT_BATCH_ROWS):
+    """生CSVを1ファイル逐次で正規化する"""
+    get_normalization_engine(engine)
+    with open(input_path, 'r', encoding='utf-8-sig', errors=encoding_errors) as infile, \
+         open(output_path, 'w', encoding='utf-8-sig', newline='') as outfile:
+        for batch in _iter_batches(csv.reader(infile), batch_rows):
+            outfile.write(_normalize_rows_to_csv(batch, engine))
+
+
+def normalize_csv_files(
+    input_paths: List[Path],
+    output_dir: Path,
+    max_workers: int = 1,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    on_file_start: Optional[Callable[[int, int, Path], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    encoding_errors: str = 'strict',
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    engine: str = 'python',
+    on_file_done: Optional[Callable[[Path], None]] = None,
+) -> List[Path]:
+    """
+    生CSVを正規化して output_dir に同名で書き出す。ステージ2と scripts/rerun_normalization.py で共有する。
+
+    max_workers が2以上の場合はプロセスプールを使用し、各ファイルを batch_rows 行ずつのバッチに分けて並列に正規化する。
+    バッチは投入順に書き出すため出力の行順は逐次処理と同一で、未書き出しのバッチ数は
+    max_workers * PENDING_BATCHES_PER_WORKER 個までに制限される。
+    on_error を指定した場合、ファイル単位のエラーはそこへ渡して次のファイルへ進む (未指定時は例外を送出する)。
+    engine は NORMALIZATION_ENGINES のキーで、どのエンジンでも出力は同一となる。
+    on_file_done(入力ファイルのパス) は、そのファイルの出力を書き終えた時点で呼び出される。
+    """
+    get_normalization_engine(engine)
+    output_paths = []
+    total_files = len(input_paths)
+
+    if max_workers <= 1:
+        for i, input_path in enumerate(input_paths):
+            if on_file_start:
+                on_file_start(i + 1, total_files, input_path)
+            output_path = output_dir / input_path.name
+            try:
+                normalize_csv_file(input_path, output_path, encoding_errors, engine, batch_rows)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(input_path, e)
+                continue
+            output_paths.append(output_path)
+            if on_file_done:
+                on_file_done(input_path)
+        return output_paths
+
+    max_pending = max_workers * PENDING_BATCHES_PER_WORKER
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as executor:
+        try:
+            for i, input_path in enumerate(input_paths):
+                if on_file_start:
+                    on_file_start(i + 1, total_files, input_path)
+                output_path = output_dir / input_path.name
+                pending = deque()
+                try:
+                    with open(input_path, 'r', encoding='utf-8-sig', errors=encoding_errors) as infile, \
+                         open(output_path, 'w', encoding='utf-8-sig', newline='') as outfile:
+                        for batch in _iter_batches(csv.reader(infile), batch_rows):
+                            if check_cancelled:
+                                check_cancelled()
+                            pending.append(executor.submit(_normalize_rows_to_csv, batch, engine))
+                            # 先頭のバッチから順に書き出し、保持するバッチ数を制限する
+                            while len(pending) >= max_pending or (pending and pending[0].done()):
+                                outfile.write(pending.popleft().result())
+                        while pending:
+                            outfile.write(pending.popleft().result())
+                except Exception as e:
+                    for future in pending:
+                        future.cancel()
+                    if on_error is None:
+                        raise
+                    on_error(input_path, e)
+                    continue
+                output_paths.append(output_path)
+                if on_file_done:
+                    on_file_done(input_path)
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    return output_paths
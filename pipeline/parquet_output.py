@@ -0,0 +1,100 @@
+import shutil
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import PROCESSED_DIR, PROCESSED_PARQUET_DIR
+from pipeline.partitions import PARTITION_KEY, list_partitions
+from pipeline.duckdb_utils import connect, sql_str, sql_ident
+from pipeline.amounts import is_amount_column
+
+# テーブル名 -> VARCHAR 以外の型を付ける列 (金額・率の列は DOUBLE、それ以外の列は VARCHAR)。空文字列はどの列もNULLとして書き出す
+PARQUET_COLUMN_TYPES: Dict[str, Dict[str, str]] = {
+    'business': {'source_year': 'INTEGER', 'ministry_id': 'INTEGER'},
+    'ministries': {'ministry_id': 'INTEGER'},
+    'budgets': {},
+    'fund_flow': {'sequence': 'INTEGER'},
+    'expenditure': {'sequence': 'INTEGER'},
+}
+
+
+def parquet_partition_path(table: str, year: int) -> Path:
+    return PROCESSED_PARQUET_DIR / table / f"{PARTITION_KEY}={year}" / f"{table}.parquet"
+
+
+def parquet_table_path(table: str) -> Path:
+    """年度で分割しないテーブル (ministries) のParquet"""
+    return PROCESSED_PARQUET_DIR / table / f"{table}.parquet"
+
+
+def list_parquet_files(table: Optional[str] = None) -> List[Path]:
+    """書き出し済みのParquet (table を指定した場合はそのテーブルのもののみ)"""
+    return sorted((PROCESSED_PARQUET_DIR / table if table else PROCESSED_PARQUET_DIR).glob('**/*.parquet'))
+
+
+def write_parquet(csv_path: Path, parquet_path: Path, table: str, source_year: Optional[int] = None):
+    """
+    成果物のCSV (ヘッダー付き) を、PARQUET_COLUMN_TYPES の型を付けたParquetに変換する。
+    source_year を指定した場合、source_year 列を持たないテーブルには business_id の後に source_year 列を加える。
+    (パーティションのパス中の source_year=<年度> は、列の値を置き換えないように読み取らない)
+    """
+    column_types = PARQUET_COLUMN_TYPES[table]
+    source = (
+        f"read_csv({sql_str(csv_path.as_posix())}, header = true, all_varchar = true, "
+        f"delim = ',', quote = '\"', escape = '\"', hive_partitioning = false)"
+    )
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = parquet_path.with_suffix('.tmp')
+
+    with connect() as con:
+        columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        select = []
+        for col in columns:
+            value = f"NULLIF({sql_ident(col)}, '')"
+            col_type = column_types.get(col, 'DOUBLE' if is_amount_column(table, col) else 'VARCHAR')
+            if col_type != 'VARCHAR':
+                value = f"CAST({value} AS {col_type})"
+            select.append(f"{value} AS {sql_ident(col)}")
+            if col == 'business_id' and source_year is not None and PARTITION_KEY not in columns:
+                select.append(f"CAST({int(source_year)} AS INTEGER) AS {PARTITION_KEY}")
+        con.execute(
+            f"COPY (SELECT {', '.join(select)} FROM {source}) "
+            f"TO {sql_str(tmp_path.as_posix())} (FORMAT parquet, COMPRESSION zstd)"
+        )
+    tmp_path.replace(parquet_path)
+
+
+def _is_stale(csv_path: Path, parquet_path: Path) -> bool:
+    return not parquet_path.exists() or parquet_path.stat().st_mtime_ns < csv_path.stat().st_mtime_ns
+
+
+def sync_parquet_partitions(table: str) -> int:
+    """
+    CSVのパーティションに対応するParquetのパーティションを書き出す。
+    CSVより古い (またはまだ無い) パーティションだけを変換し、CSVのパーティションが無い年度のParquetは削除する。
+    変換したパーティションの数を返す。
+    """
+    csv_partitions = list_partitions(table)
+    written = 0
+    for year, csv_path in sorted(csv_partitions.items()):
+        parquet_path = parquet_partition_path(table, year)
+        if _is_stale(csv_path, parquet_path):
+            write_parquet(csv_path, parquet_path, table, year)
+            written += 1
+
+    for parquet_path in list_parquet_files(table):
+        partition = parquet_path.parent.name
+        if partition.startswith(f"{PARTITION_KEY}=") and int(partition.split('=', 1)[1]) not in csv_partitions:
+            logging.info(f"  - Removing stale Parquet partition '{table}/{partition}'.")
+            shutil.rmtree(parquet_path.parent)
+    return written
+
+
+def sync_parquet_table(table: str) -> int:
+    """年度で分割しないテーブルのCSV (PROCESSED_DIR/<テーブル名>.csv) をParquetに変換する。変換した場合は1を返す"""
+    csv_path = PROCESSED_DIR / f"{table}.csv"
+    parquet_path = parquet_table_path(table)
+    if not csv_path.exists() or not _is_stale(csv_path, parquet_path):
+        return 0
+    write_parquet(csv_path, parquet_path, table)
+    return 1
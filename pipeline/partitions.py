@@ -0,0 +1,112 @@
+import shutil
+import logging
+from pathlib import Path
+from typing import Callable, Collection, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from config import PROCESSED_PARTITIONS_DIR
+
+# 成果物のテーブルを分割する列 (パーティションは <テーブル名>/source_year=<年度>/<テーブル名>.csv に置く)
+PARTITION_KEY = 'source_year'
+
+# パーティションの書き出し処理 (年度分のDataFrame, 出力先のパス)
+PartitionWriter = Callable[[pd.DataFrame, Path], None]
+
+
+def filter_paths_by_year(paths: Iterable[Path], target_years: Optional[Collection[int]],
+                         get_year: Callable[[str], Optional[int]]) -> List[Path]:
+    """ファイル名から特定した年度が target_years に含まれるファイルだけを返す (target_years が None の場合は全ファイル)"""
+    if target_years is None:
+        return list(paths)
+    return [path for path in paths if get_year(path.name) in target_years]
+
+
+def year_order(paths: Iterable[Path], get_year: Callable[[str], Optional[int]]) -> List[int]:
+    """ファイルの並び順で、各年度が初めて現れる順の年度の一覧 (全年度を一括で処理した場合の出力の並び順)"""
+    years = []
+    for path in paths:
+        year = get_year(path.name)
+        if year is not None and year not in years:
+            years.append(year)
+    return years
+
+
+def business_id_years(business_ids: pd.Series) -> pd.Series:
+    """business_id ('2023-00001' 形式) の年度部分"""
+    return pd.Series([int(str(bid).split('-', 1)[0]) for bid in business_ids], index=business_ids.index)
+
+
+def partition_path(table: str, year: int) -> Path:
+    return PROCESSED_PARTITIONS_DIR / table / f"{PARTITION_KEY}={year}" / f"{table}.csv"
+
+
+def list_partitions(table: str) -> Dict[int, Path]:
+    """年度 -> パーティションのCSV"""
+    return {
+        int(path.parent.name.split('=', 1)[1]): path
+        for path in (PROCESSED_PARTITIONS_DIR / table).glob(f"{PARTITION_KEY}=*/{table}.csv")
+    }
+
+
+def write_partitions(table: str, df: pd.DataFrame, years: pd.Series, writer: PartitionWriter,
+                     target_years: Optional[Collection[int]] = None) -> List[int]:
+    """
+    今回処理した年度分のテーブル df を、years (行ごとの年度) で分割してパーティションに書き出す。
+    target_years (None の場合は全年度) のうち df に行が無い年度の古いパーティションは削除し、それ以外の年度のパーティションは残す。
+    書き出した年度の一覧を返す。
+    """
+    written = []
+    if not df.empty:
+        for year, part in df.groupby(years.to_numpy(), sort=False):
+            path = partition_path(table, int(year))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writer(part, path)
+            written.append(int(year))
+
+    for year, path in list_partitions(table).items():
+        if year not in written and (target_years is None or year in target_years):
+            logging.info(f"  - Removing stale partition '{table}/{path.parent.name}'.")
+            shutil.rmtree(path.parent)
+    return written
+
+
+def ordered_partitions(table: str, preferred_order: List[int]) -> List[Path]:
+    """パーティションを preferred_order (year_order の結果) の順に並べる。含まれない年度は末尾に年度順で並べる"""
+    partitions = list_partitions(table)
+    years = [year for year in preferred_order if year in partitions]
+    years += sorted(set(partitions) - set(years))
+    return [partitions[year] for year in years]
+
+
+def concat_partition_csvs(table: str, preferred_order: List[int], output_path: Path) -> bool:
+    """
+    列が固定のテーブルのパーティション (同じヘッダー行を持つCSV) を、ヘッダーを1回だけ含む1つのCSVに連結する。
+    各パーティションは全年度を一括で書き出した場合と同じ書式で書かれているため、CSVを読み直さずにバイト列のまま連結する。
+    パーティションが1つも無い場合は何も書き出さずに False を返す。
+    """
+    paths = ordered_partitions(table, preferred_order)
+    if not paths:
+        return False
+    with open(output_path, 'wb') as out:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+    return True
+
+
+def read_partitions(table: str, preferred_order: List[int]) -> pd.DataFrame:
+    """
+    列がパーティションごとに異なるテーブル (予算のワイド形式等) のパーティションを、値を文字列のまま読み込んで結合する。
+    列は各列が初めて現れたパーティションの順に並び、他の年度に無い列は欠損値となる。
+    """
+    frames = [
+        pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        for path in ordered_partitions(table, preferred_order)
+    ]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
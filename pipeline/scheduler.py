@@ -0,0 +1,253 @@
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from pipeline.stage_cache import StageCache
+
+# ワーカープロセスで実行中のステージの完了・進捗と、キャンセル要求を確認する間隔 (秒)
+POLL_INTERVAL_SEC = 0.5
+
+# ステージごとの状態 (ジョブステータスの stages[].status)
+STAGE_PENDING = 'pending'
+STAGE_IN_PROGRESS = 'in-progress'
+STAGE_COMPLETED = 'completed'
+STAGE_SKIPPED = 'skipped'
+STAGE_UP_TO_DATE = 'up-to-date'
+STAGE_FAILED = 'failed'
+STAGE_CANCELLED = 'cancelled'
+
+
+class StageSpec(NamedTuple):
+    """
+    パイプラインの1ステージの宣言。
+    inputs / outputs はステージが読み込む・書き出す成果物の名前で、先に宣言されたステージの outputs を
+    inputs に含むステージは、そのステージの完了後に実行される。
+    run は update_status だけを引数に取る。parallel=True のステージはワーカープロセスで実行されることがあるため、
+    run はpickle可能 (モジュールレベルの関数やその functools.partial) でなければならない。
+    fingerprint (入力・設定・コードから求めたフィンガープリント) と output_files (出力ファイルの一覧) を指定したステージは、
+    前回成功時とフィンガープリントが一致し出力ファイルも変更されていなければ実行を省略し、代わりに on_skip を呼び出す。
+    """
+    number: int
+    name: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    run: Callable
+    parallel: bool = False
+    fingerprint: Optional[Callable[[], str]] = None
+    output_files: Optional[Callable[[], List[Path]]] = None
+    on_skip: Optional[Callable[[], None]] = None
+
+
+class StageCancelledError(Exception):
+    """ステージの実行中にキャンセルが要求された場合の例外"""
+    pass
+
+
+def resolve_dependencies(specs: Sequence[StageSpec]) -> Dict[int, List[int]]:
+    """ステージ番号 -> 依存するステージ番号 (自身の inputs を outputs に含む、先に宣言されたステージ) の一覧"""
+    return {
+        spec.number: [prev.number for prev in specs[:i] if set(prev.outputs) & set(spec.inputs)]
+        for i, spec in enumerate(specs)
+    }
+
+
+def init_stage_states(specs: Sequence[StageSpec], start_stage: int) -> List[Dict[str, Any]]:
+    """ジョブステータスに載せるステージごとの状態を作成する。start_stage より前のステージは skipped となる"""
+    dependencies = resolve_dependencies(specs)
+    return [
+        {
+            'stage': spec.number,
+            'name': spec.name,
+            'status': STAGE_PENDING if spec.number >= start_stage else STAGE_SKIPPED,
+            'depends_on': dependencies[spec.number],
+            'message': None,
+            'elapsed_sec': None,
+        }
+        for spec in specs
+    ]
+
+
+# --- ワーカープロセス側 ---
+_cancel_event = None
+_status_queue = None
+
+
+def _init_worker(cancel_event, status_queue):
+    global _cancel_event, _status_queue
+    _cancel_event = cancel_event
+    _status_queue = status_queue
+
+
+class _WorkerStatus:
+    """ワーカープロセスでステージに渡す update_status。進捗はメインプロセスへ送り、キャンセル要求があれば例外を送出する"""
+
+    def __init__(self, number: int):
+        self.number = number
+
+    def __call__(self, current_stage: str = None, message: str = None, stats: Dict[str, Any] = None):
+        if _cancel_event is not None and _cancel_event.is_set():
+            raise StageCancelledError(f"Stage {self.number} was cancelled.")
+        if current_stage or message or stats:
+            _status_queue.put((self.number, current_stage, message, stats))
+
+
+def _run_in_worker(number: int, run: Callable):
+    run(_WorkerStatus(number))
+
+
+# --- メインプロセス側 ---
+def _sum_worker_stats(stats_by_stage: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """ワーカープロセスごとに集計された統計 (同じキー) を合算する"""
+    total = {}
+    for stats in stats_by_stage.values():
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[key] = total.get(key, 0) + value
+            else:
+                total[key] = value
+    return total
+
+
+def run_stages(specs: Sequence[StageSpec], stage_states: List[Dict[str, Any]], update_status: Callable,
+               max_workers: int = 1, stage_cache: Optional[StageCache] = None):
+    """
+    stage_states (init_stage_states で作成) が pending のステージを、依存関係を満たした順に実行する。
+    stage_cache を指定した場合、前回の成功時から入力・設定・コードに変更の無いステージは up-to-date として省略する。
+    max_workers が2以上の場合、同時に実行可能な parallel=True のステージは最大 max_workers 個のワーカープロセスで並行に実行し、
+    それ以外のステージは実行中のステージが無くなってからメインプロセスで実行する。
+    update_status はステージの進捗の反映とキャンセル要求の確認 (引数なしの呼び出し) に使う。
+    ステージが例外 (キャンセルを含む) を送出した場合は、実行中のワーカーに停止を指示してから再送出する。
+    """
+    states = {state['stage']: state for state in stage_states}
+    dependencies = resolve_dependencies(specs)
+    remaining = [spec for spec in specs if states[spec.number]['status'] == STAGE_PENDING]
+    finished = {number for number, state in states.items() if state['status'] != STAGE_PENDING}
+    started_at = {}
+    fingerprints = {}
+
+    def is_ready(spec: StageSpec) -> bool:
+        return all(number in finished for number in dependencies[spec.number])
+
+    def skip_if_up_to_date(spec: StageSpec) -> bool:
+        """依存するステージの完了後 (入力が確定してから) フィンガープリントを求め、前回から変更が無ければ省略する"""
+        if stage_cache is None or spec.fingerprint is None:
+            return False
+        fingerprint = spec.fingerprint()
+        if not stage_cache.is_up_to_date(spec.number, fingerprint, spec.output_files()):
+            fingerprints[spec.number] = fingerprint
+            return False
+        remaining.remove(spec)
+        finished.add(spec.number)
+        states[spec.number]['status'] = STAGE_UP_TO_DATE
+        states[spec.number]['message'] = "前回の実行から入力・設定・コードに変更が無いため、スキップしました。"
+        logging.info(f"[Scheduler] Stage {spec.number} is up to date. Skipping.")
+        if spec.on_skip is not None:
+            spec.on_skip()
+        return True
+
+    def start(spec: StageSpec):
+        remaining.remove(spec)
+        started_at[spec.number] = time.perf_counter()
+        states[spec.number]['status'] = STAGE_IN_PROGRESS
+        if spec.number in fingerprints:
+            stage_cache.invalidate(spec.number)
+
+    def finish(spec: StageSpec, status: str):
+        states[spec.number]['status'] = status
+        states[spec.number]['elapsed_sec'] = round(time.perf_counter() - started_at[spec.number], 1)
+        if status == STAGE_COMPLETED:
+            finished.add(spec.number)
+            if spec.number in fingerprints:
+                stage_cache.record(spec.number, fingerprints[spec.number], spec.output_files())
+
+    def fail(spec: StageSpec, error: BaseException):
+        finish(spec, STAGE_CANCELLED if isinstance(error, StageCancelledError) else STAGE_FAILED)
+
+    def stage_status(spec: StageSpec) -> Callable:
+        def update_stage_status(current_stage: str = None, message: str = None, stats: Dict[str, Any] = None):
+            if message:
+                states[spec.number]['message'] = message
+            update_status(current_stage=current_stage, message=message, stats=stats)
+        return update_stage_status
+
+    executor = None
+    cancel_event = status_queue = None
+    if max_workers > 1 and sum(spec.parallel for spec in remaining) > 1:
+        ctx = multiprocessing.get_context('spawn')
+        cancel_event = ctx.Event()
+        # SimpleQueue の put は同期的に書き込まれるため、ステージの完了時には進捗がすべて届いている
+        status_queue = ctx.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=ctx,
+            initializer=_init_worker, initargs=(cancel_event, status_queue)
+        )
+
+    running = {}
+    worker_stats: Dict[str, Dict[int, Dict[str, Any]]] = {}
+
+    def drain_worker_status():
+        while status_queue is not None and not status_queue.empty():
+            number, current_stage, message, stats = status_queue.get()
+            if message:
+                states[number]['message'] = message
+            if stats:
+                # ワーカーごとの統計は、同じキーの値を合算してジョブの統計に反映する
+                for key, value in stats.items():
+                    worker_stats.setdefault(key, {})[number] = value
+                stats = {key: _sum_worker_stats(worker_stats[key]) for key in stats}
+            update_status(current_stage=current_stage, message=message, stats=stats)
+
+    try:
+        while remaining or running:
+            update_status()
+            progressed = False
+            for spec in [spec for spec in remaining if is_ready(spec)]:
+                if spec.number not in fingerprints and skip_if_up_to_date(spec):
+                    # 省略したステージの後続が実行可能になっている場合があるため、判定をやり直す
+                    progressed = True
+                    break
+                if executor is not None and spec.parallel:
+                    if len(running) < max_workers:
+                        start(spec)
+                        logging.info(f"[Scheduler] Stage {spec.number} started in a worker process.")
+                        running[executor.submit(_run_in_worker, spec.number, spec.run)] = spec
+                elif not running:
+                    start(spec)
+                    try:
+                        spec.run(stage_status(spec))
+                    except BaseException as e:
+                        fail(spec, e)
+                        raise
+                    finish(spec, STAGE_COMPLETED)
+                    progressed = True
+                    break
+            if progressed:
+                continue
+            if not running:
+                break
+
+            done, _ = wait(running, timeout=POLL_INTERVAL_SEC, return_when=FIRST_COMPLETED)
+            drain_worker_status()
+            for future in done:
+                spec = running.pop(future)
+                try:
+                    future.result()
+                except BaseException as e:
+                    fail(spec, e)
+                    raise
+                finish(spec, STAGE_COMPLETED)
+                logging.info(f"[Scheduler] Stage {spec.number} completed in {states[spec.number]['elapsed_sec']}s.")
+    except BaseException:
+        if executor is not None:
+            cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            for spec in running.values():
+                finish(spec, STAGE_CANCELLED)
+        for spec in remaining:
+            states[spec.number]['status'] = STAGE_CANCELLED
+        raise
+    if executor is not None:
+        executor.shutdown(wait=True)
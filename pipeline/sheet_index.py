@@ -0,0 +1,213 @@
+import os
+import csv
+import json
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from utils.normalization import normalize_text
+
+# --- シート種別の判定基準 (ステージ3〜6と共通) ---
+# 正規化済みCSVのディレクトリに置くヘッダーカタログのファイル名
+HEADER_CATALOG_FILENAME = '_header_catalog.json'
+
+REQUIRED_COLS_FOR_REVIEW_SHEET = {'府省', '府省庁', '事業名', '事業番号', '事業番号-1'}
+EXCLUSION_COL = 'セグメント名'
+
+SHEET_KIND_REVIEW = 'review'
+SHEET_KIND_SEGMENT = 'segment'
+SHEET_KIND_OTHER = 'other'
+
+
+def clean_header_cell(col) -> str:
+    """列名から改行と空白を除去する (各ステージのヘッダー判定と同じ規則)"""
+    return str(col).replace('\n', '').replace('\r', '').replace(' ', '')
+
+
+def classify_header(cleaned_header: Iterable[str]) -> str:
+    """クリーニング済みのヘッダーから、レビューシート/セグメントシート/その他を判定する"""
+    cleaned_header = set(cleaned_header)
+    if EXCLUSION_COL in cleaned_header:
+        return SHEET_KIND_SEGMENT
+    if len(REQUIRED_COLS_FOR_REVIEW_SHEET.intersection(cleaned_header)) < 3:
+        return SHEET_KIND_OTHER
+    return SHEET_KIND_REVIEW
+
+
+def classify_raw_header_row(header_row: Sequence) -> str:
+    """
+    Excelから読み出した先頭行を、ステージ2の正規化を経た場合と同じ形に整えてから判定する。
+    """
+    cleaned = []
+    for cell in header_row:
+        if cell is None:
+            continue
+        escaped = str(cell).replace('\r', '').replace('\n', '<br>')
+        cleaned.append(clean_header_cell(normalize_text(escaped)))
+    return classify_header(cleaned)
+
+
+def _write_json(path: Path, data):
+    """
+    JSONを一時ファイルに書き出してから置き換える。
+    一時ファイル名は書き込みごとに異なるため、ステージ3〜6を並行に実行するプロセスが同時に書き出しても衝突しない (最後に置き換えた内容が残る)
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=path.parent, prefix=f"{path.stem}.",
+                                     suffix='.tmp', delete=False) as f:
+        tmp_path = Path(f.name)
+        try:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class SheetIndex:
+    """
+    ステージ1で判定したシート種別を、CSVファイル名ごとに記録するサイドカーインデックス。
+    生CSVと正規化済みCSVは同じファイル名のため、後続ステージはファイルを読まずに種別を参照できる。
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        self.entries: Dict[str, dict] = {}
+        if index_path.exists():
+            try:
+                self.entries = json.loads(index_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to read sheet index '{index_path.name}': {e}")
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_json(self.index_path, self.entries)
+
+    def update_source(self, source_name: str, sheets: List[dict]):
+        """元ファイル1つ分のシート情報を置き換える。sheets の各要素は csv/sheet/kind/converted を持つ"""
+        self.remove_sources([source_name])
+        for sheet in sheets:
+            self.entries[sheet['csv']] = {
+                'source': source_name,
+                'sheet': sheet['sheet'],
+                'kind': sheet['kind'],
+                'converted': sheet['converted'],
+            }
+
+    def remove_sources(self, source_names: Iterable[str]):
+        source_names = set(source_names)
+        self.entries = {name: e for name, e in self.entries.items() if e['source'] not in source_names}
+
+    def has_source(self, source_name: str) -> bool:
+        return any(e['source'] == source_name for e in self.entries.values())
+
+    def kind_of(self, csv_name: str) -> Optional[str]:
+        entry = self.entries.get(csv_name)
+        return entry['kind'] if entry else None
+
+    def filter_review_files(self, file_paths: List[Path]) -> List[Path]:
+        """
+        インデックス上でレビューシート以外と判定済みのファイルを除外する。
+        インデックスに無いファイルは残し、各ステージのヘッダー判定に委ねる。
+        """
+        kept = []
+        for path in file_paths:
+            kind = self.kind_of(path.name)
+            if kind is not None and kind != SHEET_KIND_REVIEW:
+                logging.info(f"Skipping '{path.name}' ({kind} sheet in sheet index).")
+                continue
+            kept.append(path)
+        return kept
+
+
+def read_cleaned_header(path: Path) -> List[str]:
+    """CSVの先頭行だけを読み、クリーニング済みの列名のリストを返す"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f), [])
+    return [clean_header_cell(col) for col in header]
+
+
+class HeaderCatalog:
+    """
+    正規化済みCSVの先頭行だけを読んで作る、ヘッダーのカタログ。
+    ファイルごとにクリーニング済みヘッダー・シート種別・列数を記録し、
+    ステージ3〜6がレビューシート以外のファイルを全件読み込む前に除外できるようにする。
+    未登録のファイルや、サイズ・更新日時が記録時から変わったファイルは参照時に先頭行を読み直す。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.catalog_path = directory / HEADER_CATALOG_FILENAME
+        self.entries: Dict[str, dict] = {}
+        self._dirty = False
+        if self.catalog_path.exists():
+            try:
+                self.entries = json.loads(self.catalog_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to read header catalog '{self.catalog_path.name}': {e}")
+
+    def save(self):
+        if not self._dirty:
+            return
+        _write_json(self.catalog_path, self.entries)
+        self._dirty = False
+
+    def prune(self):
+        """ディレクトリから削除されたファイルの記録を削除する"""
+        for name in [name for name in self.entries if not (self.directory / name).exists()]:
+            del self.entries[name]
+            self._dirty = True
+
+    def entry(self, path: Path) -> dict:
+        stat = path.stat()
+        entry = self.entries.get(path.name)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry
+        header = read_cleaned_header(path)
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'kind': classify_header(header),
+            'columns': len(header),
+            'header': header,
+        }
+        self.entries[path.name] = entry
+        self._dirty = True
+        return entry
+
+    def kind_of(self, path: Path) -> str:
+        return self.entry(path)['kind']
+
+    def filter_review_files(self, file_paths: List[Path]) -> List[Path]:
+        kept = []
+        for path in file_paths:
+            kind = self.kind_of(path)
+            if kind != SHEET_KIND_REVIEW:
+                logging.info(f"Skipping '{path.name}' ({kind} sheet in header catalog).")
+                continue
+            kept.append(path)
+        return kept
+
+
+def list_review_files(directory: Path, sheet_index_path: Optional[Path] = None) -> List[Path]:
+    """
+    ディレクトリ内のCSVのうち、レビューシートのものだけをファイル名順に返す。
+    ステージ1のシート種別インデックス (ファイルを開かずに判定できる) で除外した後、
+    残りをヘッダーカタログ (先頭行のみ読み込み) で判定する。
+    """
+    csv_files = sorted(directory.glob('*.csv'))
+    if sheet_index_path is not None:
+        csv_files = SheetIndex(sheet_index_path).filter_review_files(csv_files)
+    catalog = HeaderCatalog(directory)
+    catalog.prune()
+    review_files = catalog.filter_review_files(csv_files)
+    try:
+        catalog.save()
+    except OSError as e:
+        logging.warning(f"Failed to save header catalog '{catalog.catalog_path.name}': {e}")
+    return review_files
@@ -0,0 +1,267 @@
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from pipeline.duckdb_utils import connect, sql_str, sql_ident, read_csv_sql
+from pipeline.checkpoint import StageCheckpoint, run_checkpointed
+from pipeline.frame_cache import read_frame_columns
+from pipeline.sheet_index import classify_header, clean_header_cell, SHEET_KIND_REVIEW
+from pipeline.budget_processing import resolve_budget_column, assemble_budget_table
+from pipeline import fund_flow_processing, expenditure_processing
+
+# --- 抽出エンジンの定義 ---
+# 'pandas': 各 *_processing モジュールの DataFrame 上での抽出
+# 'duckdb': 正規化済みCSVに対するSQL (列の射影・UNPIVOT・集約) での抽出。全列をメモリに展開せず、マルチスレッドで処理する
+EXTRACTION_ENGINES = ('pandas', 'duckdb')
+
+# Python の str.strip() が除去する空白文字 (str.isspace() が真になるコードポイント) の一覧。
+# DuckDB の trim() は半角スペースしか除去しないため、pandasエンジンと同じ判定にはこちらを使う
+_WHITESPACE_CODE_POINTS = (
+    0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x1C, 0x1D, 0x1E, 0x1F, 0x20, 0x85, 0xA0,
+    0x1680, 0x2000, 0x2001, 0x2002, 0x2003, 0x2004, 0x2005, 0x2006, 0x2007, 0x2008,
+    0x2009, 0x200A, 0x2028, 0x2029, 0x202F, 0x205F, 0x3000,
+)
+# 上記の空白文字の集合 (RE2の文字クラス)
+_WHITESPACE_CLASS = '[' + ''.join(f'\\x{{{code:x}}}' for code in _WHITESPACE_CODE_POINTS) + ']'
+
+
+def get_extraction_engine(name: str) -> str:
+    if name not in EXTRACTION_ENGINES:
+        raise ValueError(f"Unknown extraction engine: '{name}'. Available: {list(EXTRACTION_ENGINES)}")
+    return name
+
+
+def _long_cells_sql(path: Path, n_columns: int, positions: Sequence[int]) -> str:
+    """指定した列のセルを (row_idx, col, value) の縦持ちにする。NULLのセルは UNPIVOT で除かれる"""
+    selected = ', '.join(f'c{pos}' for pos in positions)
+    return (
+        f"UNPIVOT (SELECT row_number() OVER () - 1 AS row_idx, {selected} FROM {read_csv_sql(path, n_columns)}) "
+        f"ON {selected} INTO NAME col VALUE value"
+    )
+
+
+def _values_sql(rows: Sequence[tuple], names: Sequence[str]) -> str:
+    def literal(value):
+        return str(value) if isinstance(value, int) else sql_str(value)
+    body = ', '.join('(' + ', '.join(literal(v) for v in row) + ')' for row in rows)
+    return f"(VALUES {body}) AS mapping({', '.join(names)})"
+
+
+def _review_columns(filepath: Path) -> Optional[Tuple[str, ...]]:
+    """pandasエンジンと同じ列名を読み、レビューシートでなければ None を返す"""
+    columns = read_frame_columns(filepath)
+    if classify_header(clean_header_cell(col) for col in columns) != SHEET_KIND_REVIEW:
+        logging.info(f"    レビューシートではないためスキップ: {filepath.name}")
+        return None
+    return columns
+
+
+def _extract_budget_cells_sql(con: duckdb.DuckDBPyConnection, filepath: Path, columns: Sequence[str],
+                              review_year: int, file_order: int):
+    """
+    budget_processing._extract_budget_cells のSQL版。値のある予算セルだけをDuckDBで縦持ちにして取り出す。
+    全行の business_id と、セルのDataFrame (予算列が無い場合は None) を返す。
+    """
+    n_rows = con.execute(f"SELECT count(*) FROM {read_csv_sql(filepath, len(columns))}").fetchone()[0]
+    business_ids = np.array([f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(n_rows)], dtype=object)
+
+    mapping = []
+    for pos, col_name in enumerate(columns):
+        target = resolve_budget_column(col_name, review_year)
+        if target:
+            mapping.append((f'c{pos}', pos, target))
+    if not mapping:
+        return business_ids, None
+
+    cells = con.execute(f"""
+        SELECT cells.row_idx, mapping.col_pos, mapping.target, cells.value
+        FROM ({_long_cells_sql(filepath, len(columns), [m[1] for m in mapping])}) AS cells
+        JOIN {_values_sql(mapping, ['col', 'col_pos', 'target'])} USING (col)
+        WHERE NOT regexp_full_match(cells.value, '{_WHITESPACE_CLASS}*')
+        ORDER BY cells.row_idx, mapping.col_pos
+    """).df()
+    return business_ids, pd.DataFrame({
+        'business_id': business_ids[cells['row_idx'].to_numpy()],
+        'column': cells['target'].to_numpy(dtype=object),
+        'value': cells['value'].to_numpy(dtype=object),
+        'file_order': file_order,
+        'col_pos': cells['col_pos'].to_numpy(),
+    })
+
+
+def _process_budget_file_sql(con: duckdb.DuckDBPyConnection, filepath: Path, review_year: int, file_order: int):
+    """1ファイル分の予算セルを取り出す。レビューシートでない場合は None を返す"""
+    columns = _review_columns(filepath)
+    if columns is None:
+        return None
+    return _extract_budget_cells_sql(con, filepath, columns, review_year, file_order)
+
+
+def process_budget_files_sql(file_paths: List[Path], review_year_map: Dict[str, int],
+                             checkpoint: Optional[StageCheckpoint] = None) -> pd.DataFrame:
+    """
+    budget_processing.process_budget_files のSQL版。
+    ワイド形式への組み立てはpandasエンジンと共通の処理を使う。
+    """
+    logging.info("予算・執行データの抽出 (DuckDB) を開始...")
+    all_business_ids = []
+    all_cells = []
+
+    with connect() as con:
+        for file_order, filepath in enumerate(file_paths):
+            logging.info(f"  -> 処理中: {filepath.name}")
+
+            review_year = review_year_map.get(filepath.stem)
+            if not review_year:
+                logging.warning(f"    レビュー年度を特定できずスキップ: {filepath.name}")
+                continue
+
+            try:
+                extracted = run_checkpointed(
+                    checkpoint, filepath,
+                    lambda: _process_budget_file_sql(con, filepath, review_year, file_order)
+                )
+                if extracted is None:
+                    continue
+                business_ids, cells = extracted
+                all_business_ids.extend(business_ids)
+                if cells is not None:
+                    all_cells.append(cells)
+            except Exception as e:
+                logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
+
+    if not all_business_ids:
+        logging.warning("抽出対象となる予算データが見つかりませんでした。")
+        return pd.DataFrame()
+
+    cells = pd.concat(all_cells, ignore_index=True) if all_cells else pd.DataFrame()
+    return assemble_budget_table(all_business_ids, cells)
+
+
+def _extract_records_sql(con: duckdb.DuckDBPyConnection, filepath: Path, columns: Sequence[str], review_year: int,
+                         classify: Callable, items: List[str], record_filter: str,
+                         sequence_value: Callable[[str], object]) -> Optional[pd.DataFrame]:
+    """
+    列を (block_id, 連番, 項目名) に分類し、(行, block_id, 連番) ごとに1レコードへ集約する。
+    同じ項目に複数の列がある場合は後の列の値を採り、レコードは行順・行内では最初に値が現れた列の順に並べる。
+    """
+    mapping, keys = [], {}
+    for pos, col_name in enumerate(columns):
+        spec = classify(col_name)
+        if spec is None:
+            continue
+        block_id, sequence, item_name = spec
+        mapping.append((f'c{pos}', pos, keys.setdefault((block_id, sequence), len(keys)), item_name))
+    if not mapping:
+        return None
+
+    item_columns = ',\n'.join(
+        f"coalesce(arg_max(value, col_pos) FILTER (WHERE item = {sql_str(item)}), '') AS {sql_ident(item)}"
+        for item in items
+    )
+    records = con.execute(f"""
+        WITH cells AS (
+            SELECT cells.row_idx, mapping.col_pos, mapping.key_id, mapping.item,
+                   regexp_replace(cells.value, '^{_WHITESPACE_CLASS}+|{_WHITESPACE_CLASS}+$', '', 'g') AS value
+            FROM ({_long_cells_sql(filepath, len(columns), [m[1] for m in mapping])}) AS cells
+            JOIN {_values_sql(mapping, ['col', 'col_pos', 'key_id', 'item'])} USING (col)
+        ), grouped AS (
+            SELECT row_idx, key_id, min(col_pos) AS first_pos,
+                   {item_columns}
+            FROM cells
+            WHERE value <> ''
+            GROUP BY row_idx, key_id
+        )
+        SELECT * FROM grouped
+        WHERE {record_filter}
+        ORDER BY row_idx, first_pos
+    """).df()
+    if records.empty:
+        return None
+
+    key_list = list(keys)
+    result = {
+        'business_id': [f"{review_year}-{str(row + 1).zfill(5)}" for row in records['row_idx']],
+        'block_id': [key_list[key][0] for key in records['key_id']],
+        'sequence': [sequence_value(key_list[key][1]) for key in records['key_id']],
+    }
+    for item in items:
+        result[item] = records[item].tolist()
+    return pd.DataFrame(result)
+
+
+def _process_record_file_sql(con: duckdb.DuckDBPyConnection, filepath: Path, review_year: int,
+                             **extract_options) -> Optional[pd.DataFrame]:
+    """1ファイル分の明細を取り出す。レビューシートでない場合・明細が無い場合は None を返す"""
+    columns = _review_columns(filepath)
+    if columns is None:
+        return None
+    return _extract_records_sql(con, filepath, columns, review_year, **extract_options)
+
+
+def _process_record_files_sql(file_paths: List[Path], label: str, get_year: Callable,
+                              checkpoint: Optional[StageCheckpoint] = None, **extract_options) -> pd.DataFrame:
+    logging.info(f"{label}の抽出 (DuckDB) を開始...")
+    all_records = []
+
+    with connect() as con:
+        for filepath in file_paths:
+            logging.info(f"  -> 処理中: {filepath.name}")
+
+            review_year = get_year(filepath.stem)
+            if not review_year:
+                logging.warning(f"    レビュー年度を特定できずスキップ: {filepath.name}")
+                continue
+
+            try:
+                records = run_checkpointed(
+                    checkpoint, filepath,
+                    lambda: _process_record_file_sql(con, filepath, review_year, **extract_options)
+                )
+                if records is not None:
+                    all_records.append(records)
+            except Exception as e:
+                logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
+
+    if not all_records:
+        logging.warning(f"抽出対象となる{label}が見つかりませんでした。")
+        return pd.DataFrame()
+
+    return pd.concat(all_records, ignore_index=True)
+
+
+def _classify_fund_flow(col_name: str):
+    spec = fund_flow_processing.classify_fund_flow_column(col_name)
+    if spec is None:
+        return None
+    block_id, item_name, sequence_str = spec
+    return block_id, sequence_str, item_name
+
+
+def process_fund_flow_sql(file_paths: List[Path], checkpoint: Optional[StageCheckpoint] = None) -> pd.DataFrame:
+    """fund_flow_processing.process_fund_flow のSQL版"""
+    return _process_record_files_sql(
+        file_paths, "「資金の流れ」データ", fund_flow_processing.get_year_from_filename, checkpoint,
+        classify=_classify_fund_flow,
+        items=fund_flow_processing.FUND_FLOW_ITEMS,
+        record_filter=(
+            "\"支払先費目\" <> '' OR \"支払先使途\" <> '' OR \"支払先金額(百万円)\" <> '' "
+            "OR (\"支払先計\" <> '' AND \"支払先計\" <> '0')"
+        ),
+        sequence_value=lambda sequence_str: int(sequence_str) if sequence_str.isdigit() else '',
+    )
+
+
+def process_expenditures_sql(file_paths: List[Path], checkpoint: Optional[StageCheckpoint] = None) -> pd.DataFrame:
+    """expenditure_processing.process_expenditures のSQL版"""
+    return _process_record_files_sql(
+        file_paths, "支出データ", expenditure_processing.get_year_from_filename, checkpoint,
+        classify=expenditure_processing.classify_expenditure_column,
+        items=expenditure_processing.EXPENDITURE_LIST_ITEMS,
+        record_filter="\"支出先\" <> '' OR \"支出額\" <> ''",
+        sequence_value=int,
+    )
@@ -0,0 +1,90 @@
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from config import PROJECT_ROOT
+
+# コードのバージョンとして内容をハッシュするソースファイル (設定ファイルの値はステージごとに個別に含める)
+CODE_VERSION_GLOBS = ('pipeline/*.py', 'utils/*.py')
+
+_code_version: Optional[str] = None
+
+
+def code_version() -> str:
+    """パイプラインのソースコードの内容から求めたバージョン (プロセス内で1回だけ計算する)"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for pattern in CODE_VERSION_GLOBS:
+            for path in sorted(PROJECT_ROOT.glob(pattern)):
+                digest.update(path.relative_to(PROJECT_ROOT).as_posix().encode('utf-8'))
+                digest.update(path.read_bytes())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def file_state_digest(paths: Iterable[Path]) -> str:
+    """ファイルの名前・サイズ・更新日時から求めたダイジェスト。存在しないファイルも区別して含める"""
+    digest = hashlib.sha256()
+    for path in sorted(set(paths)):
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path.as_posix()}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+        else:
+            digest.update(f"{path.as_posix()}\0missing\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stage_fingerprint(input_paths: Iterable[Path], settings: Dict[str, Any]) -> str:
+    """入力ファイルの状態・ステージに関係する設定値・コードのバージョンから、ステージのフィンガープリントを求める"""
+    payload = {
+        'code_version': code_version(),
+        'inputs': file_state_digest(input_paths),
+        'settings': settings,
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    ステージごとに、最後に成功した実行のフィンガープリントと出力ファイルの状態を記録する。
+    フィンガープリントが一致し、出力ファイルがその後変更されていないステージは再実行を省略できる。
+    force=True の場合は記録による省略を行わない (実行したステージの記録は更新する)。
+    """
+
+    def __init__(self, path: Path, force: bool = False):
+        self.path = path
+        self.force = force
+        self.entries: Dict[str, dict] = {}
+        if path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to read stage cache '{path.name}': {e}")
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding='utf-8')
+        tmp_path.replace(self.path)
+
+    def is_up_to_date(self, stage: int, fingerprint: str, output_paths: Iterable[Path]) -> bool:
+        if self.force:
+            return False
+        entry = self.entries.get(str(stage))
+        return bool(entry) and entry['fingerprint'] == fingerprint and entry['outputs'] == file_state_digest(output_paths)
+
+    def invalidate(self, stage: int):
+        """実行を開始するステージの記録を消す (途中で失敗した場合に、古い記録で省略されないようにする)"""
+        if self.entries.pop(str(stage), None) is not None:
+            self.save()
+
+    def record(self, stage: int, fingerprint: str, output_paths: Iterable[Path]):
+        self.entries[str(stage)] = {
+            'fingerprint': fingerprint,
+            'outputs': file_state_digest(output_paths),
+        }
+        self.save()
@@ -1,23 +1,36 @@
 import os
-import csv
-import zipfile
 import logging
-from typing import Callable, Optional, List
+from typing import Callable, Collection, Optional, List, Union
 from pathlib import Path
 
 import pandas as pd
-import openpyxl
 
 from config import (
-    DOWNLOAD_DIR, RAW_DIR, NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP
+    DATA_DIR, DOWNLOAD_DIR, RAW_DIR, NORMALIZED_DIR, PROCESSED_DIR, FILENAME_YEAR_MAP,
+    CONVERT_MAX_WORKERS, CONVERT_MANIFEST_PATH, CONVERT_READER_ENGINE, CONVERT_SHEET_KINDS,
+    CONVERT_FUSED_NORMALIZE, CONVERT_WRITE_RAW, SHEET_INDEX_PATH, NORMALIZE_MAX_WORKERS, NORMALIZE_BATCH_ROWS,
+    NORMALIZE_ENGINE, EXTRACTION_ENGINE, CELL_STORE_ENABLED, CELL_STORE_DIR, CHECKPOINT_DIR, PARQUET_OUTPUT_ENABLED
 )
-from utils.normalization import normalize_text
 
 # --- 処理ロジックのインポート ---
+from pipeline.conversion_processing import (
+    ConversionManifest, ConversionOptions, SheetResult, list_excel_sources, convert_workbook, convert_sources_parallel
+)
+from pipeline.normalization_processing import normalize_csv_files
+from pipeline.checkpoint import StageCheckpoint
+from pipeline.partitions import (
+    filter_paths_by_year, year_order, business_id_years, write_partitions, concat_partition_csvs, read_partitions
+)
+from pipeline.parquet_output import sync_parquet_partitions, sync_parquet_table
+from pipeline.amounts import type_amount_columns, raw_column
+from pipeline.frame_cache import FrameCache
+from pipeline.cell_store import CellStore, build_cell_store
+from pipeline.sheet_index import SheetIndex, list_review_files
 from pipeline.business_processing import build_business_tables
 from pipeline.budget_processing import process_budget_files, PAST_BUDGET_ITEMS, REQUEST_BUDGET_ITEMS
 from pipeline.fund_flow_processing import process_fund_flow
 from pipeline.expenditure_processing import process_expenditures, EXPENDITURE_LIST_ITEMS
+from pipeline.sql_extraction import process_budget_files_sql, process_fund_flow_sql, process_expenditures_sql
 
 
 # ロガーの設定
@@ -25,120 +38,298 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 
 # --- Stage 1: Convert Excel/ZIP to CSV ---
-def run_stage_01_convert(update_status: Callable, job_id: str, target_files: Optional[List[str]]):
+def run_stage_01_convert(update_status: Callable, job_id: str, target_files: Optional[List[str]],
+                         max_workers: Optional[int] = None, target_years: Optional[Collection[int]] = None) -> bool:
+    """
+    ダウンロードファイルをCSVに変換する。
+    target_files / target_years を指定した場合は、そのファイル名・年度のダウンロードファイルだけを変換する。
+    融合モード (CONVERT_FUSED_NORMALIZE) で正規化済みCSVまで書き出した場合は True を返し、
+    呼び出し側はステージ2を省略できる。
+    """
     update_status(current_stage="ステージ1: CSVへの変換", message="処理を開始します...")
     
     RAW_DIR.mkdir(parents=True, exist_ok=True)
+    options = ConversionOptions(
+        raw_dir=RAW_DIR if (CONVERT_WRITE_RAW or not CONVERT_FUSED_NORMALIZE) else None,
+        normalized_dir=NORMALIZED_DIR if CONVERT_FUSED_NORMALIZE else None,
+        engine=CONVERT_READER_ENGINE,
+        sheet_kinds=CONVERT_SHEET_KINDS,
+    )
+    if options.normalized_dir is not None:
+        NORMALIZED_DIR.mkdir(parents=True, exist_ok=True)
     
     source_paths = list(DOWNLOAD_DIR.glob('*.zip')) + list(DOWNLOAD_DIR.glob('*.xlsx'))
 
+    # 元ファイルが削除された生CSVを掃除する (target_files の指定有無に関わらず実施)
+    manifest = ConversionManifest(CONVERT_MANIFEST_PATH, DATA_DIR)
+    sheet_index = SheetIndex(SHEET_INDEX_PATH)
+    removed_sources = manifest.remove_missing_sources([p.name for p in source_paths])
+    sheet_index.remove_sources(removed_sources)
+    manifest.save()
+    sheet_index.save()
+
     if target_files:
         source_paths = [p for p in source_paths if p.name in target_files]
+    source_paths = filter_paths_by_year(source_paths, target_years, get_year_from_filename)
 
     if not source_paths:
         logging.warning("[Stage 1] No target files found. Skipping.")
         update_status(message="対象ファイルが見つかりません。スキップします。")
-        return
+        return False
+
+    pending_paths = [
+        p for p in source_paths
+        if not (manifest.is_up_to_date(p, options) and sheet_index.has_source(p.name))
+    ]
+    manifest.save()
+    skipped_count = len(source_paths) - len(pending_paths)
+    for path in source_paths:
+        if path not in pending_paths:
+            logging.info(f"[Stage 1] '{path.name}' is unchanged since the last conversion. Skipping.")
+
+    def report_stats(converted_count: int, message: Optional[str] = None):
+        update_status(message=message, stats={'stage1': {
+            'converted_files': converted_count,
+            'skipped_files': skipped_count,
+            'removed_sources': len(removed_sources),
+        }})
+
+    if not pending_paths:
+        report_stats(0, f"全{skipped_count}ファイルが変換済みのため、ステージ1をスキップしました。")
+        return options.normalized_dir is not None
 
-    def _convert_excel_to_csv(excel_source, file_stem, output_dir):
-        try:
-            workbook = openpyxl.load_workbook(excel_source, read_only=True, data_only=True)
-            for sheet_name in workbook.sheetnames:
-                worksheet = workbook[sheet_name]
-                output_path = output_dir / f"{file_stem}_{sheet_name}.csv"
-                logging.info(f"  - Saving sheet: '{sheet_name}' -> '{output_path.name}'")
-                with open(output_path, 'w', newline='', encoding='utf-8-sig') as csv_file:
-                    csv_writer = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
-                    for row in worksheet.iter_rows(values_only=True):
-                        # === ▼▼▼ 修正箇所 ▼▼▼ ===
-                        # 改行コード(\n)を<br>タグに置換する
-                        escaped_row = [str(cell).replace('\r', '').replace('\n', '<br>') if cell is not None else "" for cell in row]
-                        # ========================
-                        csv_writer.writerow(escaped_row)
-        except Exception as e:
-            logging.error(f"  [ERROR] Failed to process Excel data from {file_stem}: {e}", exc_info=True)
-            raise
-
-    total_files = len(source_paths)
-    for i, path in enumerate(source_paths):
-        update_status(message=f"ファイル {i+1}/{total_files} を処理中: {path.name}")
-        logging.info(f"Processing '{path.name}'...")
-        if path.suffix == '.zip':
+    if max_workers is None:
+        max_workers = CONVERT_MAX_WORKERS
+
+    if max_workers > 1:
+        sources = list_excel_sources(pending_paths)
+        logging.info(f"[Stage 1] Converting {len(sources)} workbook(s) with {max_workers} worker processes.")
+
+        def on_progress(done: int, total: int, label: str):
+            update_status(message=f"シート {done}/{total} を変換しました: {label}")
+
+        recorded = set()
+
+        def on_source_done(path: Path, sheet_results: List[SheetResult]):
+            # 全シートの変換を終えたファイルから記録し、中断後の再実行では変換済みとしてスキップできるようにする
+            _record_converted_source(manifest, sheet_index, path, sheet_results, options)
+            recorded.add(path)
+
+        # 引数なしの update_status() はキャンセル要求の確認のみを行う
+        results = convert_sources_parallel(
+            sources, options, max_workers, on_progress, check_cancelled=update_status, on_source_done=on_source_done
+        )
+        for path in pending_paths:
+            if path not in recorded:
+                _record_converted_source(manifest, sheet_index, path, results.get(path, []), options)
+    else:
+        total_files = len(pending_paths)
+        for i, path in enumerate(pending_paths):
+            update_status(message=f"ファイル {i+1}/{total_files} を処理中: {path.name}")
+            logging.info(f"Processing '{path.name}'...")
             try:
-                with zipfile.ZipFile(path, 'r') as zf:
-                    for file_in_zip in zf.namelist():
-                        if file_in_zip.endswith('.xlsx') and not file_in_zip.startswith('__MACOSX'):
-                            file_stem = Path(file_in_zip).stem
-                            logging.info(f"  - Extracting '{file_in_zip}'")
-                            with zf.open(file_in_zip) as excel_stream:
-                                _convert_excel_to_csv(excel_stream, file_stem, RAW_DIR)
+                sheet_results = []
+                for source in list_excel_sources([path]):
+                    if source.member:
+                        logging.info(f"  - Extracting '{source.member}'")
+                    sheet_results.extend(convert_workbook(source, options))
             except Exception as e:
-                logging.error(f"  [ERROR] Failed to process zip file {path.name}: {e}", exc_info=True)
+                logging.error(f"  [ERROR] Failed to process Excel data from {path.name}: {e}", exc_info=True)
                 raise
-        elif path.suffix == '.xlsx':
-            _convert_excel_to_csv(path, path.stem, RAW_DIR)
-    
-    update_status(message="ステージ1が完了しました。")
+            _record_converted_source(manifest, sheet_index, path, sheet_results, options)
+
+    report_stats(
+        len(pending_paths),
+        f"ステージ1が完了しました。変換: {len(pending_paths)}ファイル, スキップ(変更なし): {skipped_count}ファイル"
+    )
+    return options.normalized_dir is not None
+
+def _record_converted_source(manifest: ConversionManifest, sheet_index: SheetIndex,
+                             path: Path, sheet_results: List[SheetResult], options: ConversionOptions):
+    """変換済みの元ファイルをマニフェストとシート種別インデックスに記録する"""
+    output_paths = [p for r in sheet_results for p in r.output_paths]
+    manifest.record(path, output_paths, options)
+    sheet_index.update_source(path.name, [r.as_index_entry() for r in sheet_results])
+    manifest.save()
+    sheet_index.save()
+
 
 # --- Stage 2: Normalize CSV Files ---
-def run_stage_02_normalize(update_status: Callable, job_id: str):
+def run_stage_02_normalize(update_status: Callable, job_id: str, max_workers: Optional[int] = None,
+                           resume: bool = False, target_years: Optional[Collection[int]] = None):
     update_status(current_stage="ステージ2: データの正規化", message="処理を開始します...")
 
     NORMALIZED_DIR.mkdir(parents=True, exist_ok=True)
 
-    csv_files = sorted(list(RAW_DIR.glob('*.csv')))
+    csv_files = filter_paths_by_year(sorted(RAW_DIR.glob('*.csv')), target_years, get_year_from_filename)
     if not csv_files:
         logging.warning("[Stage 2] No .csv files found in 'data/raw/'. Skipping.")
         update_status(message="対象ファイルが見つかりません。スキップします。")
         return
 
-    total_files = len(csv_files)
-    for i, input_path in enumerate(csv_files):
-        update_status(message=f"ファイル {i+1}/{total_files} を正規化中: {input_path.name}")
-        output_path = NORMALIZED_DIR / input_path.name
-        try:
-            with open(input_path, 'r', encoding='utf-8-sig') as infile, \
-                 open(output_path, 'w', encoding='utf-8-sig', newline='') as outfile:
-                reader = csv.reader(infile)
-                writer = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-                
-                header = next(reader, None)
-                if header:
-                    writer.writerow([normalize_text(cell) for cell in header])
-                
-                for row in reader:
-                    # === ▼▼▼ 修正箇所 ▼▼▼ ===
-                    # 不要な置換処理を削除し、<br>タグはそのまま正規化処理へ渡す
-                    normalized_row = [normalize_text(cell) for cell in row]
-                    # ========================
-                    writer.writerow(normalized_row)
-
-        except Exception as e:
-            logging.error(f"  [ERROR] Failed to process {input_path.name}: {e}", exc_info=True)
-            raise
+    checkpoint = _open_checkpoint(2, resume, {'engine': NORMALIZE_ENGINE})
+    pending_files = [
+        p for p in csv_files if not (checkpoint.is_done(p) and (NORMALIZED_DIR / p.name).exists())
+    ]
+    _report_resumed(update_status, 2, len(csv_files) - len(pending_files))
+
+    if max_workers is None:
+        max_workers = NORMALIZE_MAX_WORKERS
+    if max_workers > 1:
+        logging.info(f"[Stage 2] Normalizing {len(pending_files)} file(s) with {max_workers} worker processes.")
+
+    current_file = {}
+
+    def on_file_start(i, total_files, input_path):
+        current_file['name'] = input_path.name
+        update_status(message=f"ファイル {i}/{total_files} を正規化中: {input_path.name}")
+
+    # 引数なしの update_status() はキャンセル要求の確認のみを行う
+    try:
+        normalize_csv_files(
+            pending_files, NORMALIZED_DIR, max_workers, NORMALIZE_BATCH_ROWS,
+            on_file_start=on_file_start, check_cancelled=update_status, engine=NORMALIZE_ENGINE,
+            on_file_done=checkpoint.mark_done
+        )
+    except Exception as e:
+        logging.error(f"  [ERROR] Failed to process {current_file.get('name')}: {e}", exc_info=True)
+        raise
 
+    if CELL_STORE_ENABLED:
+        run_cell_store_build(update_status, job_id)
+
+    checkpoint.complete()
     update_status(message="ステージ2が完了しました。")
 
 
+def run_cell_store_build(update_status: Callable, job_id: str):
+    """正規化済みCSVから、値のあるセルだけを縦持ちにしたセルストアを構築する (変更の無いファイルはスキップ)"""
+    csv_files = sorted(NORMALIZED_DIR.glob('*.csv'))
+    if not csv_files:
+        return
+
+    def on_file_start(i, total_files, csv_path):
+        update_status(message=f"ファイル {i}/{total_files} のセルストアを構築中: {csv_path.name}")
+
+    # 引数なしの update_status() はキャンセル要求の確認のみを行う
+    stats = build_cell_store(
+        csv_files, CELL_STORE_DIR, get_year_from_filename,
+        on_file_start=on_file_start, check_cancelled=update_status
+    )
+    logging.info(
+        f"[Stage 2] Cell store: {stats['built_files']} built, {stats['skipped_files']} unchanged, "
+        f"{stats['csv_mb']} MB of CSV -> {stats['store_mb']} MB (fill rate {stats['fill_rate']})."
+    )
+    update_status(message="セルストアを構築しました。", stats={'cell_store': stats})
+
+
+# ステージ3〜6の正規化済みCSVの読み込み元 (共有キャッシュ、またはセルストア)
+FrameSource = Union[FrameCache, CellStore]
+
+
+def _frame_loader(frame_cache: Optional[FrameSource], consumer: str):
+    return frame_cache.loader_for(consumer) if frame_cache else None
+
+
+def _finish_frame_cache(update_status: Callable, frame_cache: Optional[FrameSource], consumer: str):
+    """ステージの完了を読み込み元に通知し、読み込みの統計をジョブステータスに反映する"""
+    if frame_cache is None:
+        return
+    frame_cache.finish(consumer)
+    update_status(stats={frame_cache.stats_key: frame_cache.stats()})
+
+
+def _open_checkpoint(stage: int, resume: bool, settings: dict) -> StageCheckpoint:
+    """ステージのファイルごとの完了記録を開く。resume=False の場合は前回の記録を破棄する"""
+    return StageCheckpoint(CHECKPOINT_DIR / f"stage{stage}", resume, settings)
+
+
+def _extraction_checkpoint(stage: int, resume: bool, csv_files: List[Path],
+                           engine: Optional[str] = None) -> StageCheckpoint:
+    """
+    ステージ3〜6の完了記録を開く。ファイルごとの結果は対象ファイルの一覧 (並び順) ・事業年度の対応・抽出エンジンにも依存するため、
+    これらが前回と異なる場合は記録を引き継がない。
+    """
+    return _open_checkpoint(stage, resume, {
+        'files': [p.name for p in csv_files],
+        'years': FILENAME_YEAR_MAP,
+        'engine': engine,
+    })
+
+
+def _saved_message(stage: int, rows: int, target_years: Optional[Collection[int]]) -> str:
+    if target_years is None:
+        return f"ステージ{stage}が完了しました。{rows}件のデータを保存しました。"
+    years = ', '.join(str(year) for year in sorted(target_years))
+    return f"ステージ{stage}が完了しました。対象年度 ({years}) の{rows}件を更新し、他の年度と結合して保存しました。"
+
+
+def _report_resumed(update_status: Callable, stage: int, resumed_files: int):
+    """前回中断した実行の記録から再利用したファイル数を、ジョブの統計 (stats.resumed_files_stageN) に反映する"""
+    if resumed_files:
+        logging.info(f"[Stage {stage}] Resumed: {resumed_files} file(s) were already processed before the interruption.")
+        update_status(stats={f'resumed_files_stage{stage}': resumed_files})
+
+
+def _export_parquet(stage: int, partitioned_tables: List[str], tables: Optional[List[str]] = None):
+    """PARQUET_OUTPUT_ENABLED の場合、ステージの成果物をParquetにも書き出す (CSVより新しいParquetはそのまま残す)"""
+    if not PARQUET_OUTPUT_ENABLED:
+        return
+    written = sum(sync_parquet_partitions(table) for table in partitioned_tables)
+    written += sum(sync_parquet_table(table) for table in tables or [])
+    logging.info(f"[Stage {stage}] Parquet output: {written} file(s) written.")
+
+
 # --- Stage 3: Build Business Tables ---
-def run_stage_03_build_business_tables(update_status: Callable, job_id: str):
-    build_business_tables(update_status, job_id)
+def run_stage_03_build_business_tables(update_status: Callable, job_id: str, frame_cache: Optional[FrameSource] = None,
+                                       resume: bool = False, target_years: Optional[Collection[int]] = None):
+    csv_files = filter_paths_by_year(
+        list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH), target_years, get_year_from_filename
+    )
+    checkpoint = _extraction_checkpoint(3, resume, csv_files)
+    build_business_tables(update_status, job_id, _frame_loader(frame_cache, 'stage3'), checkpoint, target_years)
+    _export_parquet(3, ['business'], ['ministries'])
+    _finish_frame_cache(update_status, frame_cache, 'stage3')
+    _report_resumed(update_status, 3, checkpoint.resumed_files)
+    checkpoint.complete()
 
 # --- Stage 4: Build Budget Summary ---
-def run_stage_04_build_budget_summary(update_status: Callable, job_id: str):
+def run_stage_04_build_budget_summary(update_status: Callable, job_id: str, frame_cache: Optional[FrameSource] = None,
+                                      extraction_engine: Optional[str] = None, resume: bool = False,
+                                      target_years: Optional[Collection[int]] = None):
     update_status(current_stage="ステージ4: 予算テーブルの構築", message="処理を開始します...")
     
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    review_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
+    all_csv_files = filter_paths_by_year(review_files, target_years, get_year_from_filename)
     if not all_csv_files:
         logging.warning("[Stage 4] No normalized CSV files found. Skipping.")
         update_status(message="正規化済みCSVが見つかりません。スキップします。")
         return
         
     review_year_map = {f.stem: get_year_from_filename(f.name) for f in all_csv_files}
-    final_df = process_budget_files(all_csv_files, review_year_map)
+    engine = extraction_engine or EXTRACTION_ENGINE
+    checkpoint = _extraction_checkpoint(4, resume, all_csv_files, engine)
+    if engine == 'duckdb':
+        final_df = process_budget_files_sql(all_csv_files, review_year_map, checkpoint)
+    else:
+        final_df = process_budget_files(all_csv_files, review_year_map, _frame_loader(frame_cache, 'stage4'), checkpoint)
+        _finish_frame_cache(update_status, frame_cache, 'stage4')
+    _report_resumed(update_status, 4, checkpoint.resumed_files)
+    final_df = type_amount_columns(final_df, 'budgets')
+
+    # 年度ごとのパーティションには、その年度に値のある列だけを書き出す
+    write_partitions(
+        'budgets', final_df, business_id_years(final_df.get('business_id', pd.Series(dtype=str))),
+        lambda part, path: part.dropna(axis=1, how='all').to_csv(path, index=False, encoding='utf-8-sig'),
+        target_years
+    )
+    _export_parquet(4, ['budgets'])
+    updated_rows = len(final_df)
+    final_df = read_partitions('budgets', year_order(review_files, get_year_from_filename))
 
     if final_df.empty:
         logging.warning("[Stage 4] No budget data could be extracted.")
+        checkpoint.complete()
         update_status(message="抽出対象の予算データが見つかりませんでした。")
         return
 
@@ -150,64 +341,98 @@ def run_stage_04_build_budget_summary(update_status: Callable, job_id: str):
     for item in REQUEST_BUDGET_ITEMS:
         final_columns.append(f"{item}_req")
         
+    # 数値に変換できなかった元の値の列は、それぞれの金額の列の直後に置く
+    final_columns = [name for col in final_columns for name in (col, raw_column(col))]
     ordered_cols = [col for col in final_columns if col in final_df.columns]
     other_cols = [col for col in final_df.columns if col not in ordered_cols]
     final_df = final_df[ordered_cols + other_cols]
 
     output_path = PROCESSED_DIR / "budgets.csv"
     final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
+    checkpoint.complete()
     
-    update_status(message=f"ステージ4が完了しました。{len(final_df)}件のデータを保存しました。")
+    update_status(message=_saved_message(4, updated_rows, target_years))
 
 
 # --- Stage 5: Build Fund Flow Table ---
-def run_stage_05_build_fund_flow(update_status: Callable, job_id: str):
+def run_stage_05_build_fund_flow(update_status: Callable, job_id: str, frame_cache: Optional[FrameSource] = None,
+                                 extraction_engine: Optional[str] = None, resume: bool = False,
+                                 target_years: Optional[Collection[int]] = None):
     update_status(current_stage="ステージ5: 資金の流れテーブル構築", message="処理を開始します...")
     
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    review_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
+    all_csv_files = filter_paths_by_year(review_files, target_years, get_year_from_filename)
     if not all_csv_files:
         logging.warning("[Stage 5] No normalized CSV files found. Skipping.")
         update_status(message="正規化済みCSVが見つかりません。スキップします。")
         return
     
-    final_df = process_fund_flow(all_csv_files)
+    engine = extraction_engine or EXTRACTION_ENGINE
+    checkpoint = _extraction_checkpoint(5, resume, all_csv_files, engine)
+    if engine == 'duckdb':
+        final_df = process_fund_flow_sql(all_csv_files, checkpoint)
+    else:
+        final_df = process_fund_flow(all_csv_files, _frame_loader(frame_cache, 'stage5'), checkpoint)
+        _finish_frame_cache(update_status, frame_cache, 'stage5')
+    _report_resumed(update_status, 5, checkpoint.resumed_files)
     
-    if not final_df.empty:
-        output_columns = [
-            'business_id', 'block_id', 'sequence', 
-            '支払先費目', '支払先使途', '支払先金額(百万円)', '支払先計'
-        ]
-        final_df = final_df.reindex(columns=output_columns)
-        
-        output_path = PROCESSED_DIR / "fund_flow.csv"
-        final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        update_status(message=f"ステージ5が完了しました。{len(final_df)}件のデータを保存しました。")
+    output_columns = [
+        'business_id', 'block_id', 'sequence', 
+        '支払先費目', '支払先使途', '支払先金額(百万円)', '支払先計'
+    ]
+    final_df = type_amount_columns(final_df.reindex(columns=output_columns), 'fund_flow')
+    write_partitions(
+        'fund_flow', final_df, business_id_years(final_df['business_id']),
+        lambda part, path: part.to_csv(path, index=False, encoding='utf-8-sig'), target_years
+    )
+
+    _export_parquet(5, ['fund_flow'])
+
+    output_path = PROCESSED_DIR / "fund_flow.csv"
+    if concat_partition_csvs('fund_flow', year_order(review_files, get_year_from_filename), output_path):
+        update_status(message=_saved_message(5, len(final_df), target_years))
     else:
         update_status(message="ステージ5は完了しましたが、対象データは見つかりませんでした。")
+    checkpoint.complete()
 
 
 # --- Stage 6: Build Expenditure Table ---
-def run_stage_06_build_expenditure(update_status: Callable, job_id: str):
+def run_stage_06_build_expenditure(update_status: Callable, job_id: str, frame_cache: Optional[FrameSource] = None,
+                                   extraction_engine: Optional[str] = None, resume: bool = False,
+                                   target_years: Optional[Collection[int]] = None):
     update_status(current_stage="ステージ6: 支出テーブル構築", message="処理を開始します...")
 
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    review_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
+    all_csv_files = filter_paths_by_year(review_files, target_years, get_year_from_filename)
     if not all_csv_files:
         logging.warning("[Stage 6] No normalized CSV files found. Skipping.")
         update_status(message="正規化済みCSVが見つかりません。スキップします。")
         return
         
-    final_df = process_expenditures(all_csv_files)
+    engine = extraction_engine or EXTRACTION_ENGINE
+    checkpoint = _extraction_checkpoint(6, resume, all_csv_files, engine)
+    if engine == 'duckdb':
+        final_df = process_expenditures_sql(all_csv_files, checkpoint)
+    else:
+        final_df = process_expenditures(all_csv_files, _frame_loader(frame_cache, 'stage6'), checkpoint)
+        _finish_frame_cache(update_status, frame_cache, 'stage6')
+    _report_resumed(update_status, 6, checkpoint.resumed_files)
     
-    if not final_df.empty:
-        base_cols = ['business_id', 'block_id', 'sequence']
-        output_columns = base_cols + EXPENDITURE_LIST_ITEMS
-        final_df = final_df.reindex(columns=output_columns)
-        
-        output_path = PROCESSED_DIR / "expenditure.csv"
-        final_df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        update_status(message=f"ステージ6が完了しました。{len(final_df)}件のデータを保存しました。")
+    output_columns = ['business_id', 'block_id', 'sequence'] + EXPENDITURE_LIST_ITEMS
+    final_df = type_amount_columns(final_df.reindex(columns=output_columns), 'expenditure')
+    write_partitions(
+        'expenditure', final_df, business_id_years(final_df['business_id']),
+        lambda part, path: part.to_csv(path, index=False, encoding='utf-8-sig'), target_years
+    )
+
+    _export_parquet(6, ['expenditure'])
+
+    output_path = PROCESSED_DIR / "expenditure.csv"
+    if concat_partition_csvs('expenditure', year_order(review_files, get_year_from_filename), output_path):
+        update_status(message=_saved_message(6, len(final_df), target_years))
     else:
         update_status(message="ステージ6は完了しましたが、対象データは見つかりませんでした。")
+    checkpoint.complete()
 
 
 def get_year_from_filename(filename):
@@ -0,0 +1,120 @@
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# --- プロジェクトルートをPythonのパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+# -----------------------------------------
+
+from config import PROCESSED_DIR
+from pipeline.business_processing import FINAL_OUTPUT_COLS, UNQUOTED_COLS, write_business_csv
+
+# 引用符・区切り文字・改行・全角文字・前後の空白など、CSVの引用規則に関わる値
+TRICKY_VALUES = [
+    '', ' ', '"', '""', 'a"b', '"先頭と末尾"', '1,234', 'カンマ,あり', '改行\nあり', 'CRLF\r\nあり',
+    '\t', '△12', '-', '0', 'https://www.example.go.jp/a?b=1&c="2"', '１２３', '　全角スペース　',
+]
+
+
+# --- 比較用: 最適化前の書き出し処理 (そのまま保持) ---
+def legacy_write_business_csv(final_df, output_path):
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        f.write(','.join(final_df.columns) + '\n')
+
+        for row in final_df.itertuples(index=False, name=None):
+            row_values = []
+            for i, value in enumerate(row):
+                col_name = final_df.columns[i]
+                str_value = str(value) if pd.notna(value) else ''
+
+                if col_name in UNQUOTED_COLS:
+                    row_values.append(str_value)
+                else:
+                    escaped_str = str_value.replace('"', '""')
+                    quoted_value = f'"{escaped_str}"'
+                    row_values.append(quoted_value)
+
+            f.write(','.join(row_values) + '\n')
+
+
+def build_synthetic_business(n_rows: int, seed: int) -> pd.DataFrame:
+    """
+    ステージ3の final_df と同じ型の合成データ。
+    文字列列 (欠損あり)・int の source_year・Int64 (欠損あり) の ministry_id・全て欠損の列 (reindex で追加された列) を含む。
+    """
+    rng = random.Random(seed)
+
+    def text(long: bool) -> str:
+        roll = rng.random()
+        if roll < 0.2:
+            return rng.choice(TRICKY_VALUES)
+        if long:
+            return '本事業は、' + '地域の課題解決に向けた取組を「支援」する。' * rng.randint(5, 40)
+        return f"値{rng.randint(0, 99999)}"
+
+    data = {}
+    for col in FINAL_OUTPUT_COLS:
+        if col == 'business_id':
+            data[col] = [f"2023-{str(i + 1).zfill(5)}" for i in range(n_rows)]
+        elif col == 'source_year':
+            data[col] = np.full(n_rows, 2023)
+        elif col == 'ministry_id':
+            data[col] = pd.array([rng.randint(1, 40) if rng.random() < 0.9 else None for _ in range(n_rows)], dtype='Int64')
+        elif col == '施策':
+            data[col] = np.full(n_rows, np.nan)
+        else:
+            long = col in ('事業の目的', '現状・課題', '事業概要')
+            data[col] = pd.array([text(long) if rng.random() < 0.8 else None for _ in range(n_rows)], dtype='str')
+    return pd.DataFrame(data)
+
+
+def main():
+    """
+    business.csv の書き出し処理について、最適化前の実装と現在の実装の処理時間を比較し、
+    書き出したファイルがバイト単位で一致することを検証する。一致しない場合は終了コード1を返す。
+    """
+    parser = argparse.ArgumentParser(description="business.csv 書き出し処理のベンチマーク")
+    parser.add_argument('--rows', type=int, default=20000, help="合成データの行数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processed', action='store_true',
+                        help="合成データに加えて、data/processed/business.csv を読み込んだデータでも検証する")
+    args = parser.parse_args()
+
+    datasets = [('合成データ', build_synthetic_business(args.rows, args.seed)),
+                ('合成データ (0行)', build_synthetic_business(0, args.seed))]
+    if args.processed:
+        existing = PROCESSED_DIR / 'business.csv'
+        df = pd.read_csv(existing, dtype=str, keep_default_na=False, na_values=[''], encoding='utf-8-sig')
+        df['ministry_id'] = df['ministry_id'].astype('Int64')
+        datasets.append((existing.name, df))
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, df in datasets:
+            timings, contents = {}, {}
+            for name, writer in (('legacy', legacy_write_business_csv), ('current', write_business_csv)):
+                output_path = Path(tmp) / f"{name}.csv"
+                start = time.perf_counter()
+                writer(df, output_path)
+                timings[name] = time.perf_counter() - start
+                contents[name] = output_path.read_bytes()
+
+            matched = contents['legacy'] == contents['current']
+            if not matched:
+                failures += 1
+            print(f"  {label:<20} {len(df)}行  legacy {timings['legacy']:.2f}s  current {timings['current']:.2f}s"
+                  f"  ({timings['legacy'] / max(timings['current'], 1e-9):.1f}倍)"
+                  f"  {len(contents['current']) / 1024 / 1024:.1f}MB  出力: {'一致' if matched else '不一致'}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
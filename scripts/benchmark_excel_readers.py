@@ -0,0 +1,84 @@
+import argparse
+import filecmp
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# --- プロジェクトルートをPythonのパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+# -----------------------------------------
+
+from config import DOWNLOAD_DIR
+from pipeline.conversion_processing import ConversionOptions, list_excel_sources, convert_workbook
+from pipeline.excel_readers import READER_ENGINES
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    """
+    Excel読み込みエンジンごとにステージ1のCSV変換時間を計測し、
+    全エンジンの出力CSVがバイト単位で一致することを検証する。
+    """
+    parser = argparse.ArgumentParser(description="Excel読み込みエンジンのベンチマーク")
+    parser.add_argument('paths', nargs='*', type=Path,
+                        help="対象のZIP/XLSXファイル (省略時は data/download 内の全ファイル)")
+    parser.add_argument('--engines', nargs='+', default=list(READER_ENGINES), choices=list(READER_ENGINES))
+    args = parser.parse_args()
+
+    source_paths = args.paths or sorted(list(DOWNLOAD_DIR.glob('*.zip')) + list(DOWNLOAD_DIR.glob('*.xlsx')))
+    if not source_paths:
+        print(f"対象ファイルが見つかりません: {DOWNLOAD_DIR}")
+        return 1
+
+    sources = list_excel_sources(source_paths)
+    baseline_engine = args.engines[0]
+    mismatches = 0
+    totals = {engine: 0.0 for engine in args.engines}
+
+    print(f"{'ブック':<50} " + " ".join(f"{engine:>12}" for engine in args.engines))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        for source in sources:
+            timings = {}
+            outputs = {}
+            for engine in args.engines:
+                output_dir = tmp_dir / engine / source.file_stem
+                output_dir.mkdir(parents=True, exist_ok=True)
+                start = time.perf_counter()
+                results = convert_workbook(source, ConversionOptions(raw_dir=output_dir, engine=engine))
+                outputs[engine] = [p for r in results for p in r.output_paths]
+                timings[engine] = time.perf_counter() - start
+                totals[engine] += timings[engine]
+
+            print(f"{source.label:<50} " + " ".join(f"{timings[e]:>11.2f}s" for e in args.engines))
+
+            for engine in args.engines[1:]:
+                expected_names = [p.name for p in outputs[baseline_engine]]
+                actual_names = [p.name for p in outputs[engine]]
+                if expected_names != actual_names:
+                    print(f"  [不一致] {engine}: シート構成が異なります {actual_names} != {expected_names}")
+                    mismatches += 1
+                    continue
+                for expected, actual in zip(outputs[baseline_engine], outputs[engine]):
+                    if not filecmp.cmp(expected, actual, shallow=False):
+                        print(f"  [不一致] {engine}: {actual.name} の内容が {baseline_engine} と異なります")
+                        mismatches += 1
+
+    print(f"{'合計':<50} " + " ".join(f"{totals[e]:>11.2f}s" for e in args.engines))
+    for engine in args.engines[1:]:
+        if totals[engine] > 0:
+            print(f"  {engine}: {baseline_engine} 比 {totals[baseline_engine] / totals[engine]:.1f}倍")
+
+    if mismatches:
+        print(f"出力の不一致が {mismatches} 件あります。")
+        return 1
+    print("全エンジンの出力が一致しました。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
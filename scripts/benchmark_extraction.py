@@ -0,0 +1,390 @@
+import argparse
+import csv
+import logging
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+# --- プロジェクトルートをPythonのパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+# -----------------------------------------
+
+from config import FILENAME_YEAR_MAP, NORMALIZED_DIR, SHEET_INDEX_PATH
+from pipeline.budget_processing import (
+    process_budget_files, standardize_item_name, P_2014, P_2015
+)
+from pipeline.fund_flow_processing import (
+    process_fund_flow, FUND_FLOW_ITEMS, PATTERN_WITH_SEQ, PATTERN_WITHOUT_SEQ
+)
+from pipeline.expenditure_processing import (
+    process_expenditures, EXPENDITURE_LIST_ITEMS, PATTERN_2014 as EXPENDITURE_PATTERN_2014,
+    PATTERN_2015_ON as EXPENDITURE_PATTERN_2015_ON, PREFIX as EXPENDITURE_PREFIX
+)
+from pipeline.sql_extraction import (
+    EXTRACTION_ENGINES, process_budget_files_sql, process_fund_flow_sql, process_expenditures_sql
+)
+from pipeline.cell_store import CellStore, build_cell_store
+from pipeline.sheet_index import list_review_files, classify_header, clean_header_cell, SHEET_KIND_REVIEW
+
+# 抽出処理の進捗ログ (INFO) は計測の妨げになるため抑制する
+logging.getLogger().setLevel(logging.WARNING)
+
+MINISTRIES = ['内閣府', '総務省', '文部科学省', '厚生労働省', '国土交通省', '防衛省']
+BUDGET_ITEMS = ['予算の状況当初予算', '予算の状況補正予算', '予算の状況前年度から繰越し', '予算の状況予備費等',
+                '予算の状況計', '執行額', '執行率(%)']
+VALUES = ['委託費', '株式会社リストグループ', '一般競争入札', '-', '△12', '1,234', '0', ' ', '\t', ' 12 ', '\xa0', '']
+
+
+def get_year_from_filename(filename):
+    for key, year in FILENAME_YEAR_MAP.items():
+        if key in filename:
+            return year
+    return None
+
+
+# --- 比較用: 最適化前の抽出処理 (そのまま保持) ---
+def legacy_process_budget_files(file_paths, review_year_map):
+    all_business_records = {}
+    for filepath in file_paths:
+        review_year = review_year_map.get(filepath.stem)
+        if not review_year:
+            continue
+        try:
+            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False, na_values=[''])
+            if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+                continue
+            df.reset_index(inplace=True)
+            df['business_id'] = df['index'].apply(lambda idx: f"{review_year}-{str(idx+1).zfill(5)}")
+            for index, row in df.iterrows():
+                business_id = row['business_id']
+                if business_id not in all_business_records:
+                    all_business_records[business_id] = {'business_id': business_id}
+                for col_name in df.columns:
+                    if not isinstance(col_name, str) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
+                        continue
+                    match_2014 = P_2014.fullmatch(col_name)
+                    match_2015 = P_2015.fullmatch(col_name)
+                    raw_item, target_year_str, is_request_str = None, None, ''
+                    if match_2014:
+                        raw_item, target_year_str, is_request_str = match_2014.groups()
+                    elif match_2015:
+                        target_year_str, raw_item = match_2015.groups()
+                    else:
+                        continue
+                    is_request = '要求' in raw_item or ('要求' in is_request_str if is_request_str else False)
+                    item_name = standardize_item_name(raw_item, is_request)
+                    if not item_name: continue
+                    target_year = int(target_year_str)
+                    relative_pos = target_year - review_year if not is_request else 1
+                    if not (-3 <= relative_pos <= 1): continue
+                    suffix_map = {-3: '_py3', -2: '_py2', -1: '_py1', 0: '', 1: '_req'}
+                    suffix = suffix_map.get(relative_pos)
+                    new_col_name = f"{item_name}{suffix}"
+                    all_business_records[business_id][new_col_name] = row[col_name]
+        except Exception as e:
+            logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
+    if not all_business_records:
+        return pd.DataFrame()
+    return pd.DataFrame.from_dict(all_business_records, orient='index')
+
+
+def run_budget(file_paths, engine, frame_loader=None):
+    review_year_map = {f.stem: get_year_from_filename(f.name) for f in file_paths}
+    if engine == 'legacy':
+        return legacy_process_budget_files(file_paths, review_year_map)
+    if engine == 'duckdb':
+        return process_budget_files_sql(file_paths, review_year_map)
+    return process_budget_files(file_paths, review_year_map, frame_loader)
+
+
+def legacy_process_fund_flow(file_paths):
+    all_fund_flow_records = []
+    for filepath in file_paths:
+        review_year = get_year_from_filename(filepath.stem)
+        if not review_year:
+            continue
+        try:
+            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False)
+            if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+                continue
+            df['business_id'] = [f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
+            for index, row in df.iterrows():
+                business_fund_flows = defaultdict(dict)
+                business_id = row['business_id']
+                for col_name in df.columns:
+                    if not isinstance(col_name, str) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
+                        continue
+                    match = PATTERN_WITH_SEQ.match(col_name)
+                    if match:
+                        block_id, item_name, sequence_str = match.groups()
+                    else:
+                        match = PATTERN_WITHOUT_SEQ.match(col_name)
+                        if match:
+                            block_id, item_name = match.groups()
+                            sequence_str = ""
+                        else:
+                            continue
+                    item_name = item_name.strip()
+                    if item_name not in FUND_FLOW_ITEMS:
+                        continue
+                    record_key = f"{block_id}-{sequence_str}"
+                    business_fund_flows[record_key][item_name] = row[col_name]
+                for key, data_dict in business_fund_flows.items():
+                    block_id, sequence_part = key.split('-', 1)
+                    record = {
+                        'business_id': business_id,
+                        'block_id': block_id,
+                        'sequence': int(sequence_part) if sequence_part.isdigit() else '',
+                        '支払先使途': data_dict.get('支払先使途', '').strip(),
+                        '支払先計': data_dict.get('支払先計', '').strip(),
+                        '支払先費目': data_dict.get('支払先費目', '').strip(),
+                        '支払先金額(百万円)': data_dict.get('支払先金額(百万円)', '').strip(),
+                    }
+                    has_primary_data = any([
+                        record['支払先費目'],
+                        record['支払先使途'],
+                        record['支払先金額(百万円)']
+                    ])
+                    total_amount_str = record['支払先計']
+                    has_meaningful_total = total_amount_str and total_amount_str != '0'
+                    if has_primary_data or has_meaningful_total:
+                        all_fund_flow_records.append(record)
+        except Exception as e:
+            logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
+    if not all_fund_flow_records:
+        return pd.DataFrame()
+    return pd.DataFrame(all_fund_flow_records)
+
+
+def run_fund_flow(file_paths, engine, frame_loader=None):
+    if engine == 'legacy':
+        return legacy_process_fund_flow(file_paths)
+    if engine == 'duckdb':
+        return process_fund_flow_sql(file_paths)
+    return process_fund_flow(file_paths, frame_loader)
+
+
+def legacy_process_expenditures(file_paths):
+    all_expenditure_records = []
+    for filepath in file_paths:
+        review_year = get_year_from_filename(filepath.stem)
+        if not review_year:
+            continue
+        try:
+            df = pd.read_csv(filepath, low_memory=False, dtype=str, keep_default_na=False)
+            if classify_header(clean_header_cell(col) for col in df.columns) != SHEET_KIND_REVIEW:
+                continue
+            df['business_id'] = [f"{review_year}-{str(idx+1).zfill(5)}" for idx in range(len(df))]
+            for index, row in df.iterrows():
+                business_expenditures = defaultdict(dict)
+                business_id = row['business_id']
+                for col_name in df.columns:
+                    if not col_name.startswith(EXPENDITURE_PREFIX) or pd.isna(row[col_name]) or str(row[col_name]).strip() == '':
+                        continue
+                    block_id, sequence, raw_item_name = None, None, None
+                    match_2015 = EXPENDITURE_PATTERN_2015_ON.match(col_name)
+                    if match_2015:
+                        block_id, sequence, raw_item_name = match_2015.groups()
+                    else:
+                        match_2014 = EXPENDITURE_PATTERN_2014.match(col_name)
+                        if match_2014:
+                            block_id = 'グループ'
+                            raw_item_name, sequence = match_2014.groups()
+                    if raw_item_name:
+                        item_name = re.sub(r'\(.*\)|-\d+$', '', raw_item_name).strip()
+                        if item_name in EXPENDITURE_LIST_ITEMS:
+                            record_key = f"{block_id}-{sequence}"
+                            business_expenditures[record_key][item_name] = row[col_name]
+                for key, data_dict in business_expenditures.items():
+                    block_id, sequence = key.split('-', 1)
+                    if not data_dict.get('支出先') and not data_dict.get('支出額'):
+                        continue
+                    record = {
+                        'business_id': business_id,
+                        'block_id': block_id,
+                        'sequence': int(sequence),
+                    }
+                    for item in EXPENDITURE_LIST_ITEMS:
+                        record[item] = data_dict.get(item, '').strip()
+                    all_expenditure_records.append(record)
+        except Exception as e:
+            logging.error(f"    ファイル処理中にエラー: {filepath.name} - {e}", exc_info=True)
+    if not all_expenditure_records:
+        return pd.DataFrame()
+    return pd.DataFrame(all_expenditure_records)
+
+
+def run_expenditure(file_paths, engine, frame_loader=None):
+    if engine == 'legacy':
+        return legacy_process_expenditures(file_paths)
+    if engine == 'duckdb':
+        return process_expenditures_sql(file_paths)
+    return process_expenditures(file_paths, frame_loader)
+
+
+# legacy: 比較用に保持した最適化前の実装。pandas / duckdb は pipeline.sql_extraction.EXTRACTION_ENGINES
+# cell_store: pandasエンジンで、正規化済みCSVの代わりにセルストアから必要な列だけを読み込む
+ENGINES = ('legacy',) + EXTRACTION_ENGINES + ('cell_store',)
+
+# 抽出処理名 → 実行関数 (file_paths, engine, frame_loader) -> DataFrame
+EXTRACTORS = {
+    'budget': run_budget,
+    'fund_flow': run_fund_flow,
+    'expenditure': run_expenditure,
+}
+
+
+def review_header(year: int, fmt2014: bool) -> list:
+    """レビューシートを模したヘッダー (2014年形式 / 2015年以降の形式)"""
+    header = ['府省庁', '事業名', '事業番号-1', '事業番号-2', '事業概要', '会計区分']
+    for y in range(year - 4, year + 2):
+        for item in BUDGET_ITEMS:
+            header.append(f"予算額・執行額-{item}-{y}年度" if fmt2014 else f"予算額・執行額-{y}年度{item}")
+    # 同じ出力列に解決される列 (後の列の値で上書きされる)
+    header.append(f"予算額・執行額(補正後)-{year}年度予算の状況計")
+    header.append(f"予算額・執行額-要求予算の状況当初予算-{year + 1}年度要求" if fmt2014
+                  else f"予算額・執行額-{year + 1}年度要求予算の状況当初予算")
+    header.append(f"予算額・執行額-{year + 1}年度要求予算の状況計")
+    # 資金の流れ: 連番の無い支払先計をブロックの前後に置き、行ごとに明細の出現順が変わるようにする
+    for b in 'ABC':
+        if b == 'B':
+            header.append(f"費目・使途(資金の流れ)-{b}.支払先計")
+        for s in range(1, 6):
+            header += [f"費目・使途(資金の流れ)-{b}.{item}-{s}" for item in ('支払先費目', '支払先使途', '支払先金額(百万円)')]
+        if b != 'B':
+            header.append(f"費目・使途(資金の流れ)-{b}.支払先計")
+    header.append("費目・使途(資金の流れ)(補足)-A.支払先費目-1")
+    # 支出先上位10者リスト: 2014年形式は「グループ-項目名-連番」、2015年以降は「A.支払先-連番-項目名」
+    expenditure_items = ['番号', '支出先', '業務概要', '支出額(百万円)', '入札者数', '落札率', '契約方式等', '法人番号']
+    for b in ('グループ',) if fmt2014 else 'AB':
+        for s in range(1, 11):
+            for item in expenditure_items:
+                header.append(f"支出先上位10者リスト-グループ-{item}-{s}" if fmt2014
+                              else f"支出先上位10者リスト-{b}.支払先-{s}-{item}")
+    header.append("支出先上位10者リスト-グループ-支出額(補足)-1" if fmt2014 else "支出先上位10者リスト-A.支払先-1-支出額(補足)")
+    header += [f"その他項目{i}" for i in range(200)]
+    return header
+
+
+def write_synthetic_sheet(path: Path, year: int, fmt2014: bool, n_rows: int, rng: random.Random,
+                          empty_rate: float = 0.4):
+    header = review_header(year, fmt2014)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        for r in range(n_rows):
+            row = []
+            for col in header:
+                if col == '府省庁':
+                    row.append(rng.choice(MINISTRIES))
+                elif col == '事業名':
+                    row.append(f"事業{r}の推進")
+                elif col.startswith('事業番号'):
+                    row.append(str(r))
+                elif rng.random() < empty_rate:
+                    row.append('')
+                elif rng.random() < 0.5:
+                    row.append(str(rng.randint(0, 100000)))
+                else:
+                    row.append(rng.choice(VALUES))
+            writer.writerow(row)
+
+
+def build_synthetic_files(directory: Path, n_rows: int, seed: int, empty_rate: float = 0.4) -> list:
+    """2014年形式・2015年以降の形式の1年分のシートと、business_id が重複する小さなシートを生成する"""
+    rng = random.Random(seed)
+    files = [
+        (directory / 'database2014_1.csv', 2014, True, n_rows),
+        (directory / 'database2015_1.csv', 2015, False, n_rows),
+        (directory / 'database2015_9.csv', 2015, False, max(1, n_rows // 10)),
+        (directory / 'database240918_1.csv', 2023, False, n_rows),
+    ]
+    for path, year, fmt2014, rows in files:
+        write_synthetic_sheet(path, year, fmt2014, rows, rng, empty_rate)
+    return [path for path, _, _, _ in files]
+
+
+def main():
+    """
+    ステージ4〜6の抽出処理について、最適化前の実装 (legacy)・pandasエンジン・DuckDBエンジン・セルストアの処理時間を比較し、
+    各エンジンの出力 (行・列・値・順序) が基準のエンジンと完全に一致することを検証する。
+    セルストアを比較する場合は、構築時間・CSVとストアのサイズ・読み込んだセル数も表示する。
+    一致しない場合は終了コード1を返す。
+    """
+    parser = argparse.ArgumentParser(description="抽出処理のベンチマーク")
+    parser.add_argument('paths', nargs='*', type=Path,
+                        help="対象の正規化済みCSV (省略時は合成データ。--normalized で data/normalized を使用)")
+    parser.add_argument('--normalized', action='store_true', help="data/normalized のレビューシートを対象にする")
+    parser.add_argument('--extractors', nargs='+', default=list(EXTRACTORS), choices=list(EXTRACTORS))
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES),
+                        help="比較するエンジン (先頭が基準)")
+    parser.add_argument('--by-file', action='store_true', help="ファイルごとの計測結果も表示する")
+    parser.add_argument('--rows', type=int, default=5000, help="合成データの1年分の行数")
+    parser.add_argument('--empty-rate', type=float, default=0.4, help="合成データの空セルの割合 (固定の列を除く)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.paths:
+            file_paths = args.paths
+        elif args.normalized:
+            file_paths = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
+        else:
+            file_paths = build_synthetic_files(Path(tmp), args.rows, args.seed, args.empty_rate)
+        print(f"対象: {', '.join(p.name for p in file_paths)}")
+
+        store = None
+        if 'cell_store' in args.engines:
+            store_dir = Path(tmp) / 'cell_store'
+            start = time.perf_counter()
+            store_stats = build_cell_store(file_paths, store_dir, get_year_from_filename)
+            print(f"セルストア: 構築 {time.perf_counter() - start:.2f}s  "
+                  f"CSV {store_stats['csv_mb']}MB -> ストア {store_stats['store_mb']}MB  "
+                  f"セル {store_stats['cells']} (充填率 {store_stats['fill_rate']})")
+            store = CellStore(store_dir)
+
+        # --by-file の場合は、ファイル (年度の形式) ごとにも計測する
+        targets = [('全ファイル', file_paths)]
+        if args.by_file and len(file_paths) > 1:
+            targets += [(p.name, [p]) for p in file_paths]
+
+        failures = 0
+        reference = args.engines[0]
+        for name in args.extractors:
+            for label, paths in targets:
+                timings, outputs = {}, {}
+                for engine in args.engines:
+                    start = time.perf_counter()
+                    if engine == 'cell_store':
+                        outputs[engine] = EXTRACTORS[name](paths, 'pandas', store.loader_for(name))
+                    else:
+                        outputs[engine] = EXTRACTORS[name](paths, engine)
+                    timings[engine] = time.perf_counter() - start
+
+                # 先頭のエンジンの出力を基準に、CSVとして書き出した内容が一致するかを検証する
+                expected_csv = outputs[reference].to_csv(index=False)
+                for engine in args.engines:
+                    matched = outputs[engine].to_csv(index=False) == expected_csv
+                    if not matched:
+                        failures += 1
+                    status = '基準' if engine == reference else ('一致' if matched else '不一致')
+                    print(f"  {name:<12} {label:<22} {engine:<10} {timings[engine]:>8.2f}s"
+                          f"  ({timings[reference] / timings[engine]:.1f}倍)  {len(outputs[engine])}行  出力: {status}")
+
+        if store is not None:
+            stats = store.stats()
+            print(f"セルストアから読み込んだセル: {stats['cells_read']} ({stats['frames_read']}ファイル分)")
+            store.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import random
+import re
+import sys
+import time
+import tracemalloc
+import unicodedata
+from pathlib import Path
+from typing import List, Tuple
+
+# --- プロジェクトルートをPythonのパスに追加 ---
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+# -----------------------------------------
+
+from config import MINISTRY_MASTER_DATA, NORMALIZE_BATCH_ROWS
+from pipeline.normalization_processing import NORMALIZATION_ENGINES, get_normalization_engine
+from utils import normalization
+from utils.normalization import normalize_text
+
+# --- ゴールデンファイル ---
+GOLDEN_PATH = Path(__file__).parent / "golden" / "normalization_golden.csv"
+GOLDEN_CELLS = 5000
+GOLDEN_SEED = 20240918
+# ベンチマークでコーパスを行に分割する際の1行あたりのセル数 (レビューシートの列数程度)
+ROW_WIDTH = 40
+
+# --- 代表的なセル値 (レビューシートで繰り返し出現するもの) ---
+ACCOUNT_TYPES = ['一般会計', 'エネルギー対策特別会計', '東日本大震災復興特別会計', '労働保険特別会計', '年金特別会計']
+CONTRACT_TYPES = ['一般競争入札', '一般競争入札(総合評価)', '随意契約(企画競争)', '随意契約(公募)', '随意契約(その他)', 'その他']
+EXPENSE_ITEMS = ['委託費', '補助金', '人件費', '諸謝金', '旅費', '庁費', '職員旅費', 'システム運用・保守費']
+KATAKANA_TERMS = ['サ－ビス', 'センタ－', 'データ-ベース', 'リスト－グル－プ', 'リスト-グループ', 'ネットワ‐ク', 'コンピュ−タ']
+# 規則の境界となるセル値 (適合性の検証用にコーパスへ必ず含める)
+EDGE_CASES = [
+    '', ' ', '  \u3000 ', '0', '-', '~', ' 1 ~ 2 ', 'H30', 'R1', 'R6', 'M45', 'S64～H2', '平成元年度', '令和元～3年度',
+    '5年度', '6年度', '2016年度', '12年度', '①②⑳', 'ｻｰﾋﾞｽ', 'サ－ビス', 'リスト-グループ', 'リスト‐グル－プ',
+    'リスト−グループとリスト-グループ', 'データ-ベース', '東京-大阪', 'abc-def', 'ABC\u2010DEF', '<br>改行<br>',
+]
+WAREKI_TERMS = ['平成{0}年度', 'H{0}', 'R{1}', '令和{1}年度', '{0}年度', '平成{0}年度～{2}年度', 'H{0}～{2}', '令和元年度']
+
+
+def build_corpus(n_cells: int, seed: int = 0) -> list:
+    """レビューシートのセル値の分布を模したコーパスを生成する"""
+    rng = random.Random(seed)
+    ministries = MINISTRY_MASTER_DATA['ministry_name'] + ['原子力規制員会']
+
+    def wareki():
+        return rng.choice(WAREKI_TERMS).format(rng.randint(6, 30), rng.randint(1, 5), rng.randint(20, 31))
+
+    def long_text():
+        parts = [
+            f"{rng.choice('①②③④⑤')}{rng.choice(EXPENSE_ITEMS)}について、{wareki()}から実施する。",
+            f"{rng.choice(KATAKANA_TERMS)}の整備を行い、{rng.choice(ministries)}と連携する。",
+            f"事業規模は{rng.randint(1, 9999):,}百万円（ｾﾞﾛﾍﾞｰｽで見直し）<br>",
+        ]
+        return ''.join(rng.choice(parts) for _ in range(rng.randint(3, 12)))
+
+    generators = [
+        (40, lambda: ''),
+        (8, lambda: str(rng.randint(0, 100000))),
+        (4, lambda: f"{rng.random() * 100:.1f}"),
+        (3, lambda: rng.choice(['-', '△12', '1,234', '0', '―', '－'])),
+        (6, lambda: rng.choice(ministries)),
+        (6, lambda: rng.choice(ACCOUNT_TYPES)),
+        (6, lambda: rng.choice(CONTRACT_TYPES)),
+        (6, lambda: rng.choice(EXPENSE_ITEMS)),
+        (5, wareki),
+        (4, lambda: rng.choice(KATAKANA_TERMS)),
+        (3, lambda: f"ABC-{rng.randint(1, 999)} https://www.example.go.jp/{rng.randint(1, 99)}"),
+        (3, lambda: f"  {rng.choice(EXPENSE_ITEMS)}～{rng.choice(EXPENSE_ITEMS)} "),
+        (6, long_text),
+    ]
+    weights = [w for w, _ in generators]
+    funcs = [f for _, f in generators]
+    return EDGE_CASES + [rng.choices(funcs, weights)[0]() for _ in range(n_cells - len(EDGE_CASES))]
+
+
+# --- 最適化前の normalize_text (比較用にそのまま保持) ---
+def legacy_normalize_text(text: str) -> str:
+    if not isinstance(text, str) or not text:
+        return text
+
+    def replace_list_marker(match):
+        marker_map = { '①':'1','②':'2','③':'3','④':'4','⑤':'5','⑥':'6','⑦':'7','⑧':'8','⑨':'9','⑩':'10',
+                       '⑪':'11','⑫':'12','⑬':'13','⑭':'14','⑮':'15','⑯':'16','⑰':'17','⑱':'18','⑲':'19','⑳':'20'}
+        return marker_map.get(match.group(1), match.group(1)) + '. '
+    text = normalization.RE_LIST_MARKER.sub(replace_list_marker, text)
+
+    text = unicodedata.normalize('NFKC', text)
+    text = normalization.RE_TILDE_VARIANTS.sub('～', text)
+
+    def convert_wareki_range(match):
+        era, year1_str, year2_str = match.groups()
+        seireki1 = normalization._get_seireki(era, year1_str)
+        seireki2 = normalization._get_seireki(era, year2_str)
+        if seireki1 is not None and seireki2 is not None:
+            return f"{seireki1}～{seireki2}"
+        return match.group(0)
+    text = normalization.RE_WAREKI_RANGE.sub(convert_wareki_range, text)
+
+    def convert_wareki_single(match):
+        era, year_str = match.groups()
+        seireki = normalization._get_seireki(era, year_str)
+        return str(seireki) if seireki is not None else match.group(0)
+    text = normalization.RE_WAREKI_SINGLE.sub(convert_wareki_single, text)
+
+    def convert_wareki_abbreviated(match):
+        year_str = match.group(1)
+        if not year_str.isdigit(): return match.group(0)
+        year = int(year_str)
+        seireki = 2018 + year if year <= 5 else 1988 + year
+        return match.group(0).replace(year_str, str(seireki))
+    text = normalization.RE_WAREKI_ABBREVIATED.sub(convert_wareki_abbreviated, text)
+
+    import uuid
+    placeholders = {}
+    for wrong, correct in normalization.KATAKANA_HYPHEN_PRE_NORMALIZATION.items():
+        pattern_str = normalization.HYPHEN_LIKE_CHARS.join(map(re.escape, wrong.split('-')))
+        text = re.sub(pattern_str, correct, text)
+    for exclusion in normalization.KATAKANA_HYPHEN_EXCLUSIONS:
+        pattern_str = normalization.HYPHEN_LIKE_CHARS.join(map(re.escape, exclusion.split('-')))
+        def replacer(match):
+            placeholder = f"__PLACEHOLDER_{uuid.uuid4().hex}__"
+            placeholders[placeholder] = match.group(0)
+            return placeholder
+        text = re.compile(pattern_str).sub(replacer, text)
+
+    text = normalization.RE_KATAKANA_HYPHEN.sub(r'\1ー', text)
+    text = normalization.RE_HYPHEN_LIKE.sub('-', text)
+    text = re.sub(r'([ぁ-んァ-ヴ一-龠])-(?=[ぁ-んァ-ヴ一-龠])', r'\1', text)
+
+    for placeholder, original_value in placeholders.items():
+        text = text.replace(placeholder, original_value)
+
+    return text.strip()
+
+
+def load_golden(path: Path) -> Tuple[List[str], List[str]]:
+    """ゴールデンファイル (入力, 期待値 の2列CSV) を読み込む"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        pairs = list(reader)
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+
+def save_golden(path: Path, inputs: List[str], expected: List[str]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(['input', 'expected'])
+        writer.writerows(zip(inputs, expected))
+
+
+def run_engine(engine: str, batches: List[List[List[str]]]) -> List[str]:
+    """ステージ2と同じ行バッチ単位でエンジンを実行し、出力セルを1列に並べて返す"""
+    if engine == 'legacy':
+        normalize_rows = lambda rows: [[legacy_normalize_text(cell) for cell in row] for row in rows]
+    else:
+        normalize_rows = get_normalization_engine(engine)
+    normalization._normalize_text_cached.cache_clear()
+    return [cell for batch in batches for row in normalize_rows(batch) for cell in row]
+
+
+def to_batches(cells: List[str], batch_rows: int) -> List[List[List[str]]]:
+    rows = [cells[i:i + ROW_WIDTH] for i in range(0, len(cells), ROW_WIDTH)]
+    return [rows[i:i + batch_rows] for i in range(0, len(rows), batch_rows)]
+
+
+def check_golden(golden_path: Path, engines: List[str], batch_rows: int) -> int:
+    """各エンジンの出力をゴールデンファイルの期待値と比較し、不一致のエンジン数を返す"""
+    inputs, expected = load_golden(golden_path)
+    batches = to_batches(inputs, batch_rows)
+    failures = 0
+    for engine in engines:
+        actual = run_engine(engine, batches)
+        diffs = [(i, o, a) for i, o, a in zip(inputs, expected, actual) if o != a]
+        if diffs:
+            failures += 1
+            print(f"[不一致] {engine}: {len(diffs)}/{len(inputs)}セルがゴールデンと異なります。")
+            for cell, exp, act in diffs[:5]:
+                print(f"    入力={cell!r} 期待値={exp!r} 出力={act!r}")
+        else:
+            print(f"[一致] {engine}: {len(inputs):,}セルすべてゴールデンと一致")
+    return failures
+
+
+def measure(engine: str, batches: List[List[List[str]]]) -> Tuple[float, float, List[str]]:
+    """(経過秒, ピークメモリMB, 出力) を返す。計測の精度を保つため、時間とメモリは別々に実行して測る"""
+    start = time.perf_counter()
+    outputs = run_engine(engine, batches)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    run_engine(engine, batches)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, outputs
+
+
+def main():
+    """
+    正規化エンジンの回帰テスト兼ベンチマーク。
+
+    1. ゴールデンファイル (scripts/golden/normalization_golden.csv) の全セルについて、各エンジンの出力が
+       期待値と一致するかを検証する (和暦略号の令和/平成判定、リスト-グループの除外など規則の境界を含む)。
+    2. レビューシートのセル値を模した生成コーパスで、エンジンごとに セル/秒・MB/秒・ピークメモリ を計測する。
+       エンジン間で出力が1セルでも異なる場合も失敗とする。
+
+    不一致があった場合は終了コード1を返す。
+    正規化規則を意図的に変更した場合は、差分を確認した上で --update-golden で期待値を更新する。
+    """
+    parser = argparse.ArgumentParser(description="正規化エンジンの回帰テストとベンチマーク")
+    parser.add_argument('--cells', type=int, default=200_000, help="ベンチマーク用コーパスのセル数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', nargs='+', default=['legacy'] + list(NORMALIZATION_ENGINES),
+                        choices=['legacy'] + list(NORMALIZATION_ENGINES),
+                        help="計測するエンジン ('legacy' は最適化前の normalize_text で、ゴールデン検証の対象外)")
+    parser.add_argument('--batch-rows', type=int, default=NORMALIZE_BATCH_ROWS, help="1バッチの行数")
+    parser.add_argument('--golden', type=Path, default=GOLDEN_PATH, help="ゴールデンファイルのパス")
+    parser.add_argument('--update-golden', action='store_true',
+                        help="現在の normalize_text の出力でゴールデンファイルを再生成する")
+    parser.add_argument('--golden-cells', type=int, default=GOLDEN_CELLS, help="ゴールデン生成時のセル数")
+    parser.add_argument('--skip-benchmark', action='store_true', help="ゴールデン検証のみ行う")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        inputs = build_corpus(args.golden_cells, GOLDEN_SEED)
+        save_golden(args.golden, inputs, [normalize_text(cell) for cell in inputs])
+        print(f"ゴールデンファイルを更新しました: {args.golden} ({len(inputs):,}セル)")
+        return 0
+
+    if not args.golden.exists():
+        print(f"ゴールデンファイルが見つかりません: {args.golden} (--update-golden で生成してください)")
+        return 1
+
+    checked_engines = [e for e in args.engines if e != 'legacy']
+    failures = check_golden(args.golden, checked_engines, args.batch_rows)
+    if args.skip_benchmark:
+        return 1 if failures else 0
+
+    corpus = build_corpus(args.cells, args.seed)
+    corpus_mb = sum(len(cell.encode('utf-8')) for cell in corpus) / 1024 / 1024
+    batches = to_batches(corpus, args.batch_rows)
+    print(f"\nコーパス: {len(corpus):,}セル ({corpus_mb:.1f} MB), {len(batches)}バッチ")
+    print(f"  {'エンジン':<12} {'セル/秒':>12} {'MB/秒':>8} {'ピークMB':>10} {'比':>6}")
+
+    baseline = None
+    reference = None
+    for engine in args.engines:
+        elapsed, peak_mb, outputs = measure(engine, batches)
+        baseline = baseline or elapsed
+        print(f"  {engine:<12} {len(corpus) / elapsed:>12,.0f} {corpus_mb / elapsed:>8.2f} {peak_mb:>10.1f}"
+              f" {baseline / elapsed:>5.1f}倍")
+        if engine == 'legacy':
+            continue
+        if reference is None:
+            reference = (engine, outputs)
+        elif outputs != reference[1]:
+            failures += 1
+            n_diffs = sum(a != b for a, b in zip(outputs, reference[1]))
+            print(f"  [不一致] {engine}: {n_diffs}セルで {reference[0]} と出力が異なります。")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,7 +8,8 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 # -----------------------------------------
 
-from config import FILENAME_YEAR_MAP, NORMALIZED_DIR, PROCESSED_DIR
+from config import FILENAME_YEAR_MAP, NORMALIZED_DIR, PROCESSED_DIR, SHEET_INDEX_PATH
+from pipeline.sheet_index import list_review_files
 # --- ▼▼▼ 修正箇所: 共通ロジックをインポート ▼▼▼ ---
 from pipeline.budget_processing import process_budget_files, PAST_BUDGET_ITEMS, REQUEST_BUDGET_ITEMS
 # --- ▲▲▲ 修正箇所ここまで ▲▲▲ ---
@@ -25,7 +26,7 @@ def get_year_from_filename(filename):
 if __name__ == '__main__':
     logging.info("予算・執行データ（超ワイド形式）の個別抽出を開始します...")
     
-    all_csv_files = sorted(list(NORMALIZED_DIR.glob('*.csv')))
+    all_csv_files = list_review_files(NORMALIZED_DIR, SHEET_INDEX_PATH)
     if not all_csv_files:
         logging.warning(f"分析対象のCSVファイルが見つかりません: {NORMALIZED_DIR}")
     else:
@@ -1,4 +1,4 @@
-import csv
+import argparse
 import logging
 import sys
 from pathlib import Path
@@ -8,7 +8,8 @@ project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 # -----------------------------------------
 
-from utils.normalization import normalize_text
+from config import NORMALIZE_MAX_WORKERS, NORMALIZE_BATCH_ROWS, NORMALIZE_ENGINE
+from pipeline.normalization_processing import NORMALIZATION_ENGINES, normalize_csv_files
 
 # --- 設定 ---
 RAW_DIR = project_root / "data" / "raw"
@@ -22,6 +23,15 @@ def main():
     /data/raw 内の全CSVファイルに対して正規化処理を再実行し、
     結果を /data/normalized に出力する。
     """
+    parser = argparse.ArgumentParser(description="正規化処理の再実行")
+    parser.add_argument('--workers', type=int, default=NORMALIZE_MAX_WORKERS,
+                        help="ワーカープロセス数 (1の場合は逐次処理)")
+    parser.add_argument('--batch-rows', type=int, default=NORMALIZE_BATCH_ROWS,
+                        help="並列処理で1タスクに含める行数")
+    parser.add_argument('--engine', default=NORMALIZE_ENGINE, choices=list(NORMALIZATION_ENGINES),
+                        help="正規化エンジン")
+    args = parser.parse_args()
+
     logging.info("--- 正規化処理の再実行を開始します ---")
 
     if not RAW_DIR.is_dir():
@@ -39,32 +49,17 @@ def main():
         
     logging.info(f"{len(csv_files)}個のファイルを処理します。")
 
-    total_files = len(csv_files)
-    for i, input_path in enumerate(csv_files, 1):
-        output_path = NORMALIZED_DIR / input_path.name
-        logging.info(f"[{i}/{total_files}] 処理中: {input_path.name} -> {output_path.name}")
-        
-        try:
-            with open(input_path, 'r', encoding='utf-8-sig', errors='ignore') as infile, \
-                 open(output_path, 'w', encoding='utf-8-sig', newline='') as outfile:
-                
-                reader = csv.reader(infile)
-                writer = csv.writer(outfile, quoting=csv.QUOTE_ALL)
-                
-                # ヘッダー行を正規化
-                header = next(reader, None)
-                if header:
-                    # <<< 修正: \\n は文字列として扱いため、replace処理は行わない >>>
-                    writer.writerow([normalize_text(cell) for cell in header])
-                
-                # データ行を正規化
-                for row in reader:
-                    # <<< 修正: \\n は文字列として扱いため、replace処理は行わない >>>
-                    writer.writerow([normalize_text(cell) for cell in row])
+    def on_file_start(i, total_files, input_path):
+        logging.info(f"[{i}/{total_files}] 処理中: {input_path.name} -> {input_path.name}")
+
+    def on_error(input_path, e):
+        logging.error(f"  [エラー] ファイル処理中にエラーが発生しました: {input_path.name} - {e}")
+
+    normalize_csv_files(
+        csv_files, NORMALIZED_DIR, args.workers, args.batch_rows,
+        on_file_start=on_file_start, encoding_errors='ignore', on_error=on_error, engine=args.engine
+    )
 
-        except Exception as e:
-            logging.error(f"  [エラー] ファイル処理中にエラーが発生しました: {input_path.name} - {e}")
-    
     logging.info("--- すべてのファイルの正規化処理が完了しました ---")
 
 if __name__ == '__main__':
@@ -5,12 +5,15 @@ from typing import List
 # このスクリプトの場所を基準にプロジェクトルートディレクトリを特定
 PROJECT_ROOT = Path(__file__).parent.parent
 PROCESSED_DATA_DIR = PROJECT_ROOT / "data" / "processed"
+# パイプラインが型付きのParquetも書き出している場合 (PARQUET_OUTPUT_ENABLED) はこちらを優先して読み込む
+PROCESSED_PARQUET_DIR = PROCESSED_DATA_DIR / "parquet"
 
 def get_db_connection() -> duckdb.DuckDBPyConnection | None:
     """
     インメモリのDuckDBデータベースに接続し、
     /data/processed 内の全CSVファイルからビューを作成して、
     接続オブジェクトを返す。
+    同じテーブルのParquet (/data/processed/parquet/<テーブル名>/) がある場合は、CSVの代わりにParquetからビューを作成する。
     
     Returns:
         duckdb.DuckDBPyConnection | None: 成功した場合は接続オブジェクト、
@@ -38,6 +41,14 @@ def get_db_connection() -> duckdb.DuckDBPyConnection | None:
         # Windowsのパス区切り文字'\'に対応するため、.as_posix() を使用して
         # パスを常に'/'区切りに変換する。
         posix_path = file_path.as_posix()
+        parquet_dir = PROCESSED_PARQUET_DIR / table_name
+        if any(parquet_dir.glob("**/*.parquet")):
+            # source_year はファイル内の列として持っているため、ディレクトリ名からは読み取らない
+            con.sql(
+                f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_parquet("
+                f"'{parquet_dir.as_posix()}/**/*.parquet', union_by_name = true, hive_partitioning = false)"
+            )
+            continue
         con.sql(f"CREATE OR REPLACE VIEW {table_name} AS SELECT * FROM read_csv_auto('{posix_path}')")
         # ▲▲▲【ここまでが修正点】▲▲▲
 
@@ -49,13 +49,13 @@ def run_sample_queries():
 
         if target_budget_col in budget_columns:
             print(f"\n---[サンプルクエリ2: デジタル庁の'{target_budget_col}'が高い事業トップ10]---")
-            # エラー解決のため、CAST を TRY_CAST に変更。
-            # TRY_CASTは '-' のような変換できない文字列をエラーにせずNULLに変換する。
+            # 金額の列はパイプラインで数値 (DOUBLE) に変換済みのため、CAST せずにそのまま集計・比較できる。
+            # '-' のような数値に変換できなかった値はNULLとなり (元の値は '<列名>_原文' 列に残る)、
             # WHERE句でそのNULLを除外することで、数値データのみを対象とする。
             query2 = f"""
             SELECT
                 b.事業名,
-                TRY_CAST(bu."{target_budget_col}" AS DOUBLE) AS 当初予算額_百万円
+                bu."{target_budget_col}" AS 当初予算額_百万円
             FROM
                 business b
             JOIN
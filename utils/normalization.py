@@ -1,5 +1,6 @@
 import re
 import unicodedata
+from functools import lru_cache
 from typing import Optional
 
 # --- Regex Definitions ---
@@ -12,10 +13,39 @@ RE_WAREKI_ABBREVIATED = re.compile(r'(?<!\d)(\d{1,2})年度')
 HYPHEN_LIKE_CHARS = r'[\u002D\u2010\u2011\u2012\u2013\u2014\u2015\u2212\uFF0D]'
 RE_HYPHEN_LIKE = re.compile(HYPHEN_LIKE_CHARS)
 RE_KATAKANA_HYPHEN = re.compile(r'([ァ-ヴ])' + HYPHEN_LIKE_CHARS + r'(?=[ァ-ヴ])')
+RE_KANA_KANJI_HYPHEN = re.compile(r'([ぁ-んァ-ヴ一-龠])-(?=[ぁ-んァ-ヴ一-龠])')
 # <<< 修正箇所: 削除してしまった重要な定義を復元 >>>
 KATAKANA_HYPHEN_PRE_NORMALIZATION = {"リスト-グル-プ": "リスト-グループ"}
 KATAKANA_HYPHEN_EXCLUSIONS = ["リスト-グループ"]
 
+# --- Precomputed Definitions (hot path) ---
+LIST_MARKER_MAP = {
+    '①': '1', '②': '2', '③': '3', '④': '4', '⑤': '5', '⑥': '6', '⑦': '7', '⑧': '8', '⑨': '9', '⑩': '10',
+    '⑪': '11', '⑫': '12', '⑬': '13', '⑭': '14', '⑮': '15', '⑯': '16', '⑰': '17', '⑱': '18', '⑲': '19', '⑳': '20',
+}
+REIWA_HEURISTIC_THRESHOLD = 5  # 令和5年(2023年)まで
+
+
+def _hyphen_tolerant_pattern(term: str) -> 're.Pattern':
+    """'リスト-グループ' の '-' 部分に任意のハイフン類似文字を許容するパターンを作る"""
+    return re.compile(HYPHEN_LIKE_CHARS.join(map(re.escape, term.split('-'))))
+
+
+RE_KATAKANA_HYPHEN_PRE_NORMALIZATION = [
+    (_hyphen_tolerant_pattern(wrong), correct) for wrong, correct in KATAKANA_HYPHEN_PRE_NORMALIZATION.items()
+]
+RE_KATAKANA_HYPHEN_EXCLUSIONS = [_hyphen_tolerant_pattern(exclusion) for exclusion in KATAKANA_HYPHEN_EXCLUSIONS]
+# 除外語を一時的に退避させるためのプレースホルダー (NUL文字はExcel/XMLのセル値に現れない)
+PLACEHOLDER_FORMAT = '\x00{}\x00'
+
+# ASCII文字のみの文字列のうち、正規化ルールの対象となりうるもの (チルダ、和暦の略号+数字)
+RE_ASCII_RULE_TRIGGERS = re.compile(r'~|[MTSHR]\d')
+
+# --- Memoization ---
+# 府省名・会計区分・契約方式など、繰り返し出現する短いセル値の正規化結果をキャッシュする
+NORMALIZE_CACHE_SIZE = 65536
+NORMALIZE_CACHE_MAX_LENGTH = 64
+
 
 def _get_seireki(era: str, year_str: str) -> Optional[int]:
     """Helper function to convert Japanese era year to Western calendar year."""
@@ -27,74 +57,94 @@ def _get_seireki(era: str, year_str: str) -> Optional[int]:
     if era in ('令和', 'R'): return 2018 + year
     return None
 
-def normalize_text(text: str) -> str:
-    """Applies all defined Japanese normalization rules to a single cell string."""
-    if not isinstance(text, str) or not text:
-        return text
 
+def _replace_list_marker(match):
+    return LIST_MARKER_MAP.get(match.group(1), match.group(1)) + '. '
+
+
+def _convert_wareki_range(match):
+    era, year1_str, year2_str = match.groups()
+    seireki1 = _get_seireki(era, year1_str)
+    seireki2 = _get_seireki(era, year2_str)
+    if seireki1 is not None and seireki2 is not None:
+        return f"{seireki1}～{seireki2}"
+    return match.group(0)
+
+
+def _convert_wareki_single(match):
+    era, year_str = match.groups()
+    seireki = _get_seireki(era, year_str)
+    return str(seireki) if seireki is not None else match.group(0)
+
+
+def _convert_wareki_abbreviated(match):
+    year_str = match.group(1)
+    if not year_str.isdigit(): return match.group(0)
+
+    year = int(year_str)
+    if year <= REIWA_HEURISTIC_THRESHOLD:
+        seireki = 2018 + year # Reiwa
+    else:
+        seireki = 1988 + year # Heisei
+
+    return match.group(0).replace(year_str, str(seireki))
+
+
+def _apply_hyphen_rules_with_exclusions(text: str) -> str:
+    """除外語を退避させた上で、カタカナ長音・ハイフン類の統一・かな漢字間のハイフン除去を行う"""
+    placeholders = []
+    def protect(match):
+        placeholders.append(match.group(0))
+        return PLACEHOLDER_FORMAT.format(len(placeholders) - 1)
+    for pattern in RE_KATAKANA_HYPHEN_EXCLUSIONS:
+        if pattern.search(text):
+            text = pattern.sub(protect, text)
+
+    text = RE_KATAKANA_HYPHEN.sub(r'\1ー', text)
+    text = RE_HYPHEN_LIKE.sub('-', text)
+    text = RE_KANA_KANJI_HYPHEN.sub(r'\1', text)
+
+    for i, original_value in enumerate(placeholders):
+        text = text.replace(PLACEHOLDER_FORMAT.format(i), original_value)
+    return text
+
+
+def _normalize_text_uncached(text: str) -> str:
     # Step 1: Pre-processing (before NFKC)
-    def replace_list_marker(match):
-        marker_map = { '①':'1','②':'2','③':'3','④':'4','⑤':'5','⑥':'6','⑦':'7','⑧':'8','⑨':'9','⑩':'10',
-                       '⑪':'11','⑫':'12','⑬':'13','⑭':'14','⑮':'15','⑯':'16','⑰':'17','⑱':'18','⑲':'19','⑳':'20'}
-        return marker_map.get(match.group(1), match.group(1)) + '. '
-    text = RE_LIST_MARKER.sub(replace_list_marker, text)
+    text = RE_LIST_MARKER.sub(_replace_list_marker, text)
 
     # Step 2: Basic Normalization
     text = unicodedata.normalize('NFKC', text)
     text = RE_TILDE_VARIANTS.sub('～', text)
 
     # Step 3: Wareki to Seireki Conversion
-    def convert_wareki_range(match):
-        era, year1_str, year2_str = match.groups()
-        seireki1 = _get_seireki(era, year1_str)
-        seireki2 = _get_seireki(era, year2_str)
-        if seireki1 is not None and seireki2 is not None:
-            return f"{seireki1}～{seireki2}"
-        return match.group(0)
-    text = RE_WAREKI_RANGE.sub(convert_wareki_range, text)
-
-    def convert_wareki_single(match):
-        era, year_str = match.groups()
-        seireki = _get_seireki(era, year_str)
-        return str(seireki) if seireki is not None else match.group(0)
-    text = RE_WAREKI_SINGLE.sub(convert_wareki_single, text)
-    
+    text = RE_WAREKI_RANGE.sub(_convert_wareki_range, text)
+    text = RE_WAREKI_SINGLE.sub(_convert_wareki_single, text)
+
     # Step 3.5: Abbreviated Wareki to Seireki Conversion (Heisei/Reiwa)
-    def convert_wareki_abbreviated(match):
-        year_str = match.group(1)
-        if not year_str.isdigit(): return match.group(0)
-        
-        year = int(year_str)
-        REIWA_HEURISTIC_THRESHOLD = 5  # 令和5年(2023年)まで
-
-        if year <= REIWA_HEURISTIC_THRESHOLD:
-            seireki = 2018 + year # Reiwa
-        else:
-            seireki = 1988 + year # Heisei
-        
-        return match.group(0).replace(year_str, str(seireki))
-    
-    text = RE_WAREKI_ABBREVIATED.sub(convert_wareki_abbreviated, text)
-    
+    text = RE_WAREKI_ABBREVIATED.sub(_convert_wareki_abbreviated, text)
+
     # Step 4: Hyphen Processing
-    import uuid
-    placeholders = {}
-    for wrong, correct in KATAKANA_HYPHEN_PRE_NORMALIZATION.items():
-        pattern_str = HYPHEN_LIKE_CHARS.join(map(re.escape, wrong.split('-')))
-        text = re.sub(pattern_str, correct, text)
-    for exclusion in KATAKANA_HYPHEN_EXCLUSIONS:
-        pattern_str = HYPHEN_LIKE_CHARS.join(map(re.escape, exclusion.split('-')))
-        def replacer(match):
-            placeholder = f"__PLACEHOLDER_{uuid.uuid4().hex}__"
-            placeholders[placeholder] = match.group(0)
-            return placeholder
-        text = re.compile(pattern_str).sub(replacer, text)
-    
-    text = RE_KATAKANA_HYPHEN.sub(r'\1ー', text)
-    text = RE_HYPHEN_LIKE.sub('-', text)
-    text = re.sub(r'([ぁ-んァ-ヴ一-龠])-(?=[ぁ-んァ-ヴ一-龠])', r'\1', text)
-    
-    for placeholder, original_value in placeholders.items():
-        text = text.replace(placeholder, original_value)
+    for pattern, correct in RE_KATAKANA_HYPHEN_PRE_NORMALIZATION:
+        text = pattern.sub(correct, text)
+
+    text = _apply_hyphen_rules_with_exclusions(text)
+
+    return text.strip()
+
+
+_normalize_text_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize_text_uncached)
+
+
+def normalize_text(text: str) -> str:
+    """Applies all defined Japanese normalization rules to a single cell string."""
+    if not isinstance(text, str) or not text:
+        return text
+
+    # Fast path: 数値やASCII文字のみのセルは、チルダ・和暦略号を含まなければ前後の空白除去のみで済む
+    if text.isascii() and not RE_ASCII_RULE_TRIGGERS.search(text):
+        return text.strip()
 
-    return text.strip()
\ No newline at end of file
+    if len(text) <= NORMALIZE_CACHE_MAX_LENGTH:
+        return _normalize_text_cached(text)
+    return _normalize_text_uncached(text)
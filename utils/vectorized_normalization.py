@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from utils.normalization import (
+    RE_LIST_MARKER, RE_TILDE_VARIANTS, RE_WAREKI_RANGE, RE_WAREKI_SINGLE, RE_WAREKI_ABBREVIATED,
+    RE_KATAKANA_HYPHEN_PRE_NORMALIZATION, RE_KATAKANA_HYPHEN_EXCLUSIONS, RE_KATAKANA_HYPHEN,
+    RE_HYPHEN_LIKE, RE_KANA_KANJI_HYPHEN, RE_ASCII_RULE_TRIGGERS,
+    _replace_list_marker, _convert_wareki_range, _convert_wareki_single, _convert_wareki_abbreviated,
+    _apply_hyphen_rules_with_exclusions,
+)
+
+
+def _normalize_unique_strings(values: pd.Series) -> pd.Series:
+    """
+    重複のない空でない文字列の列に、normalize_text と同じ規則を列単位で順に適用する。
+    除外語 (リスト-グループ等) を含むセルはプレースホルダーによる退避がセルごとに異なるため、
+    ハイフン処理のみ normalize_text と同じ関数でセルごとに行う。
+    """
+    # Fast path: 数値やASCII文字のみのセルは、チルダ・和暦略号を含まなければ前後の空白除去のみで済む
+    ascii_only = values.str.isascii() & ~values.str.contains(RE_ASCII_RULE_TRIGGERS, regex=True)
+    result = values.where(~ascii_only, values.str.strip())
+    values = values[~ascii_only]
+    if values.empty:
+        return result
+
+    # Step 1-2: 丸数字、NFKC、チルダ
+    values = values.str.replace(RE_LIST_MARKER, _replace_list_marker, regex=True)
+    values = values.str.normalize('NFKC')
+    values = values.str.replace(RE_TILDE_VARIANTS, '～', regex=True)
+
+    # Step 3: 和暦→西暦
+    values = values.str.replace(RE_WAREKI_RANGE, _convert_wareki_range, regex=True)
+    values = values.str.replace(RE_WAREKI_SINGLE, _convert_wareki_single, regex=True)
+    values = values.str.replace(RE_WAREKI_ABBREVIATED, _convert_wareki_abbreviated, regex=True)
+
+    # Step 4: ハイフン処理
+    for pattern, correct in RE_KATAKANA_HYPHEN_PRE_NORMALIZATION:
+        values = values.str.replace(pattern, correct, regex=True)
+
+    needs_placeholder = pd.Series(False, index=values.index)
+    for pattern in RE_KATAKANA_HYPHEN_EXCLUSIONS:
+        needs_placeholder |= values.str.contains(pattern, regex=True)
+    protected = values[needs_placeholder].map(_apply_hyphen_rules_with_exclusions)
+
+    values = values[~needs_placeholder]
+    values = values.str.replace(RE_KATAKANA_HYPHEN, r'\1ー', regex=True)
+    values = values.str.replace(RE_HYPHEN_LIKE, '-', regex=True)
+    values = values.str.replace(RE_KANA_KANJI_HYPHEN, r'\1', regex=True)
+
+    result.loc[protected.index] = protected.str.strip()
+    result.loc[values.index] = values.str.strip()
+    return result
+
+
+def normalize_series(values: pd.Series) -> pd.Series:
+    """
+    列全体に normalize_text を適用した結果を返す (セルごとの結果は normalize_text と同一)。
+    同じ値のセルは1回だけ正規化し、文字列でない値や空文字列はそのまま返す。
+    """
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+    uniques = np.asarray(uniques, dtype=object)
+    is_target = np.array([isinstance(u, str) and u != '' for u in uniques], dtype=bool)
+
+    normalized = uniques.copy()
+    if is_target.any():
+        normalized[is_target] = _normalize_unique_strings(
+            pd.Series(uniques[is_target], dtype=object)
+        ).to_numpy(dtype=object)
+
+    result = values.to_numpy(dtype=object, copy=True)
+    has_code = codes >= 0
+    result[has_code] = normalized[codes[has_code]]
+    return pd.Series(result, index=values.index, dtype=object)